@@ -1,13 +1,26 @@
 from __future__ import annotations
 
+from concurrent.futures import Executor, ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Callable
+from typing import Any, Callable, Iterable
 
 import numpy as np
-import pyqtgraph as pg
-from scipy import stats
+import polars as pl
+from scipy import special, stats
 from scipy.stats import ks_1samp
 
+# plotting helpers moved to plotting.py, they load pyqtgraph and Qt on first use
+_PLOTTING = ("plot_hist", "plot_line")
+
+
+def __getattr__(name: str) -> Any:
+    if name in _PLOTTING:
+        import plotting
+
+        return getattr(plotting, name)
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
 
 @dataclass
 class KSTestResult:
@@ -134,6 +147,253 @@ def compute_histogram(
     return HistogramResults(edges, counts)
 
 
+@dataclass
+class GroupedHistograms:
+    """Histograms of many groups stacked into arrays.
+
+    Row i holds the histogram of groups[i], groups are sorted. Every row
+    has the same number of uniform bins over its own range, as
+    compute_histogram gives for an integer bin count.
+    """
+
+    groups: np.ndarray
+    bins: np.ndarray
+    counts: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def __getitem__(self, pos: int) -> HistogramResults:
+        return HistogramResults(self.bins[pos], self.counts[pos])
+
+    def histogram(self, group: Any) -> HistogramResults:
+        """Histogram of one group label."""
+        (pos,) = np.flatnonzero(self.groups == group)
+        return self[pos]
+
+    @property
+    def centers(self) -> np.ndarray:
+        return (self.bins[:, 1:] + self.bins[:, :-1]) / 2
+
+    @property
+    def cdf(self) -> np.ndarray:
+        raw_cdf = np.cumsum(self.counts, axis=1, dtype=float)
+        with np.errstate(invalid="ignore"):
+            return raw_cdf / raw_cdf[:, -1:]
+
+    def _interp_cdf(self, rows: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """HistogramResults.interp_cdf of row rows[i] at x[i]."""
+        cdf = self.cdf
+        num_bins = cdf.shape[1]
+        if num_bins == 1:
+            return cdf[rows, 0]
+        first = self.bins[rows, 1]
+        width = self.bins[rows, 2] - first
+        with np.errstate(invalid="ignore", divide="ignore"):
+            steps = np.nan_to_num((x - first) / width, nan=0.0)
+        lower = np.clip(np.floor(steps), 0, num_bins - 2).astype(np.int64)
+        frac = np.clip(steps - lower, 0, 1)
+        return cdf[rows, lower] + frac * (cdf[rows, lower + 1] - cdf[rows, lower])
+
+    def interp_cdf(self, x: np.ndarray) -> np.ndarray:
+        """interp_cdf of every group, row i of x against group i.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            groups x values
+
+        Returns
+        -------
+        np.ndarray
+
+        """
+        x = np.asarray(x, dtype=float)
+        rows = np.broadcast_to(np.arange(len(self))[:, np.newaxis], x.shape)
+        return self._interp_cdf(rows, x)
+
+    def sample(self, size: int = 1, rng=None) -> np.ndarray:
+        """Draw size values from every group, as HistogramResults.sample_with_search.
+
+        Parameters
+        ----------
+        size : int, optional
+            by default 1
+        rng : np.random.Generator, optional
+            by default a fresh generator
+
+        Returns
+        -------
+        np.ndarray
+            groups x size, nan for groups without counts
+
+        """
+        rng = rng or np.random.default_rng()
+        cdf = self.cdf
+        (num_groups, num_bins) = cdf.shape
+        offsets = np.arange(num_groups)[:, np.newaxis]
+        # one search over all rows, row i shifted into [i, i + 1]
+        flat = np.nan_to_num(cdf, nan=1.0) + offsets
+        values = rng.random(size=(num_groups, size)) + offsets
+        positions = np.searchsorted(flat.ravel(), values.ravel()).reshape(values.shape)
+        positions = np.minimum(positions - offsets * num_bins, num_bins - 1)
+        res = np.take_along_axis(self.centers, positions, axis=1)
+        res[np.isnan(cdf[:, -1])] = np.nan
+        return res
+
+    def ks_test(self, groups: np.ndarray, values: np.ndarray) -> pl.DataFrame:
+        """One sample KS test of new values of each group against its histogram.
+
+        The batched form of ks_test_new_data, groups may have any number of
+        new values.
+
+        Parameters
+        ----------
+        groups : np.ndarray
+            group label of each value
+        values : np.ndarray
+
+        Returns
+        -------
+        pl.DataFrame
+            group, count, statistic and pvalue for every group with values
+
+        """
+        (groups, values) = (np.asarray(groups), np.asarray(values, dtype=float))
+        rows = np.searchsorted(self.groups, groups)
+        rows = np.minimum(rows, len(self) - 1)
+        if np.any(self.groups[rows] != groups):
+            msg = "values of groups without a histogram"
+            raise KeyError(msg)
+
+        order = np.lexsort([values, rows])
+        (rows, values) = (rows[order], values[order])
+        (present, starts, counts) = np.unique(
+            rows, return_index=True, return_counts=True
+        )
+        sizes = np.repeat(counts, counts)
+        ranks = np.arange(len(values)) - np.repeat(starts, counts) + 1
+
+        cdf = self._interp_cdf(rows, values)
+        statistics = np.zeros(len(starts))
+        if len(values):
+            d_plus = np.maximum.reduceat(ranks / sizes - cdf, starts)
+            d_minus = np.maximum.reduceat(cdf - (ranks - 1) / sizes, starts)
+            statistics = np.maximum(d_plus, d_minus)
+        return pl.DataFrame(
+            {
+                "group": self.groups[present],
+                "count": counts,
+                "statistic": statistics,
+                "pvalue": stats.kstwo.sf(statistics, counts),
+            },
+        )
+
+
+def _histogram_rows(
+    codes: np.ndarray,
+    values: np.ndarray,
+    num_groups: int,
+    bins: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """np.histogram(values of each code, bins) for all codes in one pass."""
+    order = np.argsort(codes, kind="stable")
+    (codes, values) = (codes[order], values[order])
+    lo = np.full(num_groups, np.nan)
+    hi = np.full(num_groups, np.nan)
+    (present, starts) = np.unique(codes, return_index=True)
+    if len(values):
+        lo[present] = np.minimum.reduceat(values, starts)
+        hi[present] = np.maximum.reduceat(values, starts)
+    same = lo == hi
+    (lo[same], hi[same]) = (lo[same] - 0.5, hi[same] + 0.5)
+    (lo, hi) = (np.nan_to_num(lo, nan=0.0), np.nan_to_num(hi, nan=1.0))
+    edges = np.linspace(lo, hi, bins + 1, axis=1)
+
+    # the binning of np.histogram for uniform bins, edge corrections included
+    first = lo[codes]
+    indices = ((values - first) * (bins / (hi - lo))[codes]).astype(np.intp)
+    indices[indices == bins] -= 1
+    indices[values < edges[codes, indices]] -= 1
+    increment = (values >= edges[codes, indices + 1]) & (indices != bins - 1)
+    indices[increment] += 1
+
+    counts = np.bincount(codes * bins + indices, minlength=num_groups * bins)
+    return (edges, counts.reshape(num_groups, bins))
+
+
+def grouped_histograms(
+    df: pl.DataFrame,
+    value_col: str,
+    group_col: str = "burst_group",
+    bins: int = 10,
+) -> GroupedHistograms:
+    """Histogram of value_col for every group in one pass.
+
+    Row i equals compute_histogram(values of group i, bins). Null and nan
+    values are left out.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+    value_col : str
+    group_col : str, optional
+        by default "burst_group"
+    bins : int, optional
+        by default 10
+
+    Returns
+    -------
+    GroupedHistograms
+        groups in sorted order
+
+    """
+    labels = df[group_col].to_numpy()
+    values = df[value_col].cast(pl.Float64).fill_null(np.nan).to_numpy()
+    (groups, codes) = np.unique(labels, return_inverse=True)
+    valid = np.isfinite(values)
+    (edges, counts) = _histogram_rows(codes[valid], values[valid], len(groups), bins)
+    return GroupedHistograms(groups=groups, bins=edges, counts=counts)
+
+
+def burst_histograms(
+    df: pl.DataFrame,
+    columns: Iterable[str] = ("pri", "pw", "rf"),
+    bins: int = 10,
+    group_col: str = "burst_group",
+    time_col: str = "toa",
+) -> dict[str, GroupedHistograms]:
+    """PRI, PW and RF histograms of every burst.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        output of group_by_burst
+    columns : Iterable[str], optional
+        "pri" is the TOA difference within a burst, other names are columns
+        of df and are skipped if missing, by default ("pri", "pw", "rf")
+    bins : int, optional
+        by default 10
+    group_col : str, optional
+        by default "burst_group"
+    time_col : str, optional
+        by default "toa"
+
+    Returns
+    -------
+    dict[str, GroupedHistograms]
+
+    """
+    df = df.sort(group_col, time_col).with_columns(
+        pl.col(time_col).diff().over(group_col).alias("pri"),
+    )
+    return {
+        column: grouped_histograms(df, column, group_col, bins)
+        for column in columns
+        if column in df.columns
+    }
+
+
 def ks_test_data(
     ref_data: np.ndarray,
     new_data: np.ndarray,
@@ -165,48 +425,350 @@ def ks_test_data(
     return (data_match_q, ks_res)
 
 
-def plot_hist(win, hist: HistogramResults):
-    """Histogram plot.
+@dataclass
+class ADTestResult:
+    statistic: float
+    pvalue: float
+
+
+# Table 2 of Scholz and Stephens 1987, as used by scipy.stats.anderson_ksamp
+_AD_B0 = np.array([0.675, 1.281, 1.645, 1.96, 2.326, 2.573, 3.085])
+_AD_B1 = np.array([-0.245, 0.25, 0.678, 1.149, 1.822, 2.364, 3.615])
+_AD_B2 = np.array([-0.105, -0.305, -0.362, -0.391, -0.396, -0.345, -0.154])
+_AD_SIG = np.array([0.25, 0.1, 0.05, 0.025, 0.01, 0.005, 0.001])
+
+
+def _common_counts(
+    ref: HistogramResults,
+    new: HistogramResults,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bin edges and counts of both histograms on the union of their edges.
+
+    Counts of a split bin are shared in proportion to width, the same
+    piecewise linear CDF interp_cdf uses.
+    """
+    (ref_bins, new_bins) = (np.asarray(ref.bins), np.asarray(new.bins))
+    (ref_counts, new_counts) = (np.asarray(ref.counts), np.asarray(new.counts))
+    if np.array_equal(ref_bins, new_bins):
+        return (ref_bins, ref_counts, new_counts)
+
+    edges = np.union1d(ref_bins, new_bins)
+    counts = [
+        np.diff(np.interp(edges, bins, np.concatenate([[0], np.cumsum(counts)])))
+        for bins, counts in [(ref_bins, ref_counts), (new_bins, new_counts)]
+    ]
+    return (edges, *counts)
+
+
+def ks_test_hists(ref: HistogramResults, new: HistogramResults) -> KSTestResult:
+    """Two sample Kolmogorov-Smirnov test between two histograms.
+
+    Runs in O(bins) from the counts alone. Binning hides differences
+    within a bin, so the statistic is at most that of the raw data. The
+    p value is the asymptotic one of scipy.stats.ks_2samp.
+
+    Parameters
+    ----------
+    ref : HistogramResults
+    new : HistogramResults
+        may have different bins, both are then split on the union of edges
+
+    Returns
+    -------
+    KSTestResult
+        statistic_sign is 1 where the CDF of ref is above that of new
+
+    """
+    (edges, ref_counts, new_counts) = _common_counts(ref, new)
+    (n_ref, n_new) = (np.sum(ref_counts), np.sum(new_counts))
+    diffs = np.cumsum(ref_counts) / n_ref - np.cumsum(new_counts) / n_new
+    idx = np.argmax(np.abs(diffs))
+    statistic = float(np.abs(diffs[idx]))
+
+    return KSTestResult(
+        statistic=statistic,
+        pvalue=float(
+            stats.kstwo.sf(statistic, np.round(n_ref * n_new / (n_ref + n_new)))
+        ),
+        statistic_location=float(edges[idx + 1]),
+        statistic_sign=int(np.sign(diffs[idx])) or 1,
+    )
+
+
+def _ad_harmonics(num: int) -> tuple[float, float]:
+    """Constants h and g of the Anderson-Darling variance for num samples."""
+    if num > 10**6:
+        # h is the harmonic number of num - 1 and g converges to pi**2 / 6
+        # with an error below log(num) / num
+        return (float(special.digamma(num) + np.euler_gamma), np.pi**2 / 6)
+    h = float(np.sum(1 / np.arange(1, num)))
+    partial = np.cumsum(1 / np.arange(num - 1, 1, -1))
+    return (h, float(np.sum(partial / np.arange(2, num))))
+
+
+def ad_test_hists(ref: HistogramResults, new: HistogramResults) -> ADTestResult:
+    """Two sample Anderson-Darling test between two histograms.
+
+    The midrank statistic of scipy.stats.anderson_ksamp for data tied at
+    the bin centers, computed in O(bins) from the counts alone. The p value
+    is interpolated the same way and capped to 0.001..0.25.
+
+    Parameters
+    ----------
+    ref : HistogramResults
+    new : HistogramResults
+        may have different bins, both are then split on the union of edges
+
+    Returns
+    -------
+    ADTestResult
+        standardized statistic and p value
+
+    """
+    (_, ref_counts, new_counts) = _common_counts(ref, new)
+    counts = np.stack([ref_counts, new_counts]).astype(float)
+    counts = counts[:, np.sum(counts, axis=0) > 0]
+    sizes = np.sum(counts, axis=1)
+    total = np.sum(sizes)
+
+    ties = np.sum(counts, axis=0)
+    before = np.cumsum(ties) - ties / 2
+    ranks = np.cumsum(counts, axis=1) - counts / 2
+    inner = (total * ranks - before * sizes[:, np.newaxis]) ** 2 / (
+        before * (total - before) - total * ties / 4
+    )
+    a2akn = (total - 1) / total * np.sum(np.sum(ties / total * inner, axis=1) / sizes)
+
+    (k, m) = (2, 1)
+    big_h = np.sum(1 / sizes)
+    (h, g) = _ad_harmonics(int(round(total)))
+    a = (4 * g - 6) * (k - 1) + (10 - 6 * g) * big_h
+    b = (
+        (2 * g - 4) * k**2
+        + 8 * h * k
+        + (2 * g - 14 * h - 4) * big_h
+        - 8 * h
+        + 4 * g
+        - 6
+    )
+    c = (
+        (6 * h + 2 * g - 2) * k**2
+        + (4 * h - 4 * g + 6) * k
+        + (2 * h - 6) * big_h
+        + 4 * h
+    )
+    d = (2 * h + 6) * k**2 - 4 * h * k
+    variance = (a * total**3 + b * total**2 + c * total + d) / (
+        (total - 1) * (total - 2) * (total - 3)
+    )
+    statistic = (a2akn - m) / np.sqrt(variance)
+
+    critical = _AD_B0 + _AD_B1 / np.sqrt(m) + _AD_B2 / m
+    if statistic < critical.min():
+        pvalue = _AD_SIG.max()
+    elif statistic > critical.max():
+        pvalue = _AD_SIG.min()
+    else:
+        fit = np.polyfit(critical, np.log(_AD_SIG), 2)
+        pvalue = np.exp(np.polyval(fit, statistic))
+    return ADTestResult(statistic=float(statistic), pvalue=float(pvalue))
+
+
+def ks_statistics(samples: np.ndarray, cdf: Callable) -> np.ndarray:
+    """One sample KS statistic of each row of samples.
+
+    Same statistic as ks_1samp(row, cdf) for every row, for all rows at
+    once.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        trials x samples per trial
+    cdf : Callable
+        vectorized CDF
+
+    Returns
+    -------
+    np.ndarray
+        one statistic per row
+
+    """
+    samples = np.sort(np.atleast_2d(samples), axis=1)
+    n = samples.shape[1]
+    values = cdf(samples)
+    steps = np.arange(1, n + 1) / n
+    d_plus = np.max(steps - values, axis=1)
+    d_minus = np.max(values - (steps - 1 / n), axis=1)
+    return np.maximum(d_plus, d_minus)
+
+
+@dataclass
+class KSCalibration:
+    """Monte Carlo distribution of the KS statistic of a histogram.
+
+    statistics are the KS statistics of samples drawn from the histogram
+    against its own interpolated CDF, reference those of the same samples
+    against an analytic CDF if one was given.
+    """
+
+    num_samples: int
+    statistics: np.ndarray
+    reference: np.ndarray | None = None
+
+    def threshold(self, alpha: float = 0.05) -> float:
+        """Statistic exceeded by a fraction alpha of same distribution trials."""
+        return float(np.quantile(self.statistics, 1 - alpha))
+
+    def pvalue(self, statistic: float) -> float:
+        """Fraction of trials with a statistic at least as large."""
+        return float(np.mean(self.statistics >= statistic))
+
+
+def _calibration_batch(
+    hist: HistogramResults,
+    num_samples: int,
+    num_trials: int,
+    seed: np.random.SeedSequence,
+    cdf: Callable | None,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    rng = np.random.default_rng(seed)
+    samples = hist.sample((num_trials, num_samples), rng=rng)
+    reference = None if cdf is None else ks_statistics(samples, cdf)
+    return (ks_statistics(samples, hist.interp_cdf), reference)
+
+
+def calibrate_ks(
+    hist: HistogramResults,
+    num_samples: int = 100,
+    num_trials: int = 1000,
+    cdf: Callable | None = None,
+    batch_size: int = 1000,
+    seed: int | np.random.SeedSequence | None = None,
+    executor: Executor | None = None,
+    max_workers: int | None = None,
+) -> KSCalibration:
+    """Distribution of the KS statistic of samples drawn from hist.
+
+    Trials run in batches of batch_size, each batch vectorized and drawn
+    from its own stream spawned from seed, so the result depends on seed
+    and batch_size but not on the number of workers.
 
     Parameters
     ----------
-    win : _type_
-        _description_
     hist : HistogramResults
-        _description_
+    num_samples : int, optional
+        samples per trial, by default 100
+    num_trials : int, optional
+        by default 1000
+    cdf : Callable | None, optional
+        analytic CDF to also test against, must be picklable to run on
+        processes, e.g. stats.norm(loc=4).cdf, by default None
+    batch_size : int, optional
+        trials per task, by default 1000
+    seed : int | np.random.SeedSequence | None, optional
+        by default fresh entropy
+    executor : Executor | None, optional
+        by default a process pool of max_workers
+    max_workers : int | None, optional
+        1 runs in this process, by default one per CPU
+
+    Returns
+    -------
+    KSCalibration
 
     """
-    win.resize(800, 480)
-    win.setWindowTitle("Histogram")
-    plt = win.addPlot()
-
-    bgi = pg.BarGraphItem(
-        x0=hist.bins[:-1],
-        x1=hist.bins[1:],
-        height=hist.counts,
-        pen="w",
-        brush=(0, 0, 255, 150),
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    sizes = [min(batch_size, num_trials - _) for _ in range(0, num_trials, batch_size)]
+    args = (
+        [hist] * len(sizes),
+        [num_samples] * len(sizes),
+        sizes,
+        seed.spawn(len(sizes)),
+        [cdf] * len(sizes),
     )
-    plt.addItem(bgi)
 
+    if executor is not None:
+        batches = list(executor.map(_calibration_batch, *args))
+    elif max_workers == 1:
+        batches = list(map(_calibration_batch, *args))
+    else:
+        with ProcessPoolExecutor(max_workers) as pool:
+            batches = list(pool.map(_calibration_batch, *args))
+
+    empty = [np.empty(0)]
+    return KSCalibration(
+        num_samples=num_samples,
+        statistics=np.concatenate(empty + [_[0] for _ in batches]),
+        reference=None
+        if cdf is None
+        else np.concatenate(empty + [_[1] for _ in batches]),
+    )
 
-def plot_line(win, x, y):
-    """Line plot.
+
+def calibrate_ks_bins(
+    data: np.ndarray,
+    bins: Iterable[int],
+    num_samples: int = 100,
+    num_trials: int = 1000,
+    alphas: Iterable[float] = (0.1, 0.05, 0.01),
+    cdf: Callable | None = None,
+    seed: int | None = None,
+    max_workers: int | None = None,
+) -> pl.DataFrame:
+    """KS thresholds of histograms of data for several bin counts.
+
+    Every bin count gets its own seed spawned from seed and all of them
+    share one process pool.
 
     Parameters
     ----------
-    win : _type_
-        _description_
-    x : _type_
-        _description_
-    y : _type_
-        _description_
+    data : np.ndarray
+        reference data
+    bins : Iterable[int]
+        bin counts to calibrate
+    num_samples : int, optional
+        samples per trial, by default 100
+    num_trials : int, optional
+        trials per bin count, by default 1000
+    alphas : Iterable[float], optional
+        false alarm rates to give thresholds for, by default (0.1, 0.05, 0.01)
+    cdf : Callable | None, optional
+        analytic CDF, adds the mean statistic against it, by default None
+    seed : int | None, optional
+    max_workers : int | None, optional
+
+    Returns
+    -------
+    pl.DataFrame
+        bins, mean, threshold_<alpha> per alpha and reference_mean with cdf
 
     """
-    win.resize(800, 480)
-    win.setWindowTitle("Histogram")
-    plt = win.addPlot()
-    plt.plot(x, y)
+    bins = list(bins)
+    seeds = np.random.SeedSequence(seed).spawn(len(bins))
+    executor = ProcessPoolExecutor(max_workers) if max_workers != 1 else None
+    rows = []
+    try:
+        for num_bins, child in zip(bins, seeds):
+            calibration = calibrate_ks(
+                compute_histogram(data, bins=num_bins),
+                num_samples=num_samples,
+                num_trials=num_trials,
+                cdf=cdf,
+                seed=child,
+                executor=executor,
+                max_workers=max_workers,
+            )
+            row = {"bins": num_bins, "mean": np.mean(calibration.statistics)}
+            for alpha in alphas:
+                row[f"threshold_{alpha}"] = calibration.threshold(alpha)
+            if cdf is not None:
+                row["reference_mean"] = np.mean(calibration.reference)
+            rows.append(row)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return pl.DataFrame(rows)
 
 
 def do_ks_test(
@@ -243,17 +805,17 @@ if __name__ == "__main__":
     # plot_line(win, hist.centers, hist.interp_cdf(hist.centers))
     # win.nextRow()
 
-    stat1s = []
-    stat2s = []
-    for _ in list(range(1000)):
-        new_data = hist.sample(100, rng=rng)
-        res = stats.ks_1samp(new_data, lambda x: stats.norm.cdf(x, loc=mean))
-        res2 = do_ks_test(hist, new_data)
-        stat1s.append(res.statistic)
-        stat2s.append(res2.statistic)
-
-    print(np.mean(stat1s))
-    print(np.mean(stat2s))
+    calibration = calibrate_ks(
+        hist,
+        num_samples=100,
+        num_trials=1000,
+        cdf=stats.norm(loc=mean).cdf,
+        seed=42,
+    )
+
+    print(np.mean(calibration.reference))
+    print(np.mean(calibration.statistics))
+    print(calibrate_ks_bins(data, [10, 100, 1000], cdf=stats.norm(loc=mean).cdf))
 
     exit()
     new_data = hist.sample(100)
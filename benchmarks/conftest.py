@@ -0,0 +1,62 @@
+"""Benchmarks for the signal chain.
+
+Run with pytest-benchmark and store results as JSON for comparison
+between releases::
+
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Each benchmark also records the tracemalloc peak of a single call in
+``extra_info["peak_bytes"]`` of the saved JSON. --benchmark-compare only
+compares timings, so compare peak_bytes between saved runs by hand, the
+budgets of memory.py in strict mode are the memory regression tests.
+"""
+
+from __future__ import annotations
+
+import tracemalloc
+from typing import Callable
+
+import numpy as np
+import pytest
+
+SEED = 42
+
+
+def peak_bytes(func: Callable, *args, **kwargs) -> int:
+    """Peak traced memory of one call.
+
+    Parameters
+    ----------
+    func : Callable
+
+    Returns
+    -------
+    int
+
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@pytest.fixture
+def rng() -> np.random.Generator:
+    return np.random.default_rng(seed=SEED)
+
+
+@pytest.fixture
+def bench(benchmark) -> Callable:
+    """Benchmark a call and record its peak memory and input size."""
+
+    def run(func: Callable, *args, items: int | None = None, **kwargs):
+        benchmark.extra_info["peak_bytes"] = peak_bytes(func, *args, **kwargs)
+        if items is not None:
+            benchmark.extra_info["items"] = items
+        return benchmark(func, *args, **kwargs)
+
+    return run
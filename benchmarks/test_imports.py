@@ -0,0 +1,76 @@
+"""Import time of the numerical core.
+
+Batch workers import the core modules and never plot, so the GUI stack must
+stay out of their import graph. Times come from ``python -X importtime`` in a
+fresh interpreter, which leaves out interpreter startup, and the budget is
+on the time spent beyond importing the third party packages the core needs,
+so it does not move with the speed of the machine or of scipy.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import subprocess
+import sys
+
+CORE_MODULES = [
+    "analysis",
+    "cfar",
+    "deinterleaver",
+    "geo_engine",
+    "pipeline",
+    "pulse_simulator",
+    "references",
+]
+DEPENDENCIES = [
+    "numpy",
+    "polars",
+    "scipy.ndimage",
+    "scipy.signal",
+    "scipy.special",
+    "scipy.stats",
+] + [_ for _ in ["numba"] if importlib.util.find_spec(_)]
+# with pyqtgraph, Qt and matplotlib at module level this was over 1 s
+IMPORT_BUDGET_S = 0.25
+
+
+def import_time_s(modules: list[str], preload: list[str] = ()) -> float:
+    """Cumulative import time of modules in a fresh interpreter.
+
+    Parameters
+    ----------
+    modules : list[str]
+    preload : list[str], optional
+        imported first and not counted
+
+    Returns
+    -------
+    float
+        seconds
+
+    """
+    code = "".join(f"import {_}\n" for _ in [*preload, *modules])
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    for line in res.stderr.splitlines():
+        (_, cumulative, name) = line.split("|")
+        # nested imports are indented below the top level module
+        if name.strip() in modules and not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1e6
+
+
+def test_core_import_time(benchmark):
+    benchmark.extra_info["import_s"] = import_time_s(CORE_MODULES)
+    seconds = benchmark.pedantic(
+        import_time_s,
+        args=(CORE_MODULES, DEPENDENCIES),
+        rounds=5,
+        iterations=1,
+    )
+    assert seconds < IMPORT_BUDGET_S
@@ -0,0 +1,35 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from ingest import LocalPublisher, PdwIngest, decode_pdws, encode_pdws
+
+
+def pdws(rng: np.random.Generator, num_pulses: int) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "toa": np.sort(rng.uniform(0, num_pulses, num_pulses)),
+            "pw": rng.uniform(1e-6, 1e-5, num_pulses),
+            "rf": rng.uniform(1e9, 2e9, num_pulses),
+            "pa": rng.uniform(0, 1, num_pulses),
+        },
+    )
+
+
+@pytest.mark.parametrize("batch_size", [100, 10000])
+def test_decode(bench, rng, batch_size):
+    message = encode_pdws(pdws(rng, batch_size))
+    bench(decode_pdws, message, items=batch_size)
+
+
+@pytest.mark.parametrize("num_pulses", [10**4, 10**5])
+def test_ingest_pipeline(bench, rng, num_pulses):
+    messages = [encode_pdws(_) for _ in pdws(rng, num_pulses).iter_slices(1000)]
+
+    def run():
+        publisher = LocalPublisher(hwm=64)
+        with PdwIngest(publisher, pri=5, tol=0.01, poll_ms=1, on_bursts=len):
+            for message in messages:
+                publisher.send(message)
+
+    bench(run, items=num_pulses)
@@ -0,0 +1,224 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from analysis import compute_histogram, grouped_histograms
+from channelizer import Channelizer
+from deinterleaver import (
+    filter_by_pri,
+    group_by_burst,
+    partitioned_deinterleave,
+    remove_dupes,
+    remove_duplicates,
+)
+from emitters import DIMS, EmitterLibrary
+from intervals import BurstIndex
+from memo import ResultCache
+from pulse_simulator import (
+    detector,
+    find_diffs,
+    generate_noise,
+    make_signal,
+    try_pris,
+)
+from scenario import random_scenario
+
+SAMPLE_RATE_S = 0.0001
+PW_S = 0.002
+
+
+def pulse_train(rng: np.random.Generator, num_pulses: int, pri: float = 5.0):
+    toas = np.arange(num_pulses) * pri + rng.normal(0, 0.01, num_pulses)
+    clutter = rng.uniform(0, num_pulses * pri, num_pulses // 2)
+    return pl.DataFrame(
+        {
+            "toa": np.concatenate([toas, clutter]),
+            "rf": rng.integers(0, 10, num_pulses + num_pulses // 2),
+        },
+    ).sort("toa")
+
+
+@pytest.mark.parametrize("num_pulses", [10, 100, 1000])
+def test_make_signal(bench, num_pulses):
+    bench(
+        make_signal,
+        pri_s=0.01,
+        sample_rate_s=SAMPLE_RATE_S,
+        num_pulses=num_pulses,
+        pw_s=PW_S,
+        items=num_pulses,
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float32", "complex64"])
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_generate_noise(bench, rng, dtype, max_workers):
+    num_samples = 10**7
+    bench(
+        generate_noise,
+        num_samples,
+        rng=rng,
+        dtype=dtype,
+        max_workers=max_workers,
+        items=num_samples,
+    )
+
+
+@pytest.mark.parametrize("num_samples", [10**4, 10**5, 10**6])
+@pytest.mark.parametrize("dtype", ["float64", "float32", "complex64"])
+def test_detector(bench, rng, num_samples, dtype):
+    data = generate_noise(num_samples, rng=rng, dtype=dtype)
+    bench(detector, data, SAMPLE_RATE_S, PW_S, items=num_samples)
+
+
+@pytest.mark.parametrize("num_channels", [8, 64])
+@pytest.mark.parametrize("oversample", [1, 2])
+def test_channelizer(bench, rng, num_channels, oversample):
+    num_samples = 10**6
+    data = generate_noise(num_samples, rng=rng, dtype=np.complex64)
+    channelizer = Channelizer(num_channels, oversample=oversample)
+    bench(channelizer, data, items=num_samples)
+
+
+@pytest.mark.parametrize("num_samples", [10**4, 10**5])
+def test_try_pris(bench, rng, num_samples):
+    data = (rng.random(num_samples) > 0.99).astype(int)
+    bench(try_pris, data, SAMPLE_RATE_S, items=num_samples)
+
+
+@pytest.mark.parametrize("num_samples", [10**4, 10**5])
+def test_try_pris_cached(bench, rng, num_samples):
+    data = (rng.random(num_samples) > 0.99).astype(np.int8)
+    cache = ResultCache()
+    try_pris(data, SAMPLE_RATE_S, cache=cache)
+    bench(try_pris, data, SAMPLE_RATE_S, cache=cache, items=num_samples)
+
+
+@pytest.mark.parametrize("num_toas", [100, 1000, 3000])
+def test_find_diffs(bench, rng, num_toas):
+    toas = np.sort(rng.uniform(0, 100, num_toas))
+    bench(find_diffs, toas, items=num_toas)
+
+
+@pytest.mark.parametrize("num_pulses", [100, 10000, 100000])
+def test_filter_by_pri(bench, rng, num_pulses):
+    df = pulse_train(rng, num_pulses)
+    bench(filter_by_pri, df, 5.0, items=len(df))
+
+
+@pytest.mark.parametrize("num_pulses", [20, 100, 300])
+def test_group_by_burst(bench, rng, num_pulses):
+    df = pulse_train(rng, num_pulses)
+    bench(group_by_burst, df, 5.0, items=len(df))
+
+
+@pytest.mark.parametrize("num_pulses", [10**5, 10**7])
+def test_remove_dupes(bench, rng, num_pulses):
+    df = pl.DataFrame(
+        {
+            "toa": np.sort(rng.uniform(0, num_pulses, num_pulses)),
+            "rf": rng.uniform(1000, 2000, num_pulses),
+        },
+    )
+    bench(remove_dupes, df, 2, 10, items=num_pulses)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_partitioned_deinterleave(bench, rng, max_workers):
+    # 64 emitters of one PRI, only separable by RF
+    num_emitters = 64
+    toas = np.arange(5000) * 5.0
+    df = pl.DataFrame(
+        {
+            "toa": np.concatenate(
+                [toas + rng.uniform(0, 5) for _ in range(num_emitters)]
+            ),
+            "rf": np.repeat(1000 + np.arange(num_emitters) * 100.0, len(toas)),
+        },
+    ).sort("toa")
+    bench(
+        partitioned_deinterleave,
+        df,
+        5.0,
+        num_bands=16,
+        max_workers=max_workers,
+        items=len(df),
+    )
+
+
+@pytest.mark.parametrize("num_emitters", [10, 1000])
+def test_scenario_pulses(bench, num_emitters):
+    scenario = random_scenario(num_emitters, 100.0)
+    # about 10**6 pulses whatever the number of emitters
+    stop = 10**6 / scenario.pulse_rate
+    bench(scenario.pulses, 0.0, stop, items=10**6)
+
+
+@pytest.mark.parametrize("num_groups", [10, 100, 1000])
+def test_remove_duplicates(bench, rng, num_groups):
+    toas = np.sort(rng.uniform(0, num_groups * 10, num_groups * 5))
+    group = pl.DataFrame(
+        {
+            "toa": toas,
+            "rf": rng.integers(0, 10, len(toas)),
+            "burst_group": np.repeat(np.arange(num_groups), 5),
+        },
+    )
+    bench(remove_duplicates, [group, group], items=2 * len(group))
+
+
+@pytest.mark.parametrize("num_emitters", [10**3, 10**5])
+def test_associate(bench, rng, num_emitters):
+    centers = rng.uniform(1, 2, (num_emitters, 3)) * [1e-3, 1e3, 1e-5]
+    widths = centers * 0.01
+    library = EmitterLibrary()
+    library.extend(
+        pl.DataFrame(
+            {"name": np.arange(num_emitters).astype(str)}
+            | {
+                f"{dim}_min": centers[:, pos] - widths[:, pos]
+                for pos, dim in enumerate(DIMS)
+            }
+            | {
+                f"{dim}_max": centers[:, pos] + widths[:, pos]
+                for pos, dim in enumerate(DIMS)
+            },
+        ),
+    )
+    bursts = pl.DataFrame(dict(zip(DIMS, centers[:1000].T)))
+    bench(library.associate, bursts, items=len(bursts))
+
+
+@pytest.mark.parametrize("num_bursts", [10**3, 10**5])
+def test_burst_overlapping(bench, rng, num_bursts):
+    starts = np.sort(rng.uniform(0, num_bursts, num_bursts))
+    index = BurstIndex()
+    index.add(np.arange(num_bursts), starts, starts + rng.exponential(1, num_bursts))
+    windows = rng.uniform(0, num_bursts, 10**4)
+    bench(index.overlapping, windows, windows + 5, items=len(windows))
+
+
+@pytest.mark.parametrize("num_samples", [10**4, 10**6])
+@pytest.mark.parametrize("bins", [100, 1000])
+def test_compute_histogram(bench, rng, num_samples, bins):
+    data = rng.normal(size=num_samples)
+    bench(compute_histogram, data, bins, items=num_samples)
+
+
+@pytest.mark.parametrize("num_groups", [10, 1000, 100000])
+def test_grouped_histograms(bench, rng, num_groups):
+    df = pl.DataFrame(
+        {
+            "burst_group": rng.integers(0, num_groups, 10**6),
+            "rf": rng.normal(size=10**6),
+        },
+    )
+    bench(grouped_histograms, df, "rf", bins=100, items=len(df))
+
+
+@pytest.mark.parametrize("num_samples", [100, 10**4])
+@pytest.mark.parametrize("bins", [100, 1000])
+def test_ks_test_new_data(bench, rng, num_samples, bins):
+    hist = compute_histogram(rng.normal(size=10**5), bins)
+    new_data = rng.normal(size=num_samples)
+    bench(hist.ks_test_new_data, new_data, items=num_samples)
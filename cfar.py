@@ -0,0 +1,312 @@
+"""Constant false alarm rate detection.
+
+detector compares the pulse width box filter with a fixed threshold, so its
+false alarm rate moves with the noise floor. Here the filtered power of each
+cell is compared with scale times a noise level estimated from training
+cells on either side of it, beyond guard cells that keep the pulse itself
+out of the estimate.
+
+Modes
+-----
+ca
+    mean of both training windows
+go, so
+    greater or smaller of the two window means, for clutter edges and
+    closely spaced targets
+os
+    a quantile of the sorted training cells, robust to interferers
+
+The window means come from running sums and the ordered statistic from the
+order statistic kernel in kernels.py, so the cost per sample does not grow
+with the number of training cells.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from scipy import signal
+
+from kernels import os_cfar_noise
+from pulse_simulator import Pdw, extract_pdws
+
+MODES = ("ca", "go", "so", "os")
+
+
+def cfar_scale(num_cells: int, pfa: float) -> float:
+    """Threshold scale of cell averaging CFAR.
+
+    Exact for exponentially distributed noise power averaged over num_cells
+    cells, used as the default for every mode.
+
+    Parameters
+    ----------
+    num_cells : int
+        training cells in total
+    pfa : float
+        probability of false alarm
+
+    Returns
+    -------
+    float
+
+    """
+    return num_cells * (pfa ** (-1 / num_cells) - 1)
+
+
+def _window_sums(
+    power: np.ndarray,
+    num_train: int,
+    num_guard: int,
+    start: int,
+    stop: int,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    n = len(power)
+    sums = np.concatenate([[0.0], np.cumsum(power, dtype=np.float64)])
+    cells = np.arange(start, stop)
+
+    windows = []
+    for lo, hi in [
+        (cells - num_guard - num_train, cells - num_guard),
+        (cells + num_guard + 1, cells + num_guard + num_train + 1),
+    ]:
+        (lo, hi) = (np.clip(lo, 0, n), np.clip(hi, 0, n))
+        windows.append((sums[hi] - sums[lo], hi - lo))
+    return windows
+
+
+def cfar_noise(
+    power: np.ndarray,
+    num_train: int,
+    num_guard: int,
+    mode: str = "ca",
+    quantile: float = 0.75,
+    start: int = 0,
+    stop: int | None = None,
+) -> np.ndarray:
+    """Noise level of each cell from its training cells.
+
+    Training windows are clipped at the ends of power, near an end only the
+    cells that exist are used.
+
+    Parameters
+    ----------
+    power : np.ndarray
+    num_train : int
+        training cells on each side
+    num_guard : int
+        guard cells on each side
+    mode : str, optional
+        one of MODES, by default "ca"
+    quantile : float, optional
+        training cell quantile of os mode, by default 0.75
+    start : int, optional
+        first cell, by default 0
+    stop : int | None, optional
+        end of the cells, by default len(power)
+
+    Returns
+    -------
+    np.ndarray
+        one value per cell in start..stop, nan for cells without training
+        cells
+
+    """
+    stop = len(power) if stop is None else stop
+    if mode not in MODES:
+        msg = f"unknown CFAR mode {mode!r}, expected one of {MODES}"
+        raise ValueError(msg)
+    if mode == "os":
+        return os_cfar_noise(power, num_train, num_guard, quantile, start, stop)
+
+    ((lead, lead_n), (lag, lag_n)) = _window_sums(
+        power,
+        num_train,
+        num_guard,
+        start,
+        stop,
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if mode == "ca":
+            return (lead + lag) / (lead_n + lag_n)
+        if mode == "go":
+            return np.fmax(lead / lead_n, lag / lag_n)
+        return np.fmin(lead / lead_n, lag / lag_n)
+
+
+class _Cfar:
+    """Box filter and CFAR settings shared by the batch and stream detectors."""
+
+    def __init__(
+        self,
+        sample_rate_s: float,
+        pw_s: float,
+        mode: str = "ca",
+        num_train: int = 16,
+        num_guard: int | None = None,
+        pfa: float = 1e-6,
+        scale: float | None = None,
+        quantile: float = 0.75,
+    ) -> None:
+        if mode not in MODES:
+            msg = f"unknown CFAR mode {mode!r}, expected one of {MODES}"
+            raise ValueError(msg)
+        width = int(pw_s / sample_rate_s) + 1
+        self.sample_rate_s = sample_rate_s
+        self.b_filter = np.ones(width)
+        self.mode = mode
+        self.num_train = num_train
+        # the filtered pulse is 2 * width - 1 samples long
+        self.num_guard = width if num_guard is None else num_guard
+        self.scale = cfar_scale(2 * num_train, pfa) if scale is None else scale
+        self.quantile = quantile
+
+    @property
+    def reach(self) -> int:
+        return self.num_guard + self.num_train
+
+    def decide(self, power: np.ndarray, start: int, stop: int) -> np.ndarray:
+        noise = cfar_noise(
+            power,
+            self.num_train,
+            self.num_guard,
+            self.mode,
+            self.quantile,
+            start,
+            stop,
+        )
+        return np.where(power[start:stop] > self.scale * noise, 1, 0)
+
+
+def cfar_detector(
+    data: np.ndarray,
+    sample_rate_s: float,
+    pw_s: float,
+    mode: str = "ca",
+    num_train: int = 16,
+    num_guard: int | None = None,
+    pfa: float = 1e-6,
+    scale: float | None = None,
+    quantile: float = 0.75,
+) -> np.ndarray:
+    """Detect signal against an adaptive threshold.
+
+    Drop in replacement for detector, the same box filter is applied and its
+    power is compared with scale times the noise level of cfar_noise.
+
+    Parameters
+    ----------
+    data : np.ndarray
+    sample_rate_s : float
+    pw_s : float
+    mode : str, optional
+        one of MODES, by default "ca"
+    num_train : int, optional
+        training cells on each side, by default 16
+    num_guard : int | None, optional
+        guard cells on each side, by default the pulse width in samples
+    pfa : float, optional
+        false alarm probability setting the default scale, by default 1e-6
+    scale : float | None, optional
+        threshold over the noise level, by default cfar_scale(2 * num_train, pfa)
+    quantile : float, optional
+        training cell quantile of os mode, by default 0.75
+
+    Returns
+    -------
+    np.ndarray
+        1 where a detection is made, otherwise 0
+
+    """
+    cfar = _Cfar(sample_rate_s, pw_s, mode, num_train, num_guard, pfa, scale, quantile)
+    power = np.abs(signal.lfilter(b=cfar.b_filter, a=[1], x=data)) ** 2
+    return cfar.decide(power, 0, len(power))
+
+
+class StreamingCfar(_Cfar):
+    """cfar_detector over consecutive blocks of one stream, emitting PDWs.
+
+    A cell is decided once its trailing training window has arrived, so
+    decisions lag the input by num_guard + num_train samples, and a pulse
+    is emitted once it has ended. Only the undecided samples, the training
+    history of the next cell and any open pulse are kept between blocks.
+    The PDWs of all blocks and flush equal extract_pdws on the detections of
+    cfar_detector over the whole stream.
+
+    Parameters are those of cfar_detector.
+    """
+
+    def __init__(self, sample_rate_s: float, pw_s: float, **kwargs) -> None:
+        super().__init__(sample_rate_s, pw_s, **kwargs)
+        self.zi = np.zeros(len(self.b_filter) - 1)
+        self.times = np.array([])
+        self.data = np.array([])
+        self.power = np.array([])
+        self.detects = np.array([], dtype=np.int64)
+        # cells before emitted are done, cells from decided on are undecided
+        self.emitted = 0
+        self.decided = 0
+
+    def push(self, times: np.ndarray, data: np.ndarray) -> Pdw:
+        """Add a block of samples.
+
+        Parameters
+        ----------
+        times : np.ndarray
+        data : np.ndarray
+
+        Returns
+        -------
+        Pdw
+            pulses that ended in time to be decided
+
+        """
+        if len(data) == 0:
+            return Pdw()
+        (filtered, self.zi) = signal.lfilter(
+            b=self.b_filter,
+            a=[1],
+            x=data,
+            zi=self.zi,
+        )
+        self.times = np.concatenate([self.times, times])
+        self.data = np.concatenate([self.data, data])
+        self.power = np.concatenate([self.power, np.abs(filtered) ** 2])
+        return self._advance(max(len(self.power) - self.reach, self.decided))
+
+    def flush(self) -> Pdw:
+        """Decide the last samples and emit every remaining pulse."""
+        pdw = self._advance(len(self.power), final=True)
+        self.times = self.times[:0]
+        self.data = self.data[:0]
+        self.power = self.power[:0]
+        self.detects = self.detects[:0]
+        (self.emitted, self.decided) = (0, 0)
+        return pdw
+
+    def _advance(self, stop: int, final: bool = False) -> Pdw:
+        self.detects = np.concatenate(
+            [self.detects, self.decide(self.power, self.decided, stop)],
+        )
+        self.decided = stop
+
+        cut = stop
+        if not final and stop and self.detects[-1]:
+            gaps = np.flatnonzero(self.detects[self.emitted :] == 0)
+            cut = self.emitted + (gaps[-1] + 1 if len(gaps) else 0)
+        part = slice(self.emitted, cut)
+        pdw = extract_pdws(
+            self.times[part],
+            self.detects[part],
+            self.data[part],
+            self.sample_rate_s,
+        )
+
+        # keep the training history of the next cell and the open pulse
+        base = min(cut, max(stop - self.reach, 0))
+        self.times = self.times[base:]
+        self.data = self.data[base:]
+        self.power = self.power[base:]
+        self.detects = self.detects[base:]
+        self.emitted = cut - base
+        self.decided = stop - base
+        return pdw
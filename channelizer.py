@@ -0,0 +1,317 @@
+"""Polyphase FFT filter bank channelizer.
+
+A wideband stream is split into num_channels channels spaced fs / num_channels
+apart. Channel k is the stream mixed down by k / num_channels cycles per
+sample, low pass filtered by the prototype filter and decimated, and all the
+channels of one output sample come from one FFT of the last
+num_channels * taps_per_channel input samples weighted by the filter and
+folded into num_channels polyphase branches. Critically sampled banks
+decimate by num_channels, 2x oversampled banks by num_channels / 2, which
+keeps the channel edges free of aliases at twice the output rate.
+
+Real input has a mirrored spectrum, channel k and channel num_channels - k
+are conjugates, so only the channels at and above 0 Hz are returned for it,
+as np.fft.rfft does.
+
+Each channel is then detected on its own, at its own noise floor and at the
+decimated rate, and the phase advance over each pulse gives its offset from
+the channel center, which fills the rf field of the PDWs.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import polars as pl
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+from pulse_simulator import Pdw, StreamingDetector, extract_pdws
+from tdoa import pdw_frame
+
+
+def prototype_filter(num_channels: int, taps_per_channel: int = 8) -> np.ndarray:
+    """Low pass prototype of a filter bank, unit gain at DC.
+
+    Parameters
+    ----------
+    num_channels : int
+    taps_per_channel : int, optional
+        by default 8
+
+    Returns
+    -------
+    np.ndarray
+        num_channels * taps_per_channel taps, cut off at the channel edge
+
+    """
+    return signal.firwin(
+        num_channels * taps_per_channel,
+        1 / num_channels,
+        window=("kaiser", 8.0),
+    )
+
+
+class Channelizer:
+    """FFT filter bank over consecutive blocks of one stream.
+
+    The last len(taps) - 1 samples and the sample count are carried between
+    blocks, so the outputs of the blocks concatenated equal the outputs of
+    the whole stream whatever the block sizes.
+
+    Parameters
+    ----------
+    num_channels : int
+    taps_per_channel : int, optional
+        by default 8
+    oversample : int, optional
+        1 for a critically sampled bank, 2 for twice the channel rate, by
+        default 1
+    dtype : np.dtype, optional
+        complex dtype of the outputs, by default complex64
+    """
+
+    def __init__(
+        self,
+        num_channels: int,
+        taps_per_channel: int = 8,
+        oversample: int = 1,
+        dtype: np.dtype = np.complex64,
+    ) -> None:
+        if oversample not in {1, 2} or num_channels % oversample:
+            msg = "oversample must be 1 or 2 and divide num_channels"
+            raise ValueError(msg)
+        self.num_channels = num_channels
+        self.decimation = num_channels // oversample
+        self.dtype = np.dtype(dtype)
+        taps = prototype_filter(num_channels, taps_per_channel)
+        # reversed, to weight windows that run forward in time
+        self._taps = (
+            taps[::-1]
+            .reshape(taps_per_channel, num_channels)
+            .astype(np.finfo(self.dtype).dtype)
+        )
+        k = np.arange(num_channels)
+        self._phases = np.exp(-2j * np.pi * np.outer(k, k) / num_channels).astype(
+            self.dtype,
+        )
+        self.reset()
+
+    @property
+    def delay(self) -> float:
+        """Group delay of the prototype filter in input samples."""
+        return (self._taps.size - 1) / 2
+
+    @property
+    def offset(self) -> int:
+        """Position in the next block of its first output sample."""
+        return -self._count % self.decimation
+
+    def reset(self) -> None:
+        self._tail = np.zeros(self._taps.size - 1, dtype=self.dtype)
+        self._count = 0
+
+    def channel_freqs(self, sample_rate_s: float) -> np.ndarray:
+        """Center frequency of each channel, in FFT order."""
+        return np.fft.fftfreq(self.num_channels, sample_rate_s)
+
+    def __call__(self, data: np.ndarray) -> np.ndarray:
+        """Channelize the next block.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            real or complex samples
+
+        Returns
+        -------
+        np.ndarray
+            shape (num_channels, num_outputs), one row per channel, for the
+            input samples at offset, offset + decimation, ... of the block,
+            num_channels // 2 + 1 rows for real data
+
+        """
+        data = np.asarray(data)
+        rows = (
+            self.num_channels if np.iscomplexobj(data) else self.num_channels // 2 + 1
+        )
+        lead = len(self._tail)
+        block = np.concatenate([self._tail, data.astype(self.dtype, copy=False)])
+        start = self.offset
+        # window of each output, ending on its input sample
+        windows = sliding_window_view(block, self._taps.size)[start :: self.decimation]
+
+        # fold into the polyphase branches, a multiply-add per tap of each
+        (num_taps, num_channels) = self._taps.shape
+        folded = np.multiply(windows[:, :num_channels], self._taps[0])
+        scratch = np.empty_like(folded)
+        for tap in range(1, num_taps):
+            branch = windows[:, tap * num_channels : (tap + 1) * num_channels]
+            folded += np.multiply(branch, self._taps[tap], out=scratch)
+        outputs = np.fft.fft(folded, axis=1)[:, :rows]
+
+        # the FFT phase runs from the start of each window, turn it to the
+        # global sample so every channel is at baseband
+        ends = self._count + start + self.decimation * np.arange(len(windows)) + 1
+        outputs *= self._phases[ends % num_channels, :rows]
+
+        self._tail = block[len(block) - lead :].copy()
+        self._count += len(data)
+        return np.ascontiguousarray(outputs.T)
+
+
+class ChannelDetector:
+    """StreamingDetector on every channel of a Channelizer.
+
+    Pulses still open at the end of a block are held back until they close
+    or flush is called. A pulse between two channels can be reported in
+    both, remove_dupes with an rf_tol of the channel spacing merges them.
+    Channels of real input, with half the rows, give the RF as a positive
+    frequency.
+
+    The box sum of the detector reaches threshold threshold / pa samples
+    into a pulse, its toa is moved back by that time.
+
+    Channels are detected on a thread pool, started on the first push and
+    shut down by close, or on leaving a with block.
+
+    Parameters
+    ----------
+    channelizer : Channelizer
+        source of the channel samples, for the channel frequencies and rates
+    sample_rate_s : float
+        input sample period
+    pw_s : float
+    threshold : float, optional
+        detector threshold on the channel envelope, by default 400
+    max_workers : int | None, optional
+        threads detecting channels, by default None
+    """
+
+    def __init__(
+        self,
+        channelizer: Channelizer,
+        sample_rate_s: float,
+        pw_s: float,
+        threshold: float = 400,
+        max_workers: int | None = None,
+    ) -> None:
+        self.channel_rate_s = sample_rate_s * channelizer.decimation
+        self.delay_s = channelizer.delay * sample_rate_s
+        self.freqs = channelizer.channel_freqs(sample_rate_s)
+        self.detectors = [
+            StreamingDetector(self.channel_rate_s, pw_s, threshold)
+            for _ in range(channelizer.num_channels)
+        ]
+        self.threshold = threshold
+        self.real = False
+        self._held: list[tuple | None] = [None] * channelizer.num_channels
+        self._max_workers = max_workers
+        self._pool: ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> ChannelDetector:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the thread pool, a later push starts a new one."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def push(self, times: np.ndarray, channels: np.ndarray) -> pl.DataFrame:
+        """PDWs of the pulses that closed in this block.
+
+        Parameters
+        ----------
+        times : np.ndarray
+            time of each channel output sample
+        channels : np.ndarray
+            output of Channelizer
+
+        Returns
+        -------
+        pl.DataFrame
+            pulses of every channel as from pdw_frame, sorted by toa
+
+        """
+        self.real = len(channels) < len(self.detectors)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers)
+        pdws = self._pool.map(
+            self._push_channel,
+            range(len(channels)),
+            [times] * len(channels),
+            channels,
+        )
+        return self._frame(list(pdws))
+
+    def flush(self) -> pl.DataFrame | None:
+        held = [_ for _ in range(len(self._held)) if self._held[_] is not None]
+        if not held:
+            return None
+        pdws = [self._pdws(_, *self._held[_]) for _ in held]
+        self._held = [None] * len(self._held)
+        return self._frame(pdws)
+
+    def _push_channel(
+        self,
+        channel: int,
+        times: np.ndarray,
+        samples: np.ndarray,
+    ) -> Pdw:
+        detects = self.detectors[channel](samples)
+        block = (times, detects, samples)
+        if self._held[channel] is not None:
+            block = tuple(np.concatenate(_) for _ in zip(self._held[channel], block))
+            self._held[channel] = None
+        (times, detects, samples) = block
+        # hold back a pulse still open at the end of the block
+        if len(detects) and detects[-1]:
+            gaps = np.flatnonzero(detects == 0)
+            start = gaps[-1] + 1 if len(gaps) else 0
+            self._held[channel] = tuple(_[start:] for _ in block)
+            (times, detects, samples) = (_[:start] for _ in block)
+        return self._pdws(channel, times, detects, samples)
+
+    def _pdws(
+        self,
+        channel: int,
+        times: np.ndarray,
+        detects: np.ndarray,
+        samples: np.ndarray,
+    ) -> Pdw:
+        pdw = extract_pdws(times - self.delay_s, detects, samples, self.channel_rate_s)
+        if len(pdw.toa_s) == 0:
+            return pdw
+        # mean phase advance per sample over each pulse
+        edges = np.diff(np.asarray(detects, dtype=np.int8), prepend=0, append=0)
+        (starts, stops) = (np.flatnonzero(edges > 0), np.flatnonzero(edges < 0))
+        advance = np.zeros(len(samples) + 1, dtype=np.complex128)
+        advance[2:] = samples[1:] * np.conj(samples[:-1])
+        advance[starts + 1] = 0
+        np.cumsum(advance, out=advance)
+        offset = np.angle(advance[stops] - advance[starts]) / (
+            2 * np.pi * self.channel_rate_s
+        )
+        pdw.rf_s = self.freqs[channel] + offset
+        if self.real:
+            pdw.rf_s = np.abs(pdw.rf_s)
+        pdw.toa_s = pdw.toa_s - self.threshold / pdw.pa * self.channel_rate_s
+        return pdw
+
+    @staticmethod
+    def _frame(pdws: list[Pdw]) -> pl.DataFrame:
+        return pdw_frame(
+            Pdw(
+                *(
+                    np.concatenate(
+                        [np.asarray(getattr(_, name), dtype=float) for _ in pdws]
+                    )
+                    for name in ["toa_s", "pw_s", "rf_s", "pa"]
+                ),
+            ),
+        )
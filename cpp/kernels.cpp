@@ -0,0 +1,325 @@
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <limits>
+#include <stdexcept>
+#include <vector>
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+namespace py = pybind11;
+
+// Arrays are taken as c-contiguous buffers of the expected dtype. Inputs that
+// already match are used in place through the buffer protocol, anything else
+// is converted once by pybind11.
+using DoubleArray = py::array_t<double, py::array::c_style | py::array::forcecast>;
+using IntArray = py::array_t<int64_t, py::array::c_style | py::array::forcecast>;
+
+// Assign pulses start.. of a sorted TOA array to bursts in place.
+//
+// A pulse joins the burst of the earlier pulse closest to toa - pri when
+// that distance is within tol, otherwise it starts a new burst. Ties go to
+// the older burst. Groups before start are taken as already assigned, which
+// lets a stream carry its recent pulses into the next batch. Candidates are
+// found by binary search so the cost is O(n log n) plus the number of pulses
+// inside each tolerance window. Returns the next unused burst index.
+int64_t extend_bursts(DoubleArray toas, py::array_t<int64_t, py::array::c_style> groups,
+                      py::ssize_t start, int64_t next_group, double pri, double tol)
+{
+    auto t = toas.unchecked<1>();
+    const py::ssize_t n = t.shape(0);
+    if (groups.shape(0) != n)
+    {
+        throw std::invalid_argument("groups must have the same length as toas");
+    }
+    auto g = groups.mutable_unchecked<1>();
+    const double *data = toas.data();
+
+    {
+        py::gil_scoped_release release;
+        for (py::ssize_t idx = std::max<py::ssize_t>(start, 0); idx < n; ++idx)
+        {
+            const double target = t(idx) - pri;
+            const double *lo = std::lower_bound(data, data + idx, target - tol);
+            const double *hi = std::upper_bound(lo, data + idx, target + tol);
+
+            double best_dist = std::numeric_limits<double>::infinity();
+            int64_t best_group = -1;
+            for (const double *p = lo; p < hi; ++p)
+            {
+                const double dist = std::abs(target - *p);
+                const int64_t group = g(p - data);
+                if (dist < best_dist || (dist == best_dist && group < best_group))
+                {
+                    best_dist = dist;
+                    best_group = group;
+                }
+            }
+
+            if (best_group < 0 || best_dist > tol)
+            {
+                g(idx) = next_group++;
+            }
+            else
+            {
+                g(idx) = best_group;
+            }
+        }
+    }
+
+    return next_group;
+}
+
+// Assign each pulse of a sorted TOA array to a burst.
+py::array_t<int64_t> assign_bursts(DoubleArray toas, double pri, double tol)
+{
+    py::array_t<int64_t> groups(toas.shape(0));
+    extend_bursts(toas, groups, 0, 0, pri, tol);
+    return groups;
+}
+
+// Norm of the data folded at each frame length.
+//
+// Equivalent to calc_norm(frame_array(data, length)) for every length
+// without materialising the zero padded frame matrix.
+py::array_t<double> fold_norms(DoubleArray data, IntArray frame_lengths)
+{
+    auto d = data.unchecked<1>();
+    auto lengths = frame_lengths.unchecked<1>();
+    const py::ssize_t n = d.shape(0);
+    const py::ssize_t num_lengths = lengths.shape(0);
+    py::array_t<double> norms(num_lengths);
+    auto out = norms.mutable_unchecked<1>();
+
+    {
+        py::gil_scoped_release release;
+        std::vector<double> sums;
+        for (py::ssize_t k = 0; k < num_lengths; ++k)
+        {
+            const int64_t length = lengths(k);
+            if (length <= 0)
+            {
+                out(k) = std::numeric_limits<double>::quiet_NaN();
+                continue;
+            }
+            sums.assign(static_cast<size_t>(length), 0.0);
+            for (py::ssize_t idx = 0; idx < n; ++idx)
+            {
+                sums[static_cast<size_t>(idx % length)] += d(idx);
+            }
+            double norm = 0.0;
+            for (const double s : sums)
+            {
+                norm = std::max(norm, std::abs(s));
+            }
+            out(k) = norm / static_cast<double>(length);
+        }
+    }
+
+    return norms;
+}
+
+// Histogram of all pairwise differences of a sorted TOA array.
+//
+// Matches np.histogram(find_diffs(toas), bins=edges) while using O(bins)
+// memory. The inner loop stops as soon as differences pass the last edge.
+py::array_t<int64_t> diff_histogram(DoubleArray toas, DoubleArray edges)
+{
+    auto t = toas.unchecked<1>();
+    const py::ssize_t n = t.shape(0);
+    const double *e = edges.data();
+    const py::ssize_t num_edges = edges.shape(0);
+    if (num_edges < 2)
+    {
+        throw std::invalid_argument("edges must have at least two entries");
+    }
+    const py::ssize_t num_bins = num_edges - 1;
+    py::array_t<int64_t> counts(num_bins);
+    auto c = counts.mutable_unchecked<1>();
+    for (py::ssize_t b = 0; b < num_bins; ++b)
+    {
+        c(b) = 0;
+    }
+
+    {
+        py::gil_scoped_release release;
+        const double first = e[0];
+        const double last = e[num_edges - 1];
+        for (py::ssize_t i = 0; i < n; ++i)
+        {
+            for (py::ssize_t j = i + 1; j < n; ++j)
+            {
+                const double diff = t(j) - t(i);
+                if (diff > last)
+                {
+                    break;
+                }
+                if (diff < first)
+                {
+                    continue;
+                }
+                py::ssize_t bin = std::upper_bound(e, e + num_edges, diff) - e - 1;
+                c(std::min(bin, num_bins - 1)) += 1;
+            }
+        }
+    }
+
+    return counts;
+}
+
+// Flag pulses that duplicate an earlier pulse of a sorted TOA array.
+//
+// Pulse i is a duplicate when any earlier pulse is within tol in TOA and
+// rf_tol in RF, adjacent or not. The scan back from each pulse stops at the
+// first match or once TOAs are more than tol apart, so the cost is the
+// number of pulse pairs inside the time window.
+py::array_t<bool> duplicate_mask(DoubleArray toas, DoubleArray rfs, double tol, double rf_tol)
+{
+    auto t = toas.unchecked<1>();
+    auto r = rfs.unchecked<1>();
+    const py::ssize_t n = t.shape(0);
+    if (r.shape(0) != n)
+    {
+        throw std::invalid_argument("toas and rfs must have the same length");
+    }
+    py::array_t<bool> dup(n);
+    auto d = dup.mutable_unchecked<1>();
+
+    {
+        py::gil_scoped_release release;
+        for (py::ssize_t i = 0; i < n; ++i)
+        {
+            d(i) = false;
+            for (py::ssize_t j = i - 1; j >= 0 && t(i) - t(j) <= tol; --j)
+            {
+                if (std::abs(r(i) - r(j)) <= rf_tol)
+                {
+                    d(i) = true;
+                    break;
+                }
+            }
+        }
+    }
+
+    return dup;
+}
+
+// Ordered statistic of the CFAR training cells around each cell.
+//
+// For cells start..stop the training cells are the num_train cells either
+// side of the cell beyond num_guard guard cells, clipped to the array. The
+// window slides one cell at a time, adding and removing at most four cells,
+// and a Fenwick tree over the value ranks finds the k-th smallest in
+// O(log n), so the cost per cell does not depend on the window size.
+py::array_t<double> os_cfar_noise(DoubleArray power, int64_t num_train, int64_t num_guard,
+                                  double quantile, int64_t start, int64_t stop)
+{
+    auto p = power.unchecked<1>();
+    const int64_t n = p.shape(0);
+    start = std::max<int64_t>(start, 0);
+    stop = std::min<int64_t>(stop, n);
+    py::array_t<double> noise(std::max<int64_t>(stop - start, 0));
+    auto out = noise.mutable_unchecked<1>();
+
+    {
+        py::gil_scoped_release release;
+        std::vector<int64_t> order(n);
+        for (int64_t idx = 0; idx < n; ++idx)
+        {
+            order[idx] = idx;
+        }
+        std::sort(order.begin(), order.end(),
+                  [&p](int64_t a, int64_t b) { return p(a) < p(b) || (p(a) == p(b) && a < b); });
+        std::vector<int64_t> rank(n);
+        for (int64_t r = 0; r < n; ++r)
+        {
+            rank[order[r]] = r;
+        }
+
+        std::vector<int64_t> tree(n + 1, 0);
+        int64_t count = 0;
+        auto update = [&](int64_t idx, int64_t delta)
+        {
+            if (idx < 0 || idx >= n)
+            {
+                return;
+            }
+            count += delta;
+            for (int64_t pos = rank[idx] + 1; pos <= n; pos += pos & -pos)
+            {
+                tree[pos] += delta;
+            }
+        };
+        int64_t log_n = 1;
+        while ((log_n << 1) <= n)
+        {
+            log_n <<= 1;
+        }
+        auto kth = [&](int64_t k)
+        {
+            // smallest rank with k + 1 members at or below it
+            int64_t pos = 0;
+            for (int64_t step = log_n; step > 0; step >>= 1)
+            {
+                if (pos + step <= n && tree[pos + step] <= k)
+                {
+                    pos += step;
+                    k -= tree[pos];
+                }
+            }
+            return p(order[pos]);
+        };
+
+        for (int64_t cell = start; cell < stop; ++cell)
+        {
+            if (cell == start)
+            {
+                for (int64_t offset = num_guard + 1; offset <= num_guard + num_train; ++offset)
+                {
+                    update(cell - offset, 1);
+                    update(cell + offset, 1);
+                }
+            }
+            else
+            {
+                update(cell - num_guard - num_train - 1, -1);
+                update(cell - num_guard - 1, 1);
+                update(cell + num_guard, -1);
+                update(cell + num_guard + num_train, 1);
+            }
+
+            if (count == 0)
+            {
+                out(cell - start) = std::numeric_limits<double>::quiet_NaN();
+            }
+            else
+            {
+                const auto k = static_cast<int64_t>(std::floor(quantile * (count - 1) + 0.5));
+                out(cell - start) = kth(k);
+            }
+        }
+    }
+
+    return noise;
+}
+
+PYBIND11_MODULE(_kernels, m)
+{
+    m.doc() = "Native kernels for the deinterleaver hot loops";
+
+    m.def("extend_bursts", &extend_bursts, py::arg("toas"), py::arg("groups"), py::arg("start"),
+          py::arg("next_group"), py::arg("pri"), py::arg("tol"),
+          "Assign sorted TOAs from start onwards to bursts in place");
+    m.def("assign_bursts", &assign_bursts, py::arg("toas"), py::arg("pri"), py::arg("tol"),
+          "Assign sorted TOAs to bursts by PRI");
+    m.def("fold_norms", &fold_norms, py::arg("data"), py::arg("frame_lengths"),
+          "Norm of data folded at each frame length");
+    m.def("diff_histogram", &diff_histogram, py::arg("toas"), py::arg("edges"),
+          "Histogram of pairwise differences of sorted TOAs");
+    m.def("duplicate_mask", &duplicate_mask, py::arg("toas"), py::arg("rfs"), py::arg("tol"),
+          py::arg("rf_tol"), "Flag pulses within tol and rf_tol of an earlier pulse");
+    m.def("os_cfar_noise", &os_cfar_noise, py::arg("power"), py::arg("num_train"),
+          py::arg("num_guard"), py::arg("quantile"), py::arg("start"), py::arg("stop"),
+          "Ordered statistic of the CFAR training cells of each cell");
+}
@@ -1,7 +1,8 @@
-import example
+import numpy as np
 
-print(example.add(5, 8))
+import _kernels
 
-
-
-def sum_exps(int:)
\ No newline at end of file
+toas = np.array([5.0, 7, 10, 12, 15, 32, 37])
+print(_kernels.assign_bursts(toas, 5, 0.5))
+print(_kernels.fold_norms(np.ones(10), np.array([2, 3])))
+print(_kernels.diff_histogram(toas, np.linspace(0, 10, 6)))
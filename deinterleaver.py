@@ -1,8 +1,30 @@
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
 import polars as pl
 
+from kernels import assign_bursts, duplicate_mask, extend_bursts
+from memory import measured
+from timing import timed
+
+
+def remove_dupes(
+    df: pl.DataFrame,
+    tol: int = 5,
+    rf_tol: float = 10,
+    time_col: str = "toa",
+    rf_col: str = "rf",
+) -> pl.DataFrame:
+    """Remove duplicates near enough in time and frequency.
 
-def remove_dupes(df: pl.DataFrame, tol: int = 5, rf_tol: float = 10) -> pl.DataFrame:
-    """Remove duplicates near enough in time.
+    A pulse is dropped when any earlier pulse, not only the previous one, is
+    within tol in time and rf_tol in RF, so interleaved copies of a pulse
+    from several receivers are caught. Without an RF column only time is
+    compared.
 
     Parameters
     ----------
@@ -10,22 +32,36 @@ def remove_dupes(df: pl.DataFrame, tol: int = 5, rf_tol: float = 10) -> pl.DataF
         _description_
     tol : int, optional
         _description_, by default 5
+    rf_tol : float, optional
+        by default 10
+    time_col : str, optional
+        by default "toa"
+    rf_col : str, optional
+        by default "rf"
 
     Returns
     -------
     pl.DataFrame
+        pulses sorted by time_col
 
     """
-    df = df.with_columns(pl.col("toa").diff().fill_null(2 * tol).alias("deltas"))
-    df = df.with_columns(
-        pl.when(pl.col("deltas") > tol).then(1).otherwise(0).alias("jumps"),
-    )
+    df = df.sort(time_col, maintain_order=True)
+    return df.filter(~_duplicates(df, tol, rf_tol, time_col, rf_col))
 
-    df = df.filter(pl.col("jumps") == 1).drop(["deltas", "jumps"])
 
-    return df
+def _duplicates(
+    df: pl.DataFrame,
+    tol: float,
+    rf_tol: float,
+    time_col: str,
+    rf_col: str,
+) -> np.ndarray:
+    toas = df[time_col].to_numpy()
+    rfs = df[rf_col].to_numpy() if rf_col in df.columns else np.zeros(len(df))
+    return duplicate_mask(toas, rfs, tol, rf_tol)
 
 
+@timed(bytes_arg="df")
 def filter_by_pri(df: pl.DataFrame, pri: float, tol: float = 0.1) -> pl.DataFrame:
     """Fitler for pulses that match the PRI.
 
@@ -74,6 +110,8 @@ def filter_by_pri(df: pl.DataFrame, pri: float, tol: float = 0.1) -> pl.DataFram
     )
 
 
+@timed(bytes_arg="df")
+@measured(bytes_arg="df")
 def group_by_burst(
     df: pl.DataFrame,
     pri: float,
@@ -82,38 +120,14 @@ def group_by_burst(
     time_col: str = "toa",
     burst_col: str = "burst_group",
 ) -> pl.DataFrame:
+    df = df.sort(time_col)
     df = df.with_columns(
-        pl.lit(-1).alias(burst_col),
-    ).sort(
-        time_col,
+        pl.Series(burst_col, assign_bursts(df[time_col].to_numpy(), pri, tol)),
     )
-    for idx, toa in enumerate(df.select(time_col).to_numpy()):
-        dist_col = "dist"
-        bursts_found = (
-            df.filter(pl.col(burst_col) > -1)
-            .with_columns(
-                (toa - pri - pl.col(time_col))
-                .abs()
-                .min()
-                .over(burst_col)
-                .alias(dist_col),
-            )
-            .select(burst_col, dist_col)
-        )
-        if (len(bursts_found) == 0) or (bursts_found[dist_col].min() > tol):
-            df[idx, burst_col] = max(df[burst_col]) + 1
-        else:
-            df[idx, burst_col] = bursts_found.item(
-                bursts_found[dist_col].arg_min(),
-                burst_col,
-            )
 
     return (
-        df.filter(
-            pl.col(burst_col) > -1,
-            pl.len().over(burst_col) >= min_num_pulses,
-        )
-        .sort(burst_col)
+        df.filter(pl.len().over(burst_col) >= min_num_pulses)
+        .sort(burst_col, maintain_order=True)
         .with_columns(pl.col(burst_col).rle_id().cast(pl.Int64))
     )
 
@@ -173,5 +187,338 @@ def remove_duplicates(
     )
 
 
+def rf_bands(
+    rf: np.ndarray,
+    num_bands: int,
+    guard: float,
+) -> list[tuple[float, float, float, float]]:
+    """Split the RF range into equal bands with guard bands around them.
+
+    Parameters
+    ----------
+    rf : np.ndarray
+    num_bands : int
+    guard : float
+        RF added on each side of a band, at least the RF spread of one
+        emitter so a burst near an edge is seen whole by one band
+
+    Returns
+    -------
+    list[tuple[float, float, float, float]]
+        low and high edge of each band and of its guarded range, the outer
+        edges are open, a single open band when rf is empty
+
+    """
+    rf = np.asarray(rf)
+    if len(rf) == 0:
+        return [(-np.inf, np.inf, -np.inf, np.inf)]
+    edges = np.linspace(rf.min(), rf.max(), num_bands + 1)
+    edges[[0, -1]] = [-np.inf, np.inf]
+    return [(lo, hi, lo - guard, hi + guard) for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+def _deinterleave_band(
+    shm_name: str,
+    num_pulses: int,
+    rf_lo: float,
+    rf_hi: float,
+    pri: float,
+    tol: float,
+    min_num_pulses: int,
+    dedup_tol: float,
+    rf_tol: float,
+    filter_pri: bool,
+) -> pl.DataFrame:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        columns = np.ndarray((2, num_pulses), dtype=np.float64, buffer=shm.buf)
+        rows = np.flatnonzero((columns[1] >= rf_lo) & (columns[1] < rf_hi))
+        df = pl.DataFrame(
+            {"row": rows, "toa": columns[0, rows], "rf": columns[1, rows]}
+        )
+        del columns
+    finally:
+        shm.close()
+
+    df = remove_dupes(df, dedup_tol, rf_tol)
+    if filter_pri and len(df):
+        df = filter_by_pri(df, pri, tol)
+    return group_by_burst(df, pri, tol, min_num_pulses).select(
+        "row",
+        "rf",
+        "burst_group",
+    )
+
+
+def partitioned_deinterleave(
+    df: pl.DataFrame,
+    pri: float,
+    tol: float = 0.1,
+    min_num_pulses: int = 5,
+    num_bands: int = 8,
+    guard: float = 20,
+    dedup_tol: float = 0.0,
+    rf_tol: float = 10,
+    filter_pri: bool = True,
+    executor: Executor | None = None,
+    max_workers: int | None = None,
+    time_col: str = "toa",
+    rf_col: str = "rf",
+    burst_col: str = "burst_group",
+) -> pl.DataFrame:
+    """Deinterleave each RF band in parallel.
+
+    The pulses of every band and its guard bands run through remove_dupes,
+    filter_by_pri and group_by_burst in a worker. Workers read the TOA and
+    RF columns from shared memory and return only row numbers and bursts.
+    A burst is kept by the band its mean RF falls in, so bursts across a band
+    edge are seen by both neighbours and kept once. Pulses claimed by two
+    kept bursts stay with the larger one.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+    pri : float
+    tol : float, optional
+        by default 0.1
+    min_num_pulses : int, optional
+        by default 5
+    num_bands : int, optional
+        by default 8
+    guard : float, optional
+        RF overlap of neighbouring bands, by default 20
+    dedup_tol : float, optional
+        tol of remove_dupes, by default 0.0
+    rf_tol : float, optional
+        rf_tol of remove_dupes, by default 10
+    filter_pri : bool, optional
+        run filter_by_pri before grouping, by default True
+    executor : Executor | None, optional
+        by default a spawned process pool of max_workers, a forked pool can
+        deadlock in polars
+    max_workers : int | None, optional
+        1 runs the bands in this process, by default the number of CPUs
+    time_col : str, optional
+        by default "toa"
+    rf_col : str, optional
+        by default "rf"
+    burst_col : str, optional
+        by default "burst_group"
+
+    Returns
+    -------
+    pl.DataFrame
+        pulses of df with burst_col, as from group_by_burst
+
+    """
+    bands = rf_bands(df[rf_col].to_numpy(), num_bands, guard)
+    num_pulses = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(16 * num_pulses, 1))
+    try:
+        columns = np.ndarray((2, num_pulses), dtype=np.float64, buffer=shm.buf)
+        columns[0] = df[time_col].to_numpy()
+        columns[1] = df[rf_col].to_numpy()
+        del columns
+
+        args = (
+            [shm.name] * len(bands),
+            [num_pulses] * len(bands),
+            [_[2] for _ in bands],
+            [_[3] for _ in bands],
+            *([_] * len(bands) for _ in [pri, tol, min_num_pulses, dedup_tol, rf_tol]),
+            [filter_pri] * len(bands),
+        )
+        if executor is not None:
+            results = list(executor.map(_deinterleave_band, *args))
+        elif max_workers == 1:
+            results = list(map(_deinterleave_band, *args))
+        else:
+            # polars can deadlock in forked children, so workers are spawned
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers, mp_context=context) as pool:
+                results = list(pool.map(_deinterleave_band, *args))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return _reconcile_bands(df, bands, results, min_num_pulses, time_col, burst_col)
+
+
+def _reconcile_bands(
+    df: pl.DataFrame,
+    bands: list[tuple[float, float, float, float]],
+    results: list[pl.DataFrame],
+    min_num_pulses: int,
+    time_col: str,
+    burst_col: str,
+) -> pl.DataFrame:
+    claims = pl.concat(
+        [
+            res.with_columns(band=pl.lit(band, dtype=pl.Int64)).filter(
+                pl.col("rf").mean().over("burst_group").is_between(lo, hi, "left")
+            )
+            for band, ((lo, hi, _, _), res) in enumerate(zip(bands, results))
+        ],
+    )
+    claims = (
+        claims.with_columns(size=pl.len().over("band", "burst_group"))
+        .sort("size", "band", "burst_group", descending=[True, False, False])
+        .unique("row", keep="first")
+        .filter(pl.len().over("band", "burst_group") >= min_num_pulses)
+    )
+    rows = claims["row"].to_numpy()
+    return (
+        df[rows]
+        .with_columns(
+            pl.Series("band", claims["band"]),
+            pl.Series(burst_col, claims["burst_group"]),
+        )
+        .sort(time_col)
+        .with_columns(pl.col(time_col).min().over("band", burst_col).alias("first"))
+        .sort("first", "band", burst_col, time_col)
+        .with_columns(
+            pl.struct("band", burst_col).rle_id().cast(pl.Int64).alias(burst_col)
+        )
+        .drop("band", "first")
+    )
+
+
+class StreamingDeduper:
+    """remove_dupes over a stream of time ordered batches.
+
+    The pulses within tol of the newest TOA are carried over, so the pulses
+    of the next batch are compared against them, giving the same result as
+    remove_dupes on the concatenated stream.
+    """
+
+    def __init__(
+        self,
+        tol: float = 5,
+        rf_tol: float = 10,
+        time_col: str = "toa",
+        rf_col: str = "rf",
+    ) -> None:
+        self.tol = tol
+        self.rf_tol = rf_tol
+        self.time_col = time_col
+        self.rf_col = rf_col
+        self._recent = None
+
+    def push(self, df: pl.DataFrame) -> pl.DataFrame:
+        if len(df) == 0:
+            return df
+
+        df = df.sort(self.time_col, maintain_order=True)
+        if self._recent is None:
+            both = df
+        else:
+            both = pl.concat([self._recent, df], how="diagonal_relaxed")
+        dup = _duplicates(both, self.tol, self.rf_tol, self.time_col, self.rf_col)
+
+        horizon = df[self.time_col][-1] - self.tol
+        self._recent = both.filter(pl.col(self.time_col) >= horizon).select(
+            [_ for _ in [self.time_col, self.rf_col] if _ in both.columns],
+        )
+        return df.filter(~dup[len(both) - len(df) :])
+
+
+class StreamingBurstGrouper:
+    """group_by_burst over a stream of time ordered batches.
+
+    Only the pulses that can still be matched by a future pulse, those within
+    pri + tol of the newest TOA, are kept for the burst search. A burst is
+    emitted once its last pulse falls behind that horizon, so memory is
+    bounded by the open bursts rather than the stream length. Bursts are
+    numbered in the order they are emitted.
+    """
+
+    def __init__(
+        self,
+        pri: float,
+        tol: float = 0.1,
+        min_num_pulses: int = 5,
+        time_col: str = "toa",
+        burst_col: str = "burst_group",
+    ) -> None:
+        self.pri = pri
+        self.tol = tol
+        self.min_num_pulses = min_num_pulses
+        self.time_col = time_col
+        self.burst_col = burst_col
+        self._toas = np.empty(0)
+        self._groups = np.empty(0, dtype=np.int64)
+        self._next_group = 0
+        self._num_emitted = 0
+        self._pending = None
+
+    def push(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Add a batch of pulses.
+
+        Parameters
+        ----------
+        df : pl.DataFrame
+            pulses no earlier than the previous batch
+
+        Returns
+        -------
+        pl.DataFrame
+            bursts that can no longer grow
+
+        """
+        df = df.sort(self.time_col)
+        new_toas = df[self.time_col].to_numpy().astype(float)
+        if len(new_toas) and len(self._toas) and new_toas[0] < self._toas[-1]:
+            msg = "batches must arrive in time order"
+            raise ValueError(msg)
+
+        start = len(self._toas)
+        toas = np.concatenate([self._toas, new_toas])
+        groups = np.empty(len(toas), dtype=np.int64)
+        groups[:start] = self._groups
+        self._next_group = extend_bursts(
+            toas,
+            groups,
+            start,
+            self._next_group,
+            self.pri,
+            self.tol,
+        )
+
+        new = df.with_columns(pl.Series(self.burst_col, groups[start:]))
+        pending = new if self._pending is None else pl.concat([self._pending, new])
+        if len(toas) == 0:
+            return self._emit(pending.clear())
+
+        horizon = toas[-1] - self.pri - self.tol
+        keep = toas >= horizon
+        self._toas = toas[keep]
+        self._groups = groups[keep]
+
+        closed = pl.col(self.time_col).max().over(self.burst_col) < horizon
+        self._pending = pending.filter(~closed)
+        return self._emit(pending.filter(closed))
+
+    def flush(self) -> pl.DataFrame:
+        """Emit all open bursts and reset the stream."""
+        pending = self._pending
+        self._toas = np.empty(0)
+        self._groups = np.empty(0, dtype=np.int64)
+        self._pending = None
+        if pending is None:
+            return pl.DataFrame()
+        return self._emit(pending)
+
+    def _emit(self, closed: pl.DataFrame) -> pl.DataFrame:
+        bursts = (
+            closed.filter(pl.len().over(self.burst_col) >= self.min_num_pulses)
+            .sort(self.burst_col, maintain_order=True)
+            .with_columns(
+                (pl.col(self.burst_col).rle_id() + self._num_emitted).cast(pl.Int64),
+            )
+        )
+        self._num_emitted += bursts[self.burst_col].n_unique()
+        return bursts
+
+
 if __name__ == "__main__":
     print("hello")
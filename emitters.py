@@ -0,0 +1,368 @@
+"""Library of known emitters for burst association.
+
+Each emitter is a box of PRI, RF and PW ranges. The box centers are held in
+a KD-tree scaled so that every box fits in a cube of the same radius around
+its center, so the boxes containing a point are found among the centers
+within that radius and a batch of bursts costs one tree query. Entries added
+since the tree was built are searched directly until there are rebuild_size
+of them, which keeps adding emitters one at a time cheap.
+
+The cube radius is set by the widest range of each dimension, so a few very
+wide entries make every query check more candidates. Give them their own
+library when that matters.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from scipy.spatial import cKDTree
+
+DIMS = ("pri", "rf", "pw")
+
+
+def burst_features(
+    df: pl.DataFrame,
+    time_col: str = "toa",
+    burst_col: str = "burst_group",
+) -> pl.DataFrame:
+    """Mean PRI, RF and PW of each burst.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        pulses tagged by group_by_burst
+    time_col : str, optional
+        by default "toa"
+    burst_col : str, optional
+        by default "burst_group"
+
+    Returns
+    -------
+    pl.DataFrame
+        burst_col, pri and the means of rf and pw where df has them
+
+    """
+    return (
+        df.sort(time_col)
+        .group_by(burst_col)
+        .agg(
+            pl.col(time_col).diff().mean().alias("pri"),
+            *[pl.col(_).mean() for _ in ["rf", "pw"] if _ in df.columns],
+        )
+        .sort(burst_col)
+    )
+
+
+class EmitterLibrary:
+    """Emitters by id, with their range of each dimension.
+
+    Ids are assigned in the order emitters are added and are not reused
+    after remove.
+
+    Parameters
+    ----------
+    dims : tuple[str, ...], optional
+        by default DIMS
+    scales : dict[str, float] | None, optional
+        unit of each dimension in nearest distances, by default the largest
+        half width of the ranges of that dimension
+    rebuild_size : int, optional
+        entries added before the tree is rebuilt, by default 1024
+    """
+
+    def __init__(
+        self,
+        dims: tuple[str, ...] = DIMS,
+        scales: dict[str, float] | None = None,
+        rebuild_size: int = 1024,
+    ) -> None:
+        self.dims = tuple(dims)
+        self.scales = scales
+        self.rebuild_size = rebuild_size
+        self.names: list[str] = []
+        self.lo = np.empty((0, len(self.dims)))
+        self.hi = np.empty((0, len(self.dims)))
+        self.alive = np.empty(0, dtype=bool)
+        self._tree: cKDTree | None = None
+        self._num_indexed = 0
+        self._scale = np.ones(len(self.dims))
+        self._radius = 0.0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive))
+
+    @property
+    def centers(self) -> np.ndarray:
+        return (self.lo + self.hi) / 2
+
+    def add(self, name: str, **ranges: tuple[float, float]) -> int:
+        """Add one emitter.
+
+        Parameters
+        ----------
+        name : str
+        ranges
+            (min, max) of each dimension, e.g. pri=(0.9e-3, 1.1e-3)
+
+        Returns
+        -------
+        int
+            id of the emitter
+
+        """
+        frame = pl.DataFrame(
+            {"name": [name]}
+            | {f"{dim}_min": [ranges[dim][0]] for dim in self.dims}
+            | {f"{dim}_max": [ranges[dim][1]] for dim in self.dims},
+        )
+        return int(self.extend(frame)[0])
+
+    def extend(self, frame: pl.DataFrame) -> np.ndarray:
+        """Add emitters from a frame.
+
+        Parameters
+        ----------
+        frame : pl.DataFrame
+            name and <dim>_min, <dim>_max of each dimension
+
+        Returns
+        -------
+        np.ndarray
+            ids of the emitters
+
+        """
+        lo = self._columns(frame, "_min")
+        hi = self._columns(frame, "_max")
+        if np.any(lo > hi):
+            msg = "every range needs min <= max"
+            raise ValueError(msg)
+
+        start = len(self.names)
+        self.names.extend(frame["name"].cast(pl.String).to_list())
+        self.lo = np.concatenate([self.lo, lo])
+        self.hi = np.concatenate([self.hi, hi])
+        self.alive = np.concatenate([self.alive, np.ones(len(frame), dtype=bool)])
+        if (
+            self._tree is None
+            or len(self.names) - self._num_indexed > self.rebuild_size
+        ):
+            self.rebuild()
+        return np.arange(start, len(self.names))
+
+    def remove(self, ids: int | np.ndarray) -> None:
+        self.alive[ids] = False
+
+    def rebuild(self) -> None:
+        """Index every entry in the tree."""
+        half_width = (self.hi - self.lo)[self.alive] / 2
+        widest = np.max(half_width, axis=0) if len(half_width) else self._scale
+        if self.scales is None:
+            self._scale = np.where(widest > 0, widest, 1.0)
+        else:
+            self._scale = np.array([self.scales[_] for _ in self.dims], dtype=float)
+        self._radius = float(np.max(widest / self._scale, initial=0.0))
+        self._tree = cKDTree(self.centers / self._scale)
+        self._num_indexed = len(self.names)
+
+    def frame(self) -> pl.DataFrame:
+        """Live emitters with their ids and ranges."""
+        ids = np.flatnonzero(self.alive)
+        return pl.DataFrame(
+            {"id": ids, "name": [self.names[_] for _ in ids]}
+            | {f"{dim}_min": self.lo[ids, pos] for pos, dim in enumerate(self.dims)}
+            | {f"{dim}_max": self.hi[ids, pos] for pos, dim in enumerate(self.dims)},
+        )
+
+    def match(self, points: pl.DataFrame | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Emitters whose ranges contain each point.
+
+        Parameters
+        ----------
+        points : pl.DataFrame | np.ndarray
+            a column per dimension, or an array of shape (n, len(dims))
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            point and emitter id of every match, sorted by point, points with
+            a missing or infinite value match nothing
+
+        """
+        points = self._points(points)
+        finite = np.flatnonzero(np.all(np.isfinite(points), axis=1))
+        (rows, ids) = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        if self._tree is not None and len(finite):
+            found = self._tree.query_ball_point(
+                points[finite] / self._scale,
+                r=self._radius * (1 + 1e-9),
+                p=np.inf,
+            )
+            counts = np.array([len(_) for _ in found], dtype=np.int64)
+            rows = np.repeat(finite, counts)
+            ids = np.concatenate([np.empty(0, dtype=np.int64), *found]).astype(np.int64)
+
+        recent = np.arange(self._num_indexed, len(self.names))
+        rows = np.concatenate([rows, np.repeat(finite, len(recent))])
+        ids = np.concatenate([ids, np.tile(recent, len(finite))])
+
+        inside = (
+            self.alive[ids]
+            & np.all(self.lo[ids] <= points[rows], axis=1)
+            & np.all(points[rows] <= self.hi[ids], axis=1)
+        )
+        order = np.lexsort((ids[inside], rows[inside]))
+        return (rows[inside][order], ids[inside][order])
+
+    def nearest(
+        self,
+        points: pl.DataFrame | np.ndarray,
+        k: int = 1,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Emitters with the nearest centers.
+
+        Parameters
+        ----------
+        points : pl.DataFrame | np.ndarray
+            a column per dimension, or an array of shape (n, len(dims))
+        k : int, optional
+            by default 1
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            distances and ids of shape (n, k), nearest first, inf and -1
+            where there are fewer than k emitters and for points with a
+            missing or infinite value
+
+        """
+        points = self._points(points)
+        finite = np.all(np.isfinite(points), axis=1)
+        # the tree only takes finite points, the others are masked below
+        scaled = np.where(finite[:, None], points, 0) / self._scale
+        dist = np.full((len(points), k), np.inf)
+        ids = np.full((len(points), k), -1, dtype=np.int64)
+
+        removed = len(self.alive) - len(self)
+        if self._num_indexed:
+            # removed emitters are still in the tree, ask for enough to skip them
+            num = min(k + removed, self._num_indexed)
+            (tree_dist, tree_ids) = self._tree.query(scaled, k=num)
+            (dist, ids) = (
+                tree_dist.reshape(len(points), -1),
+                tree_ids.reshape(len(points), -1),
+            )
+
+        recent = np.arange(self._num_indexed, len(self.names))
+        recent_dist = np.linalg.norm(
+            scaled[:, None, :] - self.centers[recent] / self._scale,
+            axis=2,
+        )
+        dist = np.concatenate([dist, recent_dist], axis=1)
+        ids = np.concatenate([ids, np.broadcast_to(recent, recent_dist.shape)], axis=1)
+
+        live = (ids >= 0) & (ids < len(self.names)) & finite[:, None]
+        live[live] = self.alive[ids[live]]
+        dist = np.where(live, dist, np.inf)
+        order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        dist = np.take_along_axis(dist, order, axis=1)
+        ids = np.where(np.isinf(dist), -1, np.take_along_axis(ids, order, axis=1))
+        if dist.shape[1] < k:
+            pad = k - dist.shape[1]
+            dist = np.pad(dist, ((0, 0), (0, pad)), constant_values=np.inf)
+            ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        return (dist, ids)
+
+    def associate(self, bursts: pl.DataFrame) -> pl.DataFrame:
+        """Tag each burst with the emitter that contains it.
+
+        Where several emitters contain a burst the one with the nearest
+        center is taken.
+
+        Parameters
+        ----------
+        bursts : pl.DataFrame
+            a column per dimension, as from burst_features
+
+        Returns
+        -------
+        pl.DataFrame
+            bursts with emitter_id and emitter, null where nothing matched
+            or a dimension is missing, as the PRI of a one pulse burst
+
+        """
+        points = self._points(bursts)
+        (rows, ids) = self.match(points)
+        dist = np.linalg.norm((points[rows] - self.centers[ids]) / self._scale, axis=1)
+        best = (
+            pl.DataFrame({"row": rows, "emitter_id": ids, "dist": dist})
+            .sort("row", "dist", "emitter_id")
+            .unique("row", keep="first")
+        )
+        emitter_id = np.full(len(points), -1, dtype=np.int64)
+        emitter_id[best["row"].to_numpy()] = best["emitter_id"].to_numpy()
+        names = np.array(self.names + [None], dtype=object)
+        return bursts.with_columns(
+            pl.Series("emitter_id", emitter_id).replace(-1, None),
+            pl.Series("emitter", names[emitter_id], dtype=pl.String),
+        )
+
+    def save(self, path: str | Path) -> None:
+        """Write the library to a directory.
+
+        Parameters
+        ----------
+        path : str | Path
+
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / "ranges.tmp.npz", "wb") as fp:
+            np.savez(fp, lo=self.lo, hi=self.hi, alive=self.alive)
+        os.replace(path / "ranges.tmp.npz", path / "ranges.npz")
+        meta = {"dims": self.dims, "scales": self.scales, "names": self.names}
+        (path / "emitters.tmp.json").write_text(json.dumps(meta))
+        os.replace(path / "emitters.tmp.json", path / "emitters.json")
+
+    @classmethod
+    def load(cls, path: str | Path, rebuild_size: int = 1024) -> EmitterLibrary:
+        """Open a library written by save.
+
+        Parameters
+        ----------
+        path : str | Path
+        rebuild_size : int, optional
+            by default 1024
+
+        Returns
+        -------
+        EmitterLibrary
+
+        """
+        path = Path(path)
+        meta = json.loads((path / "emitters.json").read_text())
+        library = cls(meta["dims"], meta["scales"], rebuild_size)
+        library.names = meta["names"]
+        with np.load(path / "ranges.npz") as npz:
+            (library.lo, library.hi, library.alive) = (
+                npz["lo"],
+                npz["hi"],
+                npz["alive"],
+            )
+        library.rebuild()
+        return library
+
+    def _columns(self, frame: pl.DataFrame, suffix: str) -> np.ndarray:
+        columns = [f"{dim}{suffix}" for dim in self.dims]
+        return (
+            frame.select(columns).to_numpy().astype(float).reshape(-1, len(self.dims))
+        )
+
+    def _points(self, points: pl.DataFrame | np.ndarray) -> np.ndarray:
+        if isinstance(points, pl.DataFrame):
+            points = points.select(self.dims).to_numpy()
+        return np.asarray(points, dtype=float).reshape(-1, len(self.dims))
@@ -0,0 +1,269 @@
+"""PDW ingest over ZeroMQ feeding the streaming deinterleaver.
+
+PDWs arrive as batched binary messages. A message is an 8 byte header, the
+magic ``b"PDW1"`` and the little endian uint32 pulse count, followed by one
+contiguous little endian float64 column per field in PDW_COLUMNS order.
+Columns are decoded as views on the received frame so no pulse data is
+copied before it reaches Polars.
+
+The pipeline runs three threads, receive/decode, dedup and burst grouping,
+connected by bounded queues. When a stage falls behind the queues fill, the
+receiver stops reading and the socket high-water mark pushes back on the
+sender (PUSH) or drops messages (PUB).
+"""
+
+from __future__ import annotations
+
+import queue
+import struct
+import threading
+from typing import Callable
+
+import numpy as np
+import polars as pl
+
+from deinterleaver import StreamingBurstGrouper, StreamingDeduper
+from timing import timer
+
+PDW_COLUMNS = ("toa", "pw", "rf", "pa")
+MAGIC = b"PDW1"
+HEADER = struct.Struct("<4sI")
+
+_STOP = object()
+
+
+def encode_pdws(df: pl.DataFrame) -> bytes:
+    """Encode a batch of PDWs as a message.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        PDWs, missing PDW_COLUMNS are sent as zeros
+
+    Returns
+    -------
+    bytes
+
+    """
+    columns = [
+        df[_].to_numpy().astype("<f8", copy=False)
+        if _ in df.columns
+        else np.zeros(len(df), dtype="<f8")
+        for _ in PDW_COLUMNS
+    ]
+    return HEADER.pack(MAGIC, len(df)) + b"".join(_.tobytes() for _ in columns)
+
+
+def decode_columns(buffer: bytes | memoryview) -> dict[str, np.ndarray]:
+    """Decode a message into read only column views.
+
+    Parameters
+    ----------
+    buffer : bytes | memoryview
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        views on the message buffer, keyed by PDW_COLUMNS
+
+    """
+    magic, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        msg = f"not a PDW message, got magic {magic!r}"
+        raise ValueError(msg)
+    expected = HEADER.size + 8 * count * len(PDW_COLUMNS)
+    if len(buffer) != expected:
+        msg = f"PDW message is {len(buffer)} bytes, expected {expected}"
+        raise ValueError(msg)
+
+    return {
+        name: np.frombuffer(
+            buffer,
+            dtype="<f8",
+            count=count,
+            offset=HEADER.size + 8 * count * idx,
+        )
+        for idx, name in enumerate(PDW_COLUMNS)
+    }
+
+
+def decode_pdws(buffer: bytes | memoryview) -> pl.DataFrame:
+    return pl.DataFrame(decode_columns(buffer))
+
+
+class LocalPublisher:
+    """In-process stand-in for a ZeroMQ publisher.
+
+    Messages sent are received by the ingest pipeline through recv. With
+    drop=True a full queue drops new messages like a PUB socket at its
+    high-water mark, otherwise send blocks like a PUSH socket.
+    """
+
+    def __init__(self, hwm: int = 1000, drop: bool = False) -> None:
+        self.drop = drop
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=hwm)
+
+    def send(self, message: bytes) -> None:
+        if not self.drop:
+            self._queue.put(message)
+            return
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def send_pdws(self, df: pl.DataFrame, batch_size: int = 1000) -> None:
+        for batch in df.iter_slices(batch_size):
+            self.send(encode_pdws(batch))
+
+    def recv(self, timeout_ms: int = 100) -> memoryview | None:
+        try:
+            return memoryview(self._queue.get(timeout=timeout_ms / 1000))
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        pass
+
+
+class ZmqSource:
+    """Receive PDW messages from a SUB or PULL socket.
+
+    Frames are received without copying and handed on as memoryviews.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        socket_type: str = "SUB",
+        hwm: int = 1000,
+        bind: bool = False,
+        context=None,
+    ) -> None:
+        import zmq
+
+        self._context = context or zmq.Context.instance()
+        self._socket = self._context.socket(getattr(zmq, socket_type))
+        self._socket.setsockopt(zmq.RCVHWM, hwm)
+        if socket_type == "SUB":
+            self._socket.setsockopt(zmq.SUBSCRIBE, b"")
+        if bind:
+            self._socket.bind(endpoint)
+        else:
+            self._socket.connect(endpoint)
+        self._poller = zmq.Poller()
+        self._poller.register(self._socket, zmq.POLLIN)
+
+    def recv(self, timeout_ms: int = 100) -> memoryview | None:
+        if not self._poller.poll(timeout_ms):
+            return None
+        return self._socket.recv(copy=False).buffer
+
+    def close(self) -> None:
+        self._socket.close(linger=0)
+
+
+class PdwIngest:
+    """Streaming dedup and burst grouping of received PDWs.
+
+    Closed bursts are passed to on_bursts, or put on the bursts queue when
+    no callback is given.
+    """
+
+    def __init__(
+        self,
+        source: LocalPublisher | ZmqSource,
+        pri: float,
+        tol: float = 0.1,
+        min_num_pulses: int = 5,
+        dedup_tol: float = 0.0,
+        dedup_rf_tol: float = 10,
+        queue_size: int = 16,
+        poll_ms: int = 100,
+        on_bursts: Callable[[pl.DataFrame], None] | None = None,
+    ) -> None:
+        self.source = source
+        self.poll_ms = poll_ms
+        self.bursts: queue.Queue = queue.Queue()
+        self.on_bursts = on_bursts or self.bursts.put
+        self.num_batches = 0
+        self.num_pulses = 0
+        self.num_bursts = 0
+
+        self._deduper = StreamingDeduper(dedup_tol, dedup_rf_tol)
+        self._grouper = StreamingBurstGrouper(pri, tol, min_num_pulses)
+        self._decoded: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._deduped: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._drain = True
+        self._threads = [
+            threading.Thread(target=self._receive, name="pdw-receive", daemon=True),
+            threading.Thread(target=self._dedup, name="pdw-dedup", daemon=True),
+            threading.Thread(target=self._group, name="pdw-group", daemon=True),
+        ]
+
+    @property
+    def queue_depths(self) -> tuple[int, int]:
+        return (self._decoded.qsize(), self._deduped.qsize())
+
+    def start(self) -> PdwIngest:
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, drain: bool = True, timeout: float | None = None) -> None:
+        """Stop the pipeline and emit the bursts still open.
+
+        Parameters
+        ----------
+        drain : bool, optional
+            keep reading until the source is empty, by default True
+        timeout : float | None, optional
+            seconds to wait for each thread, by default None
+
+        """
+        self._drain = drain
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def __enter__(self) -> PdwIngest:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _receive(self) -> None:
+        while True:
+            buffer = self.source.recv(self.poll_ms)
+            if buffer is None:
+                if self._stop.is_set():
+                    break
+                continue
+            with timer("ingest.decode", len(buffer)):
+                batch = decode_pdws(buffer)
+            self.num_batches += 1
+            self.num_pulses += len(batch)
+            self._decoded.put(batch)
+            if self._stop.is_set() and not self._drain:
+                break
+        self._decoded.put(_STOP)
+
+    def _dedup(self) -> None:
+        while (batch := self._decoded.get()) is not _STOP:
+            with timer("ingest.dedup"):
+                self._deduped.put(self._deduper.push(batch))
+        self._deduped.put(_STOP)
+
+    def _group(self) -> None:
+        while (batch := self._deduped.get()) is not _STOP:
+            with timer("ingest.group"):
+                bursts = self._grouper.push(batch)
+            self._emit(bursts)
+        self._emit(self._grouper.flush())
+
+    def _emit(self, bursts: pl.DataFrame) -> None:
+        if len(bursts):
+            self.num_bursts += bursts["burst_group"].n_unique()
+            self.on_bursts(bursts)
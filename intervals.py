@@ -0,0 +1,260 @@
+"""Time interval index over bursts.
+
+Bursts are kept as closed [start, stop] intervals of their first and last
+TOA, sorted by start, with the running maximum of the stops. A window
+[a, b] can only overlap the bursts from the first whose running maximum
+reaches a, or that start within the longest burst of a, up to the last that
+starts by b, so every query is a pair of binary searches and a scan of the
+candidates between them. Bursts added since the last merge are scanned
+directly until there are merge_size of them, or a query has enough windows
+that merging first is cheaper.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import polars as pl
+
+
+def burst_intervals(
+    df: pl.DataFrame,
+    time_col: str = "toa",
+    burst_col: str = "burst_group",
+) -> pl.DataFrame:
+    """First and last TOA of each burst.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        pulses tagged by group_by_burst
+    time_col : str, optional
+        by default "toa"
+    burst_col : str, optional
+        by default "burst_group"
+
+    Returns
+    -------
+    pl.DataFrame
+        burst_col, start and stop
+
+    """
+    return (
+        df.group_by(burst_col)
+        .agg(
+            pl.col(time_col).min().alias("start"),
+            pl.col(time_col).max().alias("stop"),
+        )
+        .sort(burst_col)
+    )
+
+
+def _expand(lo: np.ndarray, hi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Query number and position of every position in lo[i]..hi[i]."""
+    counts = np.maximum(hi - lo, 0)
+    rows = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return (rows, np.repeat(lo, counts) + offsets)
+
+
+class BurstIndex:
+    """Bursts by id with overlap, stabbing and coverage queries.
+
+    Parameters
+    ----------
+    merge_size : int, optional
+        bursts added before they are merged into the sorted arrays, by
+        default 1024
+    """
+
+    def __init__(self, merge_size: int = 1024) -> None:
+        self.merge_size = merge_size
+        self.ids = np.empty(0, dtype=np.int64)
+        self.starts = np.empty(0)
+        self.stops = np.empty(0)
+        self._reach = np.empty(0)
+        self._max_length = 0.0
+        self._pending: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        self._num_pending = 0
+        self._union: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids) + self._num_pending
+
+    def add(self, ids: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> None:
+        """Add bursts.
+
+        Parameters
+        ----------
+        ids : np.ndarray
+        starts : np.ndarray
+        stops : np.ndarray
+
+        """
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        starts = np.atleast_1d(np.asarray(starts, dtype=float))
+        stops = np.atleast_1d(np.asarray(stops, dtype=float))
+        if np.any(starts > stops):
+            msg = "every burst needs start <= stop"
+            raise ValueError(msg)
+        self._pending.append((ids, starts, stops))
+        self._num_pending += len(ids)
+        self._union = None
+        if self._num_pending > self.merge_size:
+            self.merge()
+
+    def push(
+        self,
+        df: pl.DataFrame,
+        time_col: str = "toa",
+        burst_col: str = "burst_group",
+    ) -> None:
+        """Add the bursts of a frame, e.g. the output of StreamingBurstGrouper.
+
+        Parameters
+        ----------
+        df : pl.DataFrame
+        time_col : str, optional
+            by default "toa"
+        burst_col : str, optional
+            by default "burst_group"
+
+        """
+        if len(df) == 0:
+            return
+        intervals = burst_intervals(df, time_col, burst_col)
+        self.add(
+            intervals[burst_col].to_numpy(),
+            intervals["start"].to_numpy(),
+            intervals["stop"].to_numpy(),
+        )
+
+    def merge(self) -> None:
+        """Sort the added bursts into the index."""
+        if not self._pending:
+            return
+        (ids, starts, stops) = (
+            np.concatenate([_, *parts])
+            for _, parts in zip(
+                [self.ids, self.starts, self.stops],
+                zip(*self._pending),
+            )
+        )
+        order = np.argsort(starts, kind="stable")
+        (self.ids, self.starts, self.stops) = (ids[order], starts[order], stops[order])
+        self._reach = np.maximum.accumulate(self.stops)
+        self._max_length = float(np.max(self.stops - self.starts, initial=0.0))
+        self._pending = []
+        self._num_pending = 0
+
+    def overlapping(
+        self,
+        starts: np.ndarray,
+        stops: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Bursts that overlap each window [start, stop].
+
+        Parameters
+        ----------
+        starts : np.ndarray
+        stops : np.ndarray
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            window number and burst id of every overlap, sorted by window
+            and burst start
+
+        """
+        starts = np.atleast_1d(np.asarray(starts, dtype=float))
+        stops = np.atleast_1d(np.asarray(stops, dtype=float))
+        # merge when that is cheaper than checking every window directly
+        if len(starts) * self._num_pending > len(self):
+            self.merge()
+        lo = np.maximum(
+            np.searchsorted(self._reach, starts, side="left"),
+            np.searchsorted(self.starts, starts - self._max_length, side="left"),
+        )
+        hi = np.searchsorted(self.starts, stops, side="right")
+        (rows, pos) = _expand(lo, hi)
+        keep = self.stops[pos] >= starts[rows]
+        (rows, ids) = (rows[keep], self.ids[pos[keep]])
+        if not self._pending:
+            return (rows, ids)
+
+        # bursts not merged yet are checked against every window
+        (new_ids, new_starts, new_stops) = (
+            np.concatenate(_) for _ in zip(*self._pending)
+        )
+        hits = (new_starts <= stops[:, None]) & (new_stops >= starts[:, None])
+        (new_rows, new_pos) = np.nonzero(hits)
+        rows = np.concatenate([rows, new_rows])
+        order = np.argsort(rows, kind="stable")
+        return (rows[order], np.concatenate([ids, new_ids[new_pos]])[order])
+
+    def stab(self, times: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Bursts that contain each time.
+
+        Parameters
+        ----------
+        times : np.ndarray
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            time number and burst id of every burst containing it
+
+        """
+        return self.overlapping(times, times)
+
+    def overlaps(self) -> tuple[np.ndarray, np.ndarray]:
+        """Every pair of bursts that overlap each other.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            ids of the earlier and later starting burst of each pair
+
+        """
+        self.merge()
+        first = np.arange(len(self.starts))
+        last = np.searchsorted(self.starts, self.stops, side="right")
+        (rows, pos) = _expand(first + 1, last)
+        return (self.ids[rows], self.ids[pos])
+
+    def coverage(self, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+        """Time within each window [start, stop] covered by any burst.
+
+        Parameters
+        ----------
+        starts : np.ndarray
+        stops : np.ndarray
+
+        Returns
+        -------
+        np.ndarray
+            covered time of each window
+
+        """
+        starts = np.atleast_1d(np.asarray(starts, dtype=float))
+        stops = np.atleast_1d(np.asarray(stops, dtype=float))
+        return np.maximum(self._covered(stops) - self._covered(starts), 0)
+
+    def _covered(self, times: np.ndarray) -> np.ndarray:
+        # covered time before each time, from the union of the bursts
+        if self._union is None:
+            self.merge()
+            # a burst starting after all earlier ones stopped opens a segment
+            opens = np.flatnonzero(self.starts[1:] > self._reach[:-1]) + 1
+            first = np.r_[0, opens][: len(self.starts)]
+            last = np.r_[opens - 1, len(self.starts) - 1][: len(self.starts)]
+            union_starts = self.starts[first]
+            lengths = self._reach[last] - union_starts
+            before = np.concatenate([[0.0], np.cumsum(lengths)])
+            self._union = (union_starts, lengths, before)
+        (union_starts, lengths, before) = self._union
+        if len(union_starts) == 0:
+            return np.zeros(len(times))
+
+        k = np.searchsorted(union_starts, times, side="right") - 1
+        inside = np.clip(times - union_starts[k], 0, lengths[k])
+        return np.where(k >= 0, before[k] + inside, 0.0)
@@ -0,0 +1,103 @@
+"""Optional numba backend for the pulse_simulator loops.
+
+The backend is chosen per call with ``backend="numba"`` or globally with
+:func:`set_backend` or the ``SIGNALANALYSIS_BACKEND`` environment variable.
+When numba is not installed every request falls back to ``"numpy"``.
+
+Kernels are compiled nopython with ``cache=True`` so the machine code is
+written to ``__pycache__`` (or ``NUMBA_CACHE_DIR``) and later processes load
+it instead of paying the compile cost again.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - depends on the environment
+    numba = None
+
+HAVE_NUMBA = numba is not None
+BACKENDS = ("numpy", "numba")
+
+_backend = os.environ.get("SIGNALANALYSIS_BACKEND", "numpy")
+
+
+def set_backend(name: str) -> None:
+    """Select the default backend.
+
+    Parameters
+    ----------
+    name : str
+        "numpy" or "numba"
+
+    """
+    global _backend  # noqa: PLW0603
+    if name not in BACKENDS:
+        msg = f"unknown backend {name!r}, expected one of {BACKENDS}"
+        raise ValueError(msg)
+    _backend = name
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def use_numba(backend: str | None = None) -> bool:
+    """Whether a call should run the numba kernels.
+
+    Parameters
+    ----------
+    backend : str | None, optional
+        backend requested by the call, by default the global backend
+
+    Returns
+    -------
+    bool
+
+    """
+    backend = _backend if backend is None else backend
+    if backend not in BACKENDS:
+        msg = f"unknown backend {backend!r}, expected one of {BACKENDS}"
+        raise ValueError(msg)
+    return HAVE_NUMBA and backend == "numba"
+
+
+if HAVE_NUMBA:
+
+    @numba.njit(cache=True, parallel=True)
+    def place_pulses(
+        signal: np.ndarray,
+        start_indices: np.ndarray,
+        width: int,
+        value: float,
+    ) -> None:
+        for k in numba.prange(len(start_indices)):
+            start = start_indices[k]
+            for idx in range(start, start + width):
+                signal[idx] = value
+
+    @numba.njit(cache=True, parallel=True)
+    def fold_norms(data: np.ndarray, frame_lengths: np.ndarray) -> np.ndarray:
+        norms = np.empty(len(frame_lengths))
+        for k in numba.prange(len(frame_lengths)):
+            length = frame_lengths[k]
+            sums = np.zeros(length)
+            for idx in range(len(data)):
+                sums[idx % length] += data[idx]
+            norms[k] = np.max(np.abs(sums)) / length
+        return norms
+
+    @numba.njit(cache=True, parallel=True)
+    def pairwise_diffs(ar: np.ndarray) -> np.ndarray:
+        n = len(ar)
+        diffs = np.empty(n * (n - 1) // 2, dtype=ar.dtype)
+        for i in numba.prange(n):
+            # row offset in np.triu_indices(n, 1) order
+            offset = i * n - i * (i + 1) // 2
+            for j in range(i + 1, n):
+                diffs[offset + j - i - 1] = abs(ar[i] - ar[j])
+        return diffs
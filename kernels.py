@@ -0,0 +1,405 @@
+"""Hot loops of the deinterleaver.
+
+The compiled versions live in the ``_kernels`` pybind11 extension built from
+``cpp/kernels.cpp``. When the extension is not available the NumPy versions
+below are used, they give identical results.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+try:
+    import _kernels
+except ImportError:  # pragma: no cover - depends on the build
+    _kernels = None
+
+HAVE_NATIVE = _kernels is not None
+
+# samples box_sum sums at a time
+BOX_CHUNK = 2**16
+
+
+def _as_float(ar: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(ar, dtype=np.float64)
+
+
+def _extend_bursts_py(
+    toas: np.ndarray,
+    groups: np.ndarray,
+    start: int,
+    next_group: int,
+    pri: float,
+    tol: float,
+) -> int:
+    targets = toas[start:] - pri
+    los = np.searchsorted(toas, targets - tol, side="left")
+    his = np.searchsorted(toas, targets + tol, side="right")
+    for offset, (lo, hi) in enumerate(zip(los, his)):
+        idx = start + offset
+        hi = min(hi, idx)
+        if lo < hi:
+            dists = np.abs(targets[offset] - toas[lo:hi])
+            best = np.min(dists)
+            if best <= tol:
+                groups[idx] = np.min(groups[lo:hi][dists == best])
+                continue
+        groups[idx] = next_group
+        next_group += 1
+    return next_group
+
+
+def _assign_bursts_py(toas: np.ndarray, pri: float, tol: float) -> np.ndarray:
+    groups = np.empty(len(toas), dtype=np.int64)
+    _extend_bursts_py(toas, groups, 0, 0, pri, tol)
+    return groups
+
+
+def _fold_norms_py(data: np.ndarray, frame_lengths: np.ndarray) -> np.ndarray:
+    positions = np.arange(len(data))
+    return np.array(
+        [
+            np.max(np.abs(np.bincount(positions % length, data, minlength=length)))
+            / length
+            for length in frame_lengths
+        ],
+    )
+
+
+def _diff_histogram_py(toas: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for lag in range(1, len(toas)):
+        diffs = toas[lag:] - toas[:-lag]
+        if np.min(diffs) > edges[-1]:
+            break
+        counts += np.histogram(diffs, bins=edges)[0]
+    return counts
+
+
+def _duplicate_mask_py(
+    toas: np.ndarray,
+    rfs: np.ndarray,
+    tol: float,
+    rf_tol: float,
+) -> np.ndarray:
+    dup = np.zeros(len(toas), dtype=bool)
+    # pulses that may still match one lag further back
+    active = np.arange(1, len(toas))
+    lag = 1
+    while len(active):
+        active = active[toas[active] - toas[active - lag] <= tol]
+        dup[active] = np.abs(rfs[active] - rfs[active - lag]) <= rf_tol
+        active = active[~dup[active] & (active > lag)]
+        lag += 1
+    return dup
+
+
+def _order_index(quantile: float, count: int) -> int:
+    return int(np.floor(quantile * (count - 1) + 0.5))
+
+
+def _os_cfar_noise_py(
+    power: np.ndarray,
+    num_train: int,
+    num_guard: int,
+    quantile: float,
+    start: int,
+    stop: int,
+) -> np.ndarray:
+    n = len(power)
+    (start, stop) = (max(start, 0), min(stop, n))
+    cells = np.arange(start, max(stop, start))
+    noise = np.full(len(cells), np.nan)
+    reach = num_guard + num_train
+    if num_train == 0:
+        return noise
+
+    inner = (cells >= reach) & (cells < n - reach)
+    if np.any(inner):
+        windows = np.lib.stride_tricks.sliding_window_view(power, 2 * reach + 1)
+        columns = np.r_[0:num_train, num_train + 2 * num_guard + 1 : 2 * reach + 1]
+        k = _order_index(quantile, 2 * num_train)
+        positions = np.flatnonzero(inner)
+        step = max(2**16 // num_train, 1)
+        for lo in range(0, len(positions), step):
+            chunk = positions[lo : lo + step]
+            train = windows[cells[chunk] - reach][:, columns]
+            noise[chunk] = np.partition(train, k, axis=1)[:, k]
+
+    for pos in np.flatnonzero(~inner):
+        cell = cells[pos]
+        train = np.concatenate(
+            [
+                power[max(cell - reach, 0) : max(cell - num_guard, 0)],
+                power[min(cell + num_guard + 1, n) : min(cell + reach + 1, n)],
+            ],
+        )
+        if len(train):
+            k = _order_index(quantile, len(train))
+            noise[pos] = np.partition(train, k)[k]
+    return noise
+
+
+def assign_bursts(toas: np.ndarray, pri: float, tol: float) -> np.ndarray:
+    """Assign each pulse of a sorted TOA array to a burst.
+
+    A pulse joins the burst of the earlier pulse closest to toa - pri if that
+    pulse is within tol, otherwise it starts a new burst.
+
+    Parameters
+    ----------
+    toas : np.ndarray
+        sorted times of arrival
+    pri : float
+    tol : float
+
+    Returns
+    -------
+    np.ndarray
+        burst index of every pulse, numbered in order of first pulse
+
+    """
+    toas = _as_float(toas)
+    if _kernels is not None:
+        return _kernels.assign_bursts(toas, pri, tol)
+    return _assign_bursts_py(toas, pri, tol)
+
+
+def extend_bursts(
+    toas: np.ndarray,
+    groups: np.ndarray,
+    start: int,
+    next_group: int,
+    pri: float,
+    tol: float,
+) -> int:
+    """Assign pulses from start onwards to bursts, in place.
+
+    groups[:start] are taken as already assigned, so a stream can carry its
+    most recent pulses into the next batch.
+
+    Parameters
+    ----------
+    toas : np.ndarray
+        sorted times of arrival
+    groups : np.ndarray
+        int64 burst indices, filled in from start
+    start : int
+        first pulse to assign
+    next_group : int
+        index given to the next new burst
+    pri : float
+    tol : float
+
+    Returns
+    -------
+    int
+        next unused burst index
+
+    """
+    toas = _as_float(toas)
+    if groups.dtype != np.int64 or not groups.flags.c_contiguous:
+        msg = "groups must be a contiguous int64 array"
+        raise TypeError(msg)
+    if _kernels is not None:
+        return _kernels.extend_bursts(toas, groups, start, next_group, pri, tol)
+    return _extend_bursts_py(toas, groups, start, next_group, pri, tol)
+
+
+def fold_norms(data: np.ndarray, frame_lengths: np.ndarray) -> np.ndarray:
+    """Norm of data framed at each frame length.
+
+    Same as calc_norm(frame_array(data, length)) for each length.
+
+    Parameters
+    ----------
+    data : np.ndarray
+    frame_lengths : np.ndarray
+
+    Returns
+    -------
+    np.ndarray
+
+    """
+    data = _as_float(data)
+    frame_lengths = np.ascontiguousarray(frame_lengths, dtype=np.int64)
+    if _kernels is not None:
+        return _kernels.fold_norms(data, frame_lengths)
+    return _fold_norms_py(data, frame_lengths)
+
+
+def diff_histogram(toas: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Histogram of all pairwise differences of sorted TOAs.
+
+    Same as np.histogram(find_diffs(toas), bins=edges) without building the
+    n x n difference matrix.
+
+    Parameters
+    ----------
+    toas : np.ndarray
+        sorted times of arrival
+    edges : np.ndarray
+        bin edges
+
+    Returns
+    -------
+    np.ndarray
+
+    """
+    toas = _as_float(toas)
+    edges = _as_float(edges)
+    if _kernels is not None:
+        return _kernels.diff_histogram(toas, edges)
+    return _diff_histogram_py(toas, edges)
+
+
+def duplicate_mask(
+    toas: np.ndarray,
+    rfs: np.ndarray,
+    tol: float,
+    rf_tol: float,
+) -> np.ndarray:
+    """Flag pulses that duplicate an earlier pulse.
+
+    A pulse is a duplicate when any earlier pulse, adjacent or not, is within
+    tol in TOA and rf_tol in RF. Only the pulses within tol of each other are
+    compared, so the cost stays near linear while the window holds few
+    pulses.
+
+    Parameters
+    ----------
+    toas : np.ndarray
+        sorted times of arrival
+    rfs : np.ndarray
+        RF of each pulse
+    tol : float
+    rf_tol : float
+
+    Returns
+    -------
+    np.ndarray
+        bool, true for duplicates
+
+    """
+    toas = _as_float(toas)
+    rfs = _as_float(rfs)
+    if len(toas) != len(rfs):
+        msg = "toas and rfs must have the same length"
+        raise ValueError(msg)
+    if _kernels is not None:
+        return _kernels.duplicate_mask(toas, rfs, tol, rf_tol)
+    return _duplicate_mask_py(toas, rfs, tol, rf_tol)
+
+
+def os_cfar_noise(
+    power: np.ndarray,
+    num_train: int,
+    num_guard: int,
+    quantile: float,
+    start: int = 0,
+    stop: int | None = None,
+) -> np.ndarray:
+    """Ordered statistic of the CFAR training cells of each cell.
+
+    The training cells of cell i are the num_train cells either side of it
+    beyond num_guard guard cells, clipped to the array. The value returned
+    is the one at the given quantile of the sorted training cells, nan where
+    a cell has none.
+
+    Parameters
+    ----------
+    power : np.ndarray
+    num_train : int
+        training cells on each side
+    num_guard : int
+        guard cells on each side
+    quantile : float
+        0 for the smallest training cell, 1 for the largest
+    start : int, optional
+        first cell, by default 0
+    stop : int | None, optional
+        end of the cells, by default len(power)
+
+    Returns
+    -------
+    np.ndarray
+        one value per cell in start..stop
+
+    """
+    power = _as_float(power)
+    stop = len(power) if stop is None else stop
+    if _kernels is not None:
+        return _kernels.os_cfar_noise(
+            power, num_train, num_guard, quantile, start, stop
+        )
+    return _os_cfar_noise_py(power, num_train, num_guard, quantile, start, stop)
+
+
+def box_sum(
+    data: np.ndarray,
+    width: int,
+    out: np.ndarray | None = None,
+    tail: np.ndarray | None = None,
+) -> np.ndarray:
+    """Sum of each sample and the width - 1 samples before it.
+
+    Same as signal.lfilter(np.ones(width), [1], data) up to rounding, in the
+    dtype of out. The differences data[i] - data[i - width] are written into
+    out and summed in place, a chunk of BOX_CHUNK samples at a time. Each
+    chunk starts from its first window summed directly, so rounding does not
+    carry from one chunk to the next, and nothing but tail is allocated.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        real samples
+    width : int
+    out : np.ndarray | None, optional
+        array of len(data), by default allocated in the dtype of data,
+        float32 for integers up to 16 bits and float64 above
+    tail : np.ndarray | None, optional
+        the width - 1 samples before data in the dtype of out, zeros at the
+        start of a stream, updated in place to the last width - 1 samples
+        for the next block, by default zeros
+
+    Returns
+    -------
+    np.ndarray
+        out
+
+    """
+    n = len(data)
+    dtype = np.result_type(data.dtype, np.float32) if out is None else out.dtype
+    out = np.empty(n, dtype=dtype) if out is None else out
+    lead = width - 1
+    tail = np.zeros(lead, dtype=dtype) if tail is None else tail
+
+    for start in range(0, n, BOX_CHUNK):
+        stop = min(start + BOX_CHUNK, n)
+        # the first window of the chunk, partly in tail near the start
+        first = data[max(start - lead, 0) : start + 1].sum(dtype=dtype)
+        if start < lead:
+            first += tail[start:].sum(dtype=dtype)
+        out[start] = first
+        # differences, the samples width back are in tail up to width
+        split = min(max(start + 1, width), stop)
+        np.subtract(
+            data[start + 1 : split],
+            tail[start : split - 1],
+            out=out[start + 1 : split],
+            dtype=dtype,
+        )
+        np.subtract(
+            data[split:stop],
+            data[split - width : stop - width],
+            out=out[split:stop],
+            dtype=dtype,
+        )
+        np.cumsum(out[start:stop], out=out[start:stop])
+
+    if n >= lead:
+        tail[:] = data[n - lead :]
+    elif n:
+        tail[: lead - n] = tail[n:].copy()
+        tail[lead - n :] = data
+    return out
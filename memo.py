@@ -0,0 +1,112 @@
+"""Content addressed cache of sweep results.
+
+Results are keyed on a hash of the input buffer and the parameters that
+change them, so rerunning a sweep on the same detections finds its earlier
+results whichever array object holds them. Entries are dicts of arrays, held
+in memory with least recently used eviction and optionally written to a
+directory, where they outlive the process.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def content_hash(data: np.ndarray, *params) -> str:
+    """Hash of the contents, dtype and shape of data and of params.
+
+    Parameters
+    ----------
+    data : np.ndarray
+    params
+        anything with a stable repr
+
+    Returns
+    -------
+    str
+        32 hex digits
+
+    """
+    data = np.ascontiguousarray(data)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((data.dtype.str, data.shape, params)).encode())
+    digest.update(data.reshape(-1).view(np.uint8))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Dicts of arrays by key, least recently used first out.
+
+    Entries evicted from memory stay on disk when a path is given, and a
+    get that misses in memory loads them back.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        entries held in memory, by default 128
+    path : str | Path | None, optional
+        directory of the disk cache, by default memory only
+    """
+
+    def __init__(self, max_entries: int = 128, path: str | Path | None = None) -> None:
+        self.max_entries = max_entries
+        self.path = None if path is None else Path(path)
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+        self._entries: OrderedDict[str, dict[str, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (
+            self.path is not None and (self.path / f"{key}.npz").exists()
+        )
+
+    def get(self, key: str) -> dict[str, np.ndarray] | None:
+        """Entry of key, None if there is none."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.path is not None and (self.path / f"{key}.npz").exists():
+            with np.load(self.path / f"{key}.npz") as npz:
+                entry = dict(npz)
+            self._remember(key, entry)
+            with self._lock:
+                self.hits += 1
+            return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, **arrays: np.ndarray) -> None:
+        """Store arrays under key, replacing any entry it had."""
+        self._remember(key, arrays)
+        if self.path is not None:
+            # written next to the old file and renamed over it
+            with open(self.path / f"{key}.tmp.npz", "wb") as fp:
+                np.savez(fp, **arrays)
+            os.replace(self.path / f"{key}.tmp.npz", self.path / f"{key}.npz")
+
+    def _remember(self, key: str, entry: dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the entries held in memory, the disk cache is kept."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,408 @@
+"""Per stage memory accounting.
+
+Every call of a measured stage records
+
+peak_bytes
+    tracemalloc peak above the memory traced when the stage started,
+    Python objects and NumPy buffers
+numpy_retained_bytes
+    net growth of the traced NumPy buffers over the stage, what it
+    allocated and still holds when it returns, its outputs and anything it
+    cached, less what it freed, not everything it allocated
+rss_delta_bytes
+    growth of the resident set, which also sees Polars and other native
+    allocations that tracemalloc does not
+hwm_delta_bytes
+    growth of the process peak resident set, nonzero for the stage that
+    set a new high water mark
+
+tracemalloc keeps one peak for the process, and every stage resets it when
+it starts. Stages measured at the same time on other threads erase each
+other's peaks, and a peak may include the allocations of another thread.
+In strict mode measurements are serialized by a lock, so measured stages run
+one at a time, nested stages on the same thread excepted, and a measured
+stage must not wait on a measured stage of another thread. Outside strict
+mode they run concurrently and their peaks are approximate.
+
+Budgets give the bytes a stage may use as a constant plus a multiple of its
+input size. A call using more, by traced peak or resident set growth, is
+counted in over_budget, and in strict mode raises MemoryBudgetError, which
+turns a test run into a memory regression test. Set SIGNALANALYSIS_MEMORY=1
+to measure, or =strict for strict mode.
+"""
+
+from __future__ import annotations
+
+import inspect
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from functools import wraps
+from typing import TYPE_CHECKING, Callable, Iterator
+
+import numpy as np
+
+from timing import nbytes_of
+
+if TYPE_CHECKING:
+    import polars as pl
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+class MemoryBudgetError(MemoryError):
+    """A stage used more memory than its budget."""
+
+
+def rss_bytes() -> int:
+    """Resident set size of the process, 0 where it is not available."""
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of the process, 0 where it is not available."""
+    if resource is None:
+        return 0
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def numpy_traced_bytes() -> int:
+    """NumPy buffer bytes currently traced by tracemalloc."""
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.DomainFilter(inclusive=True, domain=np.lib.tracemalloc_domain)],
+    )
+    return sum(_.size for _ in snapshot.traces)
+
+
+@dataclass
+class Budget:
+    """Bytes a stage may use for an input of nbytes.
+
+    Parameters
+    ----------
+    bytes : int, optional
+        by default 0
+    per_input_byte : float, optional
+        by default 0
+    """
+
+    bytes: int = 0
+    per_input_byte: float = 0.0
+
+    def limit(self, nbytes: int) -> float:
+        return self.bytes + self.per_input_byte * nbytes
+
+
+@dataclass
+class MemoryMetric:
+    """Aggregated memory use of one stage, the largest of its calls."""
+
+    name: str
+    count: int = 0
+    input_bytes: int = 0
+    peak_bytes: int = 0
+    numpy_retained_bytes: int = 0
+    rss_delta_bytes: int = 0
+    hwm_delta_bytes: int = 0
+    over_budget: int = 0
+
+    def record(
+        self,
+        nbytes: int,
+        peak_bytes: int,
+        numpy_retained_bytes: int,
+        rss_delta_bytes: int,
+        hwm_delta_bytes: int,
+    ) -> None:
+        self.count += 1
+        self.input_bytes = max(self.input_bytes, nbytes)
+        self.peak_bytes = max(self.peak_bytes, peak_bytes)
+        self.numpy_retained_bytes = max(self.numpy_retained_bytes, numpy_retained_bytes)
+        self.rss_delta_bytes = max(self.rss_delta_bytes, rss_delta_bytes)
+        self.hwm_delta_bytes += hwm_delta_bytes
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "input_bytes": self.input_bytes,
+            "peak_bytes": self.peak_bytes,
+            "numpy_retained_bytes": self.numpy_retained_bytes,
+            "rss_delta_bytes": self.rss_delta_bytes,
+            "hwm_delta_bytes": self.hwm_delta_bytes,
+            "over_budget": self.over_budget,
+        }
+
+
+@dataclass
+class _Frame:
+    start: int
+    numpy_start: int
+    child_peak: int = 0
+
+
+class MemoryRegistry:
+    """Thread safe registry of stage memory use.
+
+    Nested stages are recorded hierarchically as in timing.MetricsRegistry.
+    tracemalloc is started on enable, unless it is already tracing, and
+    stopped again on disable. When the registry is disabled the decorators
+    call straight through to the wrapped function.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        by default False
+    strict : bool, optional
+        raise MemoryBudgetError for calls over budget, and measure one call
+        at a time, by default False
+    trace_numpy : bool, optional
+        record numpy_retained_bytes, which takes a tracemalloc snapshot at the start
+        and end of every call, by default True
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        strict: bool = False,
+        trace_numpy: bool = True,
+    ) -> None:
+        self.enabled = False
+        self.strict = strict
+        self.trace_numpy = trace_numpy
+        self.budgets: dict[str, Budget] = {}
+        self._metrics: dict[str, MemoryMetric] = {}
+        self._lock = threading.Lock()
+        # reentrant, a strict stage holds it while nested stages measure
+        self._serial = threading.RLock()
+        self._local = threading.local()
+        self._started_tracing = False
+        if enabled:
+            self.enable()
+
+    def enable(self, strict: bool | None = None) -> None:
+        self.enabled = True
+        if strict is not None:
+            self.strict = strict
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+    def set_budget(
+        self, name: str, bytes: int = 0, per_input_byte: float = 0.0
+    ) -> None:
+        """Declare the budget of a stage, see Budget."""
+        self.budgets[name] = Budget(bytes, per_input_byte)
+
+    def budget(self, name: str) -> Budget | None:
+        """Budget of a stage, by its full name or else the last part of it."""
+        return self.budgets.get(name) or self.budgets.get(name.rsplit("/", 1)[-1])
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def measure(self, name: str, nbytes: int = 0) -> Iterator[None]:
+        """Measure the memory use of a block of code.
+
+        Parameters
+        ----------
+        name : str
+            stage name, prefixed by any enclosing stages
+        nbytes : int, optional
+            input size the budget is scaled by, by default 0
+
+        Raises
+        ------
+        MemoryBudgetError
+            in strict mode, when the block uses more than the budget of name
+
+        """
+        if not self.enabled or not tracemalloc.is_tracing():
+            yield
+            return
+
+        with self._serial if self.strict else nullcontext():
+            with self._measure(name, nbytes):
+                yield
+
+    @contextmanager
+    def _measure(self, name: str, nbytes: int) -> Iterator[None]:
+        stack = self._stack()
+        (current, peak) = tracemalloc.get_traced_memory()
+        if stack:
+            # the peak is reset below, keep the one of the enclosing stage
+            stack[-1][1].child_peak = max(stack[-1][1].child_peak, peak)
+        numpy_start = numpy_traced_bytes() if self.trace_numpy else 0
+        (rss, hwm) = (rss_bytes(), peak_rss_bytes())
+        frame = _Frame(current, numpy_start)
+        stack.append((name, frame))
+        full_name = "/".join(_[0] for _ in stack)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            (_, peak) = tracemalloc.get_traced_memory()
+            peak = max(peak, frame.child_peak)
+            stack.pop()
+            if stack:
+                stack[-1][1].child_peak = max(stack[-1][1].child_peak, peak)
+            retained = (
+                numpy_traced_bytes() - frame.numpy_start if self.trace_numpy else 0
+            )
+            (peak, rss_delta) = (peak - frame.start, rss_bytes() - rss)
+            over = self.record(
+                full_name,
+                nbytes,
+                peak,
+                max(retained, 0),
+                rss_delta,
+                peak_rss_bytes() - hwm,
+            )
+        if over and self.strict:
+            msg = (
+                f"{full_name} used {max(peak, rss_delta)} bytes, over its budget "
+                f"of {self.budget(full_name).limit(nbytes):.0f} for {nbytes} "
+                "input bytes"
+            )
+            raise MemoryBudgetError(msg)
+
+    def record(
+        self,
+        name: str,
+        nbytes: int,
+        peak_bytes: int,
+        numpy_retained_bytes: int = 0,
+        rss_delta_bytes: int = 0,
+        hwm_delta_bytes: int = 0,
+    ) -> bool:
+        """Record one call, and check it against the budget of its stage.
+
+        Returns
+        -------
+        bool
+            True if the call used more than the budget
+
+        """
+        budget = self.budget(name)
+        used = max(peak_bytes, rss_delta_bytes)
+        over = budget is not None and used > budget.limit(nbytes)
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = MemoryMetric(name)
+            metric.record(
+                nbytes,
+                peak_bytes,
+                numpy_retained_bytes,
+                rss_delta_bytes,
+                hwm_delta_bytes,
+            )
+            metric.over_budget += over
+        return over
+
+    def measured(
+        self,
+        func: Callable | None = None,
+        *,
+        name: str | None = None,
+        bytes_arg: str | None = None,
+    ) -> Callable:
+        """Measure the memory use of every call of a function.
+
+        Can be used bare, @measured, or with arguments,
+        @measured(bytes_arg="data").
+
+        Parameters
+        ----------
+        func : Callable | None, optional
+        name : str | None, optional
+            stage name, by default the function name
+        bytes_arg : str | None, optional
+            argument whose size scales the budget, by default None
+
+        Returns
+        -------
+        Callable
+
+        """
+        if func is None:
+            return lambda f: self.measured(f, name=name, bytes_arg=bytes_arg)
+
+        stage = name or func.__name__
+        position = None
+        if bytes_arg is not None:
+            position = list(inspect.signature(func).parameters).index(bytes_arg)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+
+            nbytes = 0
+            if position is not None:
+                if bytes_arg in kwargs:
+                    nbytes = nbytes_of(kwargs[bytes_arg])
+                elif position < len(args):
+                    nbytes = nbytes_of(args[position])
+            with self.measure(stage, nbytes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: m.summary() for name, m in sorted(self._metrics.items())}
+
+    def report(self) -> pl.DataFrame:
+        """Per stage memory use with the budget at the largest input."""
+        # polars is only needed here, pulse_simulator imports this module
+        import polars as pl
+
+        rows = []
+        for name, stats in self.snapshot().items():
+            budget = self.budget(name)
+            limit = None if budget is None else budget.limit(stats["input_bytes"])
+            rows.append({"stage": name, **stats, "budget_bytes": limit})
+        return pl.DataFrame(
+            rows,
+            schema={
+                "stage": pl.String,
+                "count": pl.Int64,
+                "input_bytes": pl.Int64,
+                "peak_bytes": pl.Int64,
+                "numpy_retained_bytes": pl.Int64,
+                "rss_delta_bytes": pl.Int64,
+                "hwm_delta_bytes": pl.Int64,
+                "over_budget": pl.Int64,
+                "budget_bytes": pl.Float64,
+            },
+        )
+
+
+_mode = os.environ.get("SIGNALANALYSIS_MEMORY", "")
+registry = MemoryRegistry(enabled=_mode in {"1", "strict"}, strict=_mode == "strict")
+measured = registry.measured
+measure = registry.measure
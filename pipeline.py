@@ -0,0 +1,392 @@
+"""asyncio orchestration of the signal chain.
+
+Each stage is a coroutine reading from a bounded queue and writing to the
+next one, so a slow stage fills its input queue and throttles the stages in
+front of it. Stage functions run on an executor by default, NumPy, SciPy and
+Polars release the GIL so a thread pool overlaps the stages. Stateful stages
+see their items one at a time and in order.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Callable, Iterable, Iterator
+
+import numpy as np
+import polars as pl
+
+from channelizer import ChannelDetector, Channelizer
+from deinterleaver import StreamingBurstGrouper, burst_stats
+from pulse_simulator import (
+    StreamingDetector,
+    extract_pdws,
+    generate_noise,
+)
+from tdoa import pdw_frame
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One step of a pipeline.
+
+    func is called with each item and its result is passed on, None results
+    are dropped. flush is called once at the end of the stream and its
+    result, if not None, is passed on as a final item.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    flush: Callable[[], Any] | None = None
+    offload: bool = True
+
+
+@dataclass
+class StageStats:
+    name: str
+    items_in: int = 0
+    items_out: int = 0
+    busy_s: float = 0.0
+    started: float | None = None
+    stopped: float | None = None
+    queue_depth_max: int = 0
+    queue_depth_sum: int = 0
+
+    @property
+    def wall_s(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def summary(self) -> dict:
+        wall_s = self.wall_s
+        return {
+            "stage": self.name,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_s": self.busy_s,
+            "items_per_s": self.items_in / wall_s if wall_s else 0.0,
+            "utilization": self.busy_s / wall_s if wall_s else 0.0,
+            "queue_depth_max": self.queue_depth_max,
+            "queue_depth_mean": (
+                self.queue_depth_sum / self.items_in if self.items_in else 0.0
+            ),
+        }
+
+
+class Pipeline:
+    """Run stages connected by bounded queues.
+
+    The stage with the highest utilization in report is the bottleneck,
+    its input queue sits near maxsize while the queues after it stay empty.
+
+    Without an executor each run starts a thread pool with a thread per
+    stage and one for the source, and shuts it down when it returns. An
+    executor that is given is left to its owner.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        maxsize: int = 8,
+        executor: Executor | None = None,
+    ) -> None:
+        self.stages = stages
+        self.maxsize = maxsize
+        self.executor = executor
+        self.stats = [StageStats(_.name) for _ in stages]
+
+    async def _feed(self, source, out: asyncio.Queue, executor: Executor) -> None:
+        if hasattr(source, "__aiter__"):
+            async for item in source:
+                await out.put(item)
+        else:
+            loop = asyncio.get_running_loop()
+            items = iter(source)
+            while True:
+                item = await loop.run_in_executor(executor, next, items, _DONE)
+                if item is _DONE:
+                    break
+                await out.put(item)
+        await out.put(_DONE)
+
+    async def _work(
+        self,
+        stage: Stage,
+        stats: StageStats,
+        inp: asyncio.Queue,
+        out: asyncio.Queue,
+        executor: Executor,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+
+        async def run(func, *args) -> None:
+            start = time.perf_counter()
+            if stage.offload:
+                result = await loop.run_in_executor(executor, func, *args)
+            else:
+                result = func(*args)
+            stats.busy_s += time.perf_counter() - start
+            if result is not None:
+                stats.items_out += 1
+                await out.put(result)
+
+        while True:
+            depth = inp.qsize()
+            item = await inp.get()
+            if stats.started is None:
+                stats.started = time.perf_counter()
+            if item is _DONE:
+                break
+            stats.items_in += 1
+            stats.queue_depth_sum += depth
+            stats.queue_depth_max = max(stats.queue_depth_max, depth)
+            await run(stage.func, item)
+
+        if stage.flush is not None:
+            await run(stage.flush)
+        stats.stopped = time.perf_counter()
+        await out.put(_DONE)
+
+    async def run(self, source: Iterable | AsyncIterable) -> list:
+        """Push every item of source through the stages.
+
+        Parameters
+        ----------
+        source : Iterable | AsyncIterable
+            sync iterables are advanced on the executor
+
+        Returns
+        -------
+        list
+            outputs of the last stage
+
+        """
+        queues = [asyncio.Queue(self.maxsize) for _ in range(len(self.stages) + 1)]
+        results = []
+        executor = self.executor or ThreadPoolExecutor(
+            max_workers=len(self.stages) + 1,
+        )
+
+        async def collect() -> None:
+            while (item := await queues[-1].get()) is not _DONE:
+                results.append(item)
+
+        tasks = [
+            asyncio.ensure_future(self._feed(source, queues[0], executor)),
+            *[
+                asyncio.ensure_future(self._work(stage, stats, inp, out, executor))
+                for stage, stats, inp, out in zip(
+                    self.stages,
+                    self.stats,
+                    queues[:-1],
+                    queues[1:],
+                )
+            ],
+            asyncio.ensure_future(collect()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            if executor is not self.executor:
+                # every stage has returned unless cancelled, no need to wait
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def run_sync(self, source: Iterable | AsyncIterable) -> list:
+        return asyncio.run(self.run(source))
+
+    def report(self) -> pl.DataFrame:
+        """Per stage throughput, utilization and input queue depth."""
+        return pl.DataFrame([_.summary() for _ in self.stats])
+
+
+def signal_chunks(
+    pri_s: float,
+    sample_rate_s: float,
+    num_pulses: int,
+    pw_s: float,
+    chunk_size: int = 100000,
+    noise_var: float | None = 1,
+    rng: np.random.Generator | None = None,
+    dtype: np.dtype = np.float64,
+    snr: float = 100,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Simulated signal split into blocks of samples.
+
+    The blocks equal make_signal split into chunk_size samples plus noise,
+    but each block is generated on its own, so only one block is in memory
+    at a time however long the signal.
+
+    Parameters
+    ----------
+    pri_s : float
+    sample_rate_s : float
+    num_pulses : int
+    pw_s : float
+    chunk_size : int, optional
+        samples per block, by default 100000
+    noise_var : float | None, optional
+        variance of added noise, None for no noise, by default 1
+    rng : np.random.Generator | None, optional
+    dtype : np.dtype, optional
+        sample dtype, e.g. complex64 for IQ, by default float64
+    snr : float, optional
+        pulse amplitude, by default 100
+
+    Yields
+    ------
+    tuple[np.ndarray, np.ndarray]
+        times and samples of each block
+
+    """
+    # the sample count and pulse positions of make_signal
+    num_samples = len(np.arange(0, pri_s * num_pulses + pw_s, sample_rate_s))
+    starts = (pri_s * np.arange(num_pulses) / sample_rate_s).astype(np.int64)
+    width = int(pw_s / sample_rate_s) + 1
+    if num_pulses and starts[-1] + width > num_samples:
+        msg = "pulses extend past the end of the signal"
+        raise IndexError(msg)
+
+    rng = rng or np.random.default_rng()
+    for start in range(0, num_samples, chunk_size):
+        stop = min(start + chunk_size, num_samples)
+        # +1 where a pulse starts and -1 after it ends, within the block
+        edges = np.zeros(stop - start + 1, dtype=np.int64)
+        np.add.at(edges, np.clip(starts - start, 0, stop - start), 1)
+        np.add.at(edges, np.clip(starts + width - start, 0, stop - start), -1)
+        block = np.zeros(stop - start, dtype=dtype)
+        block[np.cumsum(edges[:-1]) > 0] = snr
+        if noise_var is not None:
+            block += generate_noise(len(block), var=noise_var, rng=rng, dtype=dtype)
+        yield (np.arange(start, stop) * sample_rate_s, block)
+
+
+def signal_chain(
+    sample_rate_s: float,
+    pw_s: float,
+    pri_s: float,
+    tol: float = 0.1,
+    min_num_pulses: int = 5,
+    threshold: float = 400,
+    maxsize: int = 8,
+    executor: Executor | None = None,
+    num_channels: int | None = None,
+    oversample: int = 1,
+) -> Pipeline:
+    """Pipeline from sample blocks to burst statistics.
+
+    Stages are detect, pdws, bursts and stats. Blocks are (times, samples)
+    pairs such as those yielded by signal_chunks. With num_channels the
+    blocks are split by a Channelizer first and detect and pdws are replaced
+    by channelize and a ChannelDetector, which also measures RF.
+
+    Parameters
+    ----------
+    sample_rate_s : float
+    pw_s : float
+    pri_s : float
+    tol : float, optional
+        PRI tolerance of the burst grouping, by default 0.1
+    min_num_pulses : int, optional
+        by default 5
+    threshold : float, optional
+        detector threshold, by default 400
+    maxsize : int, optional
+        queue size between stages, by default 8
+    executor : Executor | None, optional
+        by default a thread pool with one thread per stage, see Pipeline
+    num_channels : int | None, optional
+        channels of the filter bank, by default the blocks are detected
+        unchannelized
+    oversample : int, optional
+        1 or 2, see Channelizer, by default 1
+
+    Returns
+    -------
+    Pipeline
+
+    """
+    detector = StreamingDetector(sample_rate_s, pw_s, threshold)
+    grouper = StreamingBurstGrouper(pri_s, tol, min_num_pulses)
+    held = []
+
+    def detect(block: tuple) -> tuple:
+        (times, data) = block
+        return (times, detector(data), data)
+
+    def pdws(block: tuple) -> pl.DataFrame:
+        if held:
+            block = tuple(np.concatenate(_) for _ in zip(held.pop(), block))
+        (times, detects, data) = block
+        # hold back a pulse still open at the end of the block
+        if len(detects) and detects[-1]:
+            gaps = np.flatnonzero(detects == 0)
+            start = gaps[-1] + 1 if len(gaps) else 0
+            held.append(tuple(_[start:] for _ in block))
+            (times, detects, data) = (_[:start] for _ in block)
+        return pdw_frame(extract_pdws(times, detects, data, sample_rate_s))
+
+    def flush_pdws() -> pl.DataFrame | None:
+        if not held:
+            return None
+        return pdw_frame(extract_pdws(*held.pop(), sample_rate_s))
+
+    def summarize(bursts: pl.DataFrame) -> pl.DataFrame | None:
+        return burst_stats(bursts) if len(bursts) else None
+
+    if num_channels is None:
+        front = [
+            Stage("detect", detect),
+            Stage("pdws", pdws, flush=flush_pdws),
+        ]
+    else:
+        front = _channel_stages(
+            Channelizer(num_channels, oversample=oversample),
+            sample_rate_s,
+            pw_s,
+            threshold,
+        )
+    stages = [
+        *front,
+        Stage("bursts", grouper.push, flush=grouper.flush),
+        Stage("stats", summarize),
+    ]
+    return Pipeline(stages, maxsize=maxsize, executor=executor)
+
+
+def _channel_stages(
+    channelizer: Channelizer,
+    sample_rate_s: float,
+    pw_s: float,
+    threshold: float,
+) -> list[Stage]:
+    """channelize and pdws stages of a channelized signal_chain."""
+    detector = ChannelDetector(channelizer, sample_rate_s, pw_s, threshold)
+
+    def channelize(block: tuple) -> tuple:
+        (times, data) = block
+        start = channelizer.offset
+        channels = channelizer(data)
+        return (times[start :: channelizer.decimation], channels)
+
+    def pdws(block: tuple) -> pl.DataFrame:
+        return detector.push(*block)
+
+    def flush_pdws() -> pl.DataFrame | None:
+        with detector:
+            return detector.flush()
+
+    return [
+        Stage("channelize", channelize),
+        Stage("pdws", pdws, flush=flush_pdws),
+    ]
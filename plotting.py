@@ -0,0 +1,234 @@
+"""Plotting helpers, kept apart from the numerical modules.
+
+Importing this module loads pyqtgraph and Qt, and animate_orbit loads
+matplotlib, so the core modules only import it when a plot is made and batch
+workers never pay for the GUI stack.
+
+Long captures are drawn from a MinMaxPyramid. On every pan, zoom or resize
+only the visible range is fetched at about one block per pixel, so the
+number of points handed to Qt stays near the screen width whatever the
+capture size.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pyqtgraph as pg
+
+from pyramid import MinMaxPyramid
+
+if TYPE_CHECKING:
+    from analysis import HistogramResults
+
+
+class LodCurve:
+    """A curve on a PlotItem that follows the view range.
+
+    Samples are assumed uniformly spaced, x = x0 + index * dx.
+    """
+
+    def __init__(
+        self,
+        plot: pg.PlotItem,
+        y: np.ndarray,
+        x: np.ndarray | None = None,
+        pyramid: MinMaxPyramid | None = None,
+        **kwargs,
+    ) -> None:
+        self.plot = plot
+        self.pyramid = pyramid or MinMaxPyramid.build(y)
+        if x is None or len(x) < 2:
+            (self.x0, self.dx) = (0.0, 1.0)
+        else:
+            (self.x0, self.dx) = (float(x[0]), float(x[1] - x[0]))
+
+        self.curve = plot.plot(**kwargs)
+        view = plot.getViewBox()
+        view.sigXRangeChanged.connect(self.update)
+        view.sigResized.connect(self.update)
+        plot.setXRange(self.x0, self.x0 + self.dx * len(self.pyramid), padding=0)
+        self.update()
+
+    def visible_samples(self) -> tuple[int, int]:
+        (x_min, x_max) = self.plot.getViewBox().viewRange()[0]
+        start = int(np.floor((x_min - self.x0) / self.dx))
+        stop = int(np.ceil((x_max - self.x0) / self.dx)) + 1
+        return (max(start, 0), min(stop, len(self.pyramid)))
+
+    def update(self, *_) -> None:
+        (start, stop) = self.visible_samples()
+        width = int(self.plot.getViewBox().width()) or 1000
+        (indices, values) = self.pyramid.query(start, stop, width)
+        self.curve.setData(self.x0 + indices * self.dx, values)
+
+
+def lod_plot(
+    win: pg.GraphicsLayout,
+    y: np.ndarray,
+    x: np.ndarray | None = None,
+    title: str | None = None,
+    pyramid: MinMaxPyramid | None = None,
+) -> pg.PlotItem:
+    """Add a decimated plot of y to a layout.
+
+    Drop in replacement for win.addPlot(title=title, y=y, x=x) on long data.
+
+    Parameters
+    ----------
+    win : pg.GraphicsLayout
+    y : np.ndarray
+    x : np.ndarray | None, optional
+        uniformly spaced sample positions, by default the sample index
+    title : str | None, optional
+    pyramid : MinMaxPyramid | None, optional
+        prebuilt or memory-mapped pyramid for y, by default built here
+
+    Returns
+    -------
+    pg.PlotItem
+
+    """
+    plot = win.addPlot(title=title)
+    plot.lod_curve = LodCurve(plot, y, x, pyramid)
+    plot.setMouseEnabled(x=True, y=False)
+    return plot
+
+
+def plotter(win: pg.GraphicsLayout, y: np.ndarray, x: np.ndarray | None = None) -> None:
+    """Plot data using pyqtplot.
+
+    Parameters
+    ----------
+    y : np.ndarray
+        _description_
+    x : np.ndarray | None, optional
+        _description_, by default None
+    win : pg.GraphicsLayout | None, optional
+        _description_, by default None
+
+    """
+    app = pg.mkQApp("Plotting Example")
+
+    win.resize(1000, 600)
+    win.setWindowTitle("pyqtgraph example: Plotting")
+
+    pg.setConfigOptions(antialias=True)
+    lod_plot(win, y, x, title="Basic array plotting")
+
+
+def plot_hist(win, hist: HistogramResults):
+    """Histogram plot.
+
+    Parameters
+    ----------
+    win : _type_
+        _description_
+    hist : HistogramResults
+        _description_
+
+    """
+    win.resize(800, 480)
+    win.setWindowTitle("Histogram")
+    plt = win.addPlot()
+
+    bgi = pg.BarGraphItem(
+        x0=hist.bins[:-1],
+        x1=hist.bins[1:],
+        height=hist.counts,
+        pen="w",
+        brush=(0, 0, 255, 150),
+    )
+    plt.addItem(bgi)
+
+
+def plot_line(win, x, y):
+    """Line plot.
+
+    Parameters
+    ----------
+    win : _type_
+        _description_
+    x : _type_
+        _description_
+    y : _type_
+        _description_
+
+    """
+    win.resize(800, 480)
+    win.setWindowTitle("Histogram")
+    plt = win.addPlot()
+    plt.plot(x, y)
+
+
+def animate_orbit(trajectory: np.ndarray, radius: float, interval: int = 10) -> None:
+    """Animate a satellite trajectory around the Earth in matplotlib.
+
+    Parameters
+    ----------
+    trajectory : np.ndarray
+        states [x, y, z, ...] per time step, as from geo_engine.orbit_trajectory
+    radius : float
+        radius of the Earth wireframe
+    interval : int, optional
+        delay between frames in milliseconds, by default 10
+
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    fig = plt.figure(figsize=(10, 10))
+    ax = fig.add_subplot(111, projection="3d")
+
+    # Earth representation
+    u, v = np.mgrid[0 : 2 * np.pi : 20j, 0 : np.pi : 10j]
+    x = radius * np.cos(u) * np.sin(v)
+    y = radius * np.sin(u) * np.sin(v)
+    z = radius * np.cos(v)
+
+    def draw_axes():
+        ax.plot_wireframe(x, y, z, color="blue", alpha=0.3)
+        ax.set_xlabel("X")
+        ax.set_ylabel("Y")
+        ax.set_zlabel("Z")
+        ax.set_xlim([-2 * radius, 2 * radius])
+        ax.set_ylim([-2 * radius, 2 * radius])
+        ax.set_zlim([-2 * radius, 2 * radius])
+
+    draw_axes()
+
+    # Animation update function
+    def update(frame):
+        # clear() resets the axis limits and labels
+        ax.clear()
+        draw_axes()
+
+        # Plot orbit path
+        ax.plot(
+            trajectory[: frame + 1, 0],
+            trajectory[: frame + 1, 1],
+            trajectory[: frame + 1, 2],
+            "r-",
+            linewidth=0.5,
+        )
+
+        # Plot current position of satellite
+        ax.scatter(
+            trajectory[frame, 0],
+            trajectory[frame, 1],
+            trajectory[frame, 2],
+            color="red",
+            s=50,
+        )
+        ax.set_title(f"3D Satellite Orbit Simulation - Time Step: {frame}")
+
+    anim = FuncAnimation(
+        fig,
+        update,
+        frames=len(trajectory) - 1,
+        interval=interval,
+        repeat=False,
+    )
+
+    plt.show()
@@ -1,12 +1,37 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass, field
+from typing import Any, Iterator
 
 import numpy as np
-import pyqtgraph as pg
-from scipy import ndimage, signal
+from scipy import ndimage
 
+import jit
+from buffers import BufferPool
+from kernels import box_sum, diff_histogram, fold_norms
+from memo import ResultCache, content_hash
+from memory import measured
+from timing import timed
 
+# real values drawn per generator by generate_noise
+NOISE_BLOCK = 2**18
+
+# plotting helpers moved to plotting.py, they load pyqtgraph and Qt on first use
+_PLOTTING = ("plotter",)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _PLOTTING:
+        import plotting
+
+        return getattr(plotting, name)
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+@measured(bytes_arg="data")
 def frame_array(data: np.ndarray, frame_length: int) -> np.ndarray:
     """Frame data as a matrix.
 
@@ -32,30 +57,178 @@ def frame_array(data: np.ndarray, frame_length: int) -> np.ndarray:
     return np.stack(np.array_split(data, num_frames))
 
 
+IQ_SCALE = 1 / 32768
+
+BLUE_FORMATS = {
+    np.dtype(np.int8): "SB",
+    np.dtype(np.int16): "SI",
+    np.dtype(np.float32): "SF",
+    np.dtype(np.float64): "SD",
+    np.dtype(np.complex64): "CF",
+    np.dtype(np.complex128): "CD",
+}
+
+
+def blue_format(data: np.ndarray, interleaved: bool = False) -> str:
+    """BLUE file format code of an array, e.g. "CF" for complex64.
+
+    Parameters
+    ----------
+    data : np.ndarray
+    interleaved : bool, optional
+        data holds I and Q interleaved, as from iq_to_int16, "CI" for int16,
+        by default False
+
+    Returns
+    -------
+    str
+
+    """
+    code = BLUE_FORMATS[np.dtype(data.dtype)]
+    if interleaved:
+        if code[0] == "C":
+            msg = "interleaved I and Q must be real samples"
+            raise ValueError(msg)
+        return "C" + code[1]
+    return code
+
+
+def working_dtype(dtype: np.dtype) -> np.dtype:
+    """Dtype samples of dtype are processed in.
+
+    Floating and complex samples keep their precision, integer samples are
+    processed as float32 up to 16 bits and float64 above.
+
+    Parameters
+    ----------
+    dtype : np.dtype
+
+    Returns
+    -------
+    np.dtype
+
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind in "fc":
+        return dtype
+    return np.dtype(np.float32 if dtype.itemsize <= 2 else np.float64)
+
+
+def iq_from_int16(raw: np.ndarray, scale: float = IQ_SCALE) -> np.ndarray:
+    """Complex64 samples from interleaved int16 I and Q, the BLUE CI format.
+
+    Converted and scaled in one pass without float64 temporaries.
+
+    Parameters
+    ----------
+    raw : np.ndarray
+        int16 I, Q, I, Q, ... or an (n, 2) array
+    scale : float, optional
+        full scale of the converter, by default IQ_SCALE
+
+    Returns
+    -------
+    np.ndarray
+        complex64
+
+    """
+    raw = np.asarray(raw, dtype=np.int16).reshape(-1)
+    if len(raw) % 2:
+        msg = "interleaved IQ needs an even number of values"
+        raise ValueError(msg)
+    iq = np.empty(len(raw) // 2, dtype=np.complex64)
+    np.multiply(raw, np.float32(scale), out=iq.view(np.float32))
+    return iq
+
+
+def iq_to_int16(iq: np.ndarray, scale: float = IQ_SCALE) -> np.ndarray:
+    """Interleaved int16 I and Q from complex samples, inverse of iq_from_int16.
+
+    Values beyond full scale are clipped.
+
+    Parameters
+    ----------
+    iq : np.ndarray
+    scale : float, optional
+        by default IQ_SCALE
+
+    Returns
+    -------
+    np.ndarray
+        int16 I, Q, I, Q, ...
+
+    """
+    iq = np.ascontiguousarray(iq)
+    real = np.finfo(iq.dtype).dtype
+    parts = iq.view(real) / real.type(scale)
+    np.rint(parts, out=parts)
+    np.clip(parts, -32768, 32767, out=parts)
+    return parts.astype(np.int16)
+
+
+def envelope(data: np.ndarray, overwrite: bool = False) -> np.ndarray:
+    """Magnitude of samples, in the precision of data.
+
+    Parameters
+    ----------
+    data : np.ndarray
+    overwrite : bool, optional
+        write the result into data, by default False. For complex data the
+        magnitudes go over the real parts and a strided view of them is
+        returned, so nothing is allocated.
+
+    Returns
+    -------
+    np.ndarray
+
+    """
+    if not np.iscomplexobj(data):
+        return np.abs(data, out=data if overwrite else None)
+    if not overwrite:
+        return np.abs(data)
+    real = data.real
+    return np.hypot(real, data.imag, out=real)
+
+
 def save_as_1000(data, fp, inputs):
-    header = bluefile.header(type=1001, format="SB", xunits=1, xdelta=0.01)
+    header = bluefile.header(
+        type=1001,
+        format=blue_format(data),
+        xunits=1,
+        xdelta=0.01,
+    )
     bluefile.write(fp, header, data)
 
 
 def save_as_2000(data, fp, frame_length, inputs):
     header = bluefile.header(
         type=2000,
-        format="SB",
+        format=blue_format(data),
         xunits=1,
         xdelta=0.01,
         subsize=frame_length,
     )
-    bluefiile.write(fp, header, frame_array(data, frame_length))
+    bluefile.write(fp, header, frame_array(data, frame_length))
 
 
 def generate_noise(
     num_samples: int,
     mean: float = 0,
     var: float = 1,
-    rng=np.random.default_rng(),
+    rng: np.random.Generator | None = None,
+    dtype: np.dtype = np.float64,
+    out: np.ndarray | None = None,
+    max_workers: int | None = None,
 ) -> np.ndarray:
     """Generate white noise.
 
+    Complex noise has the same power as real noise, split evenly between I
+    and Q. Samples are drawn in the precision of dtype.
+
+    Noise longer than NOISE_BLOCK values is drawn in blocks, each from its
+    own generator spawned from rng, by a thread pool. The blocks do not
+    depend on the number of threads, so neither does the noise.
+
     Parameters
     ----------
     num_samples : int
@@ -64,8 +237,15 @@ def generate_noise(
         _description_, by default 0
     var : float, optional
         _description_, by default 1
-    rng : _type_, optional
-        _description_, by default np.random.default_rng()
+    rng : np.random.Generator | None, optional
+        by default a new unseeded generator
+    dtype : np.dtype, optional
+        float32, float64, complex64 or complex128, by default float64
+    out : np.ndarray | None, optional
+        contiguous array of num_samples to fill, its dtype is used instead
+        of dtype, by default allocated
+    max_workers : int | None, optional
+        threads filling the blocks, by default None
 
     Returns
     -------
@@ -73,33 +253,35 @@ def generate_noise(
         _description_
 
     """
-    return rng.normal(mean, var, size=num_samples)
-
-
-def plotter(win: pg.GraphicsLayout, y: np.ndarray, x: np.ndarray | None = None) -> None:
-    """Plot data using pyqtplot.
-
-    Parameters
-    ----------
-    y : np.ndarray
-        _description_
-    x : np.ndarray | None, optional
-        _description_, by default None
-    win : pg.GraphicsLayout | None, optional
-        _description_, by default None
-
-    """
-    app = pg.mkQApp("Plotting Example")
-
-    win.resize(1000, 600)
-    win.setWindowTitle("pyqtgraph example: Plotting")
-
-    pg.setConfigOptions(antialias=True)
-    if x is None:
-        p1 = win.addPlot(title="Basic array plotting", y=y)
+    rng = rng or np.random.default_rng()
+    dtype = np.dtype(dtype if out is None else out.dtype)
+    real = np.finfo(dtype).dtype
+    noise = np.empty(num_samples, dtype=dtype) if out is None else out
+    values = noise.view(real)
+    scale = real.type(var / np.sqrt(2) if dtype.kind == "c" else var)
+    offset = real.type(mean)
+    starts = range(0, len(values), NOISE_BLOCK)
+    if len(starts) <= 1:
+        rng.standard_normal(dtype=real, out=values)
+        noise *= scale
+        noise += mean
+        return noise
+
+    def fill(start: int, block_rng: np.random.Generator) -> None:
+        block = values[start : start + NOISE_BLOCK]
+        block_rng.standard_normal(dtype=real, out=block)
+        block *= scale
+        # blocks hold whole samples, the mean goes on the real part
+        block[:: 2 if dtype.kind == "c" else 1] += offset
+
+    block_rngs = rng.spawn(len(starts))
+    if max_workers == 1:
+        for start, block_rng in zip(starts, block_rngs):
+            fill(start, block_rng)
     else:
-        p1 = win.addPlot(title="Basic array plotting", y=y, x=x)
-    p1.setMouseEnabled(x=True, y=False)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(fill, starts, block_rngs))
+    return noise
 
 
 @dataclass
@@ -124,6 +306,8 @@ def make_signal(
     pw_s: float | None = None,
     duty_cycle: float = 0.001,
     snr: float = 100,
+    backend: str | None = None,
+    dtype: np.dtype = np.float64,
 ) -> np.ndarray:
     if pw_s is None:
         pw_s = pri_s * duty_cycle
@@ -131,17 +315,20 @@ def make_signal(
     start = 0
     stop = pri_s * num_pulses + pw_s
     data_times = np.arange(start=start, stop=stop, step=sample_rate_s)
-    signal = np.zeros_like(data_times)
+    signal = np.zeros(len(data_times), dtype=dtype)
 
-    pulse_indices = []
-    pulse_starts = pri_s * np.array(list(range(num_pulses)))
-    for p_start in pulse_starts:
-        start_index = int(p_start / sample_rate_s)
-        stop_index = start_index + int(pw_s / sample_rate_s) + 1
-        new_indices = list(range(start_index, stop_index))
-        pulse_indices.append(new_indices)
+    pulse_starts = pri_s * np.arange(num_pulses)
+    start_indices = (pulse_starts / sample_rate_s).astype(np.int64)
+    width = int(pw_s / sample_rate_s) + 1
+    if num_pulses and start_indices[-1] + width > len(signal):
+        msg = "pulses extend past the end of the signal"
+        raise IndexError(msg)
 
-        signal[new_indices] = snr
+    if jit.use_numba(backend):
+        jit.place_pulses(signal, start_indices, width, snr)
+    else:
+        pulse_indices = start_indices[:, np.newaxis] + np.arange(width)
+        signal[pulse_indices.ravel()] = snr
 
     return (data_times, signal)
 
@@ -164,11 +351,15 @@ def calc_norm(data: np.ndarray) -> float:
     return np.max(np.abs(sums)) / data.shape[1]
 
 
+@timed(bytes_arg="data")
 def detector(
     data: np.ndarray,
     sample_rate_s: float,
     pw_s: float,
     threshold: float = 10,
+    out: np.ndarray | None = None,
+    pool: BufferPool | None = None,
+    overwrite: bool = False,
 ) -> np.array:
     """Detect signal.
 
@@ -182,33 +373,172 @@ def detector(
         _description_
     threshold : float, optional
         _description_, by default 10
+    out : np.ndarray | None, optional
+        int8 array of len(data) for the detections, by default allocated
+    pool : BufferPool | None, optional
+        source of the filter scratch buffers, by default allocated
+    overwrite : bool, optional
+        compute the envelope of complex data in place of data, by default
+        False
 
     Returns
     -------
     np.array
-        _description_
+        int8, 1 where a detection is made
 
     """
+    data = _detector_input(data, overwrite)
     width = int(pw_s / sample_rate_s) + 1
-    b_filter = [1 for _ in range(width)]
-    detects = signal.lfilter(b=b_filter, a=[1], x=data)
+    with _sums(pool, len(data), data.dtype) as sums:
+        box_sum(data, width, out=sums)
+        return _threshold(sums, 400, out)
+
+
+def _detector_input(data: np.ndarray, overwrite: bool = False) -> np.ndarray:
+    """Samples the detector filters, complex IQ is reduced to its envelope."""
+    data = np.asarray(data)
+    if np.iscomplexobj(data):
+        return envelope(data, overwrite=overwrite)
+    return data.astype(working_dtype(data.dtype), copy=False)
 
-    return np.where(detects >= 400, 1, 0)
 
+@contextmanager
+def _sums(pool: BufferPool | None, n: int, dtype: np.dtype) -> Iterator[np.ndarray]:
+    """Output buffer of box_sum for n samples of dtype."""
+    if pool is None:
+        yield np.empty(n, dtype=dtype)
+        return
+    with pool.borrow(n, dtype) as sums:
+        yield sums
 
-def try_pris(data: np.ndarray, sample_rate_s) -> tuple:
-    min_pri = 2 * sample_rate_s
-    max_pri = 1
 
-    pris_to_test = list(np.arange(min_pri, max_pri, 0.05))
+def _threshold(
+    sums: np.ndarray, threshold: float, out: np.ndarray | None
+) -> np.ndarray:
+    out = np.empty(len(sums), dtype=np.int8) if out is None else out
+    np.greater_equal(sums, threshold, out=out.view(np.bool_))
+    return out
+
+
+class StreamingDetector:
+    """detector over consecutive blocks of one stream.
+
+    The last width - 1 samples are carried between blocks, so the detections
+    of the blocks concatenated equal detector on the whole stream, up to
+    rounding of sums right at the threshold. Sums are taken in the working
+    dtype of the samples into a buffer from pool, with out given and blocks
+    of a steady size nothing is allocated per block. Calls with overwrite=True reduce complex blocks to
+    their envelope in place.
+    """
+
+    def __init__(
+        self,
+        sample_rate_s: float,
+        pw_s: float,
+        threshold: float = 400,
+        pool: BufferPool | None = None,
+    ):
+        self.width = int(pw_s / sample_rate_s) + 1
+        self.threshold = threshold
+        self.pool = pool or BufferPool()
+        self.tail = np.zeros(self.width - 1)
+
+    def __call__(
+        self,
+        data: np.ndarray,
+        out: np.ndarray | None = None,
+        overwrite: bool = False,
+    ) -> np.ndarray:
+        data = _detector_input(data, overwrite)
+        if self.tail.dtype != data.dtype:
+            self.tail = self.tail.astype(data.dtype)
+        with self.pool.borrow(len(data), data.dtype) as sums:
+            box_sum(data, self.width, out=sums, tail=self.tail)
+            return _threshold(sums, self.threshold, out)
+
+
+@timed(bytes_arg="data")
+@measured(bytes_arg="data")
+def try_pris(
+    data: np.ndarray,
+    sample_rate_s,
+    backend: str | None = None,
+    pris: np.ndarray | None = None,
+    cache: ResultCache | None = None,
+) -> tuple:
+    """Fold detections at each candidate PRI.
+
+    Parameters
+    ----------
+    data : np.ndarray
+    sample_rate_s : float
+    backend : str | None, optional
+        "numpy" or "numba", by default the global backend
+    pris : np.ndarray | None, optional
+        candidate PRIs, by default every 0.05 s from 2 * sample_rate_s to 1
+    cache : ResultCache | None, optional
+        scores of earlier sweeps of the same data are reused from it and
+        only the missing frame lengths computed, by default no caching
+
+    Returns
+    -------
+    tuple
+        candidate PRIs and their norms
+
+    """
+    if pris is None:
+        min_pri = 2 * sample_rate_s
+        max_pri = 1
+        pris = np.arange(min_pri, max_pri, 0.05)
+
+    pris_to_test = list(pris)
     frame_lengths = (np.array(pris_to_test) / sample_rate_s).astype(int)
 
-    results = [calc_norm(frame_array(data, _)) for _ in frame_lengths]
+    if cache is None:
+        results = list(_fold_norms(data, frame_lengths, backend))
+    else:
+        results = list(_cached_fold_norms(data, frame_lengths, backend, cache))
 
     return (pris_to_test, results)
 
 
-def find_diffs(ar: np.ndarray) -> np.ndarray:
+def _fold_norms(
+    data: np.ndarray,
+    frame_lengths: np.ndarray,
+    backend: str | None,
+) -> np.ndarray:
+    if jit.use_numba(backend):
+        return jit.fold_norms(np.asarray(data, dtype=float), frame_lengths)
+    return fold_norms(data, frame_lengths)
+
+
+def _cached_fold_norms(
+    data: np.ndarray,
+    frame_lengths: np.ndarray,
+    backend: str | None,
+    cache: ResultCache,
+) -> np.ndarray:
+    # the backends agree to rounding, so they share entries
+    key = content_hash(data, "fold_norms")
+    entry = cache.get(key) or {
+        "lengths": np.array([], dtype=np.int64),
+        "norms": np.array([]),
+    }
+    (lengths, norms) = (entry["lengths"], entry["norms"])
+
+    missing = np.setdiff1d(frame_lengths, lengths)
+    if len(missing):
+        lengths = np.concatenate([lengths, missing])
+        norms = np.concatenate([norms, _fold_norms(data, missing, backend)])
+        order = np.argsort(lengths)
+        (lengths, norms) = (lengths[order], norms[order])
+        cache.put(key, lengths=lengths, norms=norms)
+
+    return norms[np.searchsorted(lengths, frame_lengths)]
+
+
+@measured(bytes_arg="ar")
+def find_diffs(ar: np.ndarray, backend: str | None = None) -> np.ndarray:
     """Find all pairwise differences between elements.
 
     Computes absolute value of differences.
@@ -216,12 +546,17 @@ def find_diffs(ar: np.ndarray) -> np.ndarray:
     Parameters
     ----------
     ar : np.ndarray
+    backend : str | None, optional
+        "numpy" or "numba", by default the global backend
 
     Returns
     -------
     np.ndarray
 
     """
+    if jit.use_numba(backend):
+        return jit.pairwise_diffs(np.ascontiguousarray(ar))
+
     all_diffs = np.subtract.outer(ar, ar)
 
     return np.abs(np.ravel(all_diffs[np.triu_indices(ar.shape[0], 1)]))
@@ -230,9 +565,23 @@ def find_diffs(ar: np.ndarray) -> np.ndarray:
 def find_periods(
     toas: np.ndarray,
     num_pulses: int = 5,
+    cache: ResultCache | None = None,
 ) -> np.ndarray:
-    diffs = find_diffs(toas)
-    (hist, edges) = np.histogram(diffs)
+    if len(toas) < 2:
+        return np.array([])
+
+    toas = np.sort(toas)
+    # only the range of the differences is needed to match np.histogram(diffs)
+    edges = np.histogram_bin_edges([np.min(np.diff(toas)), toas[-1] - toas[0]])
+    if cache is None:
+        hist = diff_histogram(toas, edges)
+    else:
+        key = content_hash(toas, "diff_histogram")
+        entry = cache.get(key)
+        if entry is None:
+            entry = {"hist": diff_histogram(toas, edges)}
+            cache.put(key, **entry)
+        hist = entry["hist"]
 
     if np.max(hist) <= num_pulses:
         return np.array([])
@@ -246,10 +595,64 @@ class Pdw:
     pa: np.array = field(default_factory=lambda: np.array([]))
 
 
+def extract_pdws(
+    times: np.ndarray,
+    detects: np.ndarray,
+    data: np.ndarray,
+    sample_rate_s: float,
+) -> Pdw:
+    """Pulse descriptor words from runs of detections.
+
+    Each run of consecutive detections is one pulse. RF is not measured by
+    the detector and is left as nan.
+
+    Parameters
+    ----------
+    times : np.ndarray
+    detects : np.ndarray
+        output of detector
+    data : np.ndarray
+        samples the detections were made on, used for amplitude, the
+        envelope of complex samples
+    sample_rate_s : float
+
+    Returns
+    -------
+    Pdw
+
+    """
+    if np.iscomplexobj(data):
+        data = envelope(data)
+    edges = np.diff(np.asarray(detects, dtype=np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges > 0)
+    stops = np.flatnonzero(edges < 0)
+
+    if len(starts) == 0:
+        return Pdw()
+
+    bounds = np.column_stack([starts, stops]).ravel()
+    if bounds[-1] == len(data):
+        bounds = bounds[:-1]
+    amplitudes = np.maximum.reduceat(data, bounds)[::2]
+
+    return Pdw(
+        toa_s=times[starts],
+        pw_s=(stops - starts) * sample_rate_s,
+        rf_s=np.full(len(starts), np.nan),
+        pa=amplitudes,
+    )
+
+
 def sampled_dw(pdw: Pdw, sample_rate_Hz: float) -> Pdw:
     start = np.min(pdw.toa_s)
     end = np.max(pdw.toa_s)
-def moving_average(ar: np.ndarray, order: int = 3) -> np.ndarray:
+
+
+def moving_average(
+    ar: np.ndarray,
+    order: int = 3,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
     """Compute moving average.
 
     Input array is padded with zeros.
@@ -261,6 +664,9 @@ def moving_average(ar: np.ndarray, order: int = 3) -> np.ndarray:
     ar : np.ndarray
     order : int, optional
         window length, by default 3
+    out : np.ndarray | None, optional
+        array of len(ar) for the result, may be ar, by default allocated in
+        the working dtype of ar
 
     Returns
     -------
@@ -268,10 +674,21 @@ def moving_average(ar: np.ndarray, order: int = 3) -> np.ndarray:
 
     """
     # return signal.convolve(ar, np.ones(order) / order, "same")
-    return ndimage.uniform_filter1d(ar, order, mode="constant", cval=0.0)
+    ar = np.asarray(ar)
+    return ndimage.uniform_filter1d(
+        ar,
+        order,
+        output=working_dtype(ar.dtype) if out is None else out,
+        mode="constant",
+        cval=0.0,
+    )
 
 
-def noise_filter(ar: np.ndarray, order: int = 3) -> np.ndarray:
+def noise_filter(
+    ar: np.ndarray,
+    order: int = 3,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
     """Subtract off moving average.
 
     Parameters
@@ -279,16 +696,28 @@ def noise_filter(ar: np.ndarray, order: int = 3) -> np.ndarray:
     ar : np.ndarray
     order : int, optional
         window length, by default 3
+    out : np.ndarray | None, optional
+        array of len(ar) for the result, by default allocated in the working
+        dtype of ar
 
     Returns
     -------
     np.ndarray
+        in the working dtype of ar
 
     """
-    return ar - moving_average(ar, order)
+    if out is not None and np.shares_memory(out, ar):
+        msg = "out must not overlap ar"
+        raise ValueError(msg)
+    average = moving_average(ar, order, out=out)
+    return np.subtract(ar, average, out=average)
 
 
 if __name__ == "__main__":
+    import pyqtgraph as pg
+
+    from plotting import lod_plot
+
     # data = generate_noise(1000)
     sample_rate_s = 0.0001
     pw_s = 0.002
@@ -318,11 +747,9 @@ if __name__ == "__main__":
     win.resize(2000, 2000)
     win.setWindowTitle("PRI estimator")
 
-    p1 = win.addPlot(title="data", y=data, x=times)
-    p1.setMouseEnabled(x=True, y=False)
+    p1 = lod_plot(win, data, times, title="data")
     win.nextRow()
-    p2 = win.addPlot(title="detector", y=detects, x=times)
-    p2.setMouseEnabled(x=True, y=False)
+    p2 = lod_plot(win, detects, times, title="detector")
     win.nextRow()
     p2 = win.addPlot(title="PRI vs nom", y=norms, x=pris)
     p2.setMouseEnabled(x=True, y=False)
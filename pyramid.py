@@ -0,0 +1,551 @@
+"""Multi-resolution min/max summaries of long captures.
+
+Level k of a pyramid holds the min and max of consecutive blocks of
+factor**k samples, so any range can be drawn from about two values per
+screen pixel whatever its length. Levels can be saved as .npy files and
+memory-mapped back, so captures larger than memory stay usable.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from kernels import box_sum
+
+CHUNK_SIZE = 2**22
+
+
+def _check_factor(factor: int) -> None:
+    if factor < 2:
+        msg = f"factor must be at least 2, got {factor}"
+        raise ValueError(msg)
+
+
+def _reduce_blocks(data: np.ndarray, factor: int, ufunc: np.ufunc) -> np.ndarray:
+    """Reduce consecutive blocks of factor samples, the last may be short.
+
+    Works through the data in chunks so memory-mapped input is never loaded
+    whole.
+    """
+    chunk = CHUNK_SIZE - CHUNK_SIZE % factor
+    out = np.empty(-(-len(data) // factor), dtype=data.dtype)
+    for start in range(0, len(data), chunk):
+        block = np.asarray(data[start : start + chunk])
+        first = start // factor
+        out[first : first + -(-len(block) // factor)] = ufunc.reduceat(
+            block,
+            np.arange(0, len(block), factor),
+        )
+    return out
+
+
+class MinMaxPyramid:
+    """Block min and max of a 1d array at block sizes factor, factor**2, ..."""
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        mins: list[np.ndarray],
+        maxs: list[np.ndarray],
+        factor: int = 4,
+    ) -> None:
+        self.data = data
+        self.mins = mins
+        self.maxs = maxs
+        self.factor = factor
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def num_levels(self) -> int:
+        return len(self.mins)
+
+    def block_size(self, level: int) -> int:
+        return self.factor**level
+
+    @classmethod
+    def build(cls, data: np.ndarray, factor: int = 4) -> MinMaxPyramid:
+        """Build every level of the pyramid.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            samples, may be a memmap
+        factor : int, optional
+            ratio of block sizes between levels, at least 2, by default 4
+
+        Returns
+        -------
+        MinMaxPyramid
+
+        Raises
+        ------
+        ValueError
+            if factor is less than 2, the levels would never shrink
+
+        """
+        _check_factor(factor)
+        mins = []
+        maxs = []
+        level_min = level_max = data
+        while len(level_min) > 1:
+            level_min = _reduce_blocks(level_min, factor, np.minimum)
+            level_max = _reduce_blocks(level_max, factor, np.maximum)
+            mins.append(level_min)
+            maxs.append(level_max)
+        return cls(data, mins, maxs, factor)
+
+    def save(self, path: str | Path) -> None:
+        """Save the levels as .npy files in a directory.
+
+        Parameters
+        ----------
+        path : str | Path
+
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for level, (level_min, level_max) in enumerate(zip(self.mins, self.maxs), 1):
+            np.save(path / f"min_{level}.npy", level_min)
+            np.save(path / f"max_{level}.npy", level_max)
+        (path / "pyramid.json").write_text(
+            json.dumps(
+                {
+                    "factor": self.factor,
+                    "length": len(self.data),
+                    "num_levels": self.num_levels,
+                },
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path, data: np.ndarray) -> MinMaxPyramid:
+        """Memory-map a saved pyramid.
+
+        Parameters
+        ----------
+        path : str | Path
+            directory written by save
+        data : np.ndarray
+            the samples the pyramid was built from
+
+        Returns
+        -------
+        MinMaxPyramid
+
+        """
+        path = Path(path)
+        meta = json.loads((path / "pyramid.json").read_text())
+        if meta["length"] != len(data):
+            msg = f"pyramid is for {meta['length']} samples, data has {len(data)}"
+            raise ValueError(msg)
+        levels = range(1, meta["num_levels"] + 1)
+        return cls(
+            data,
+            [np.load(path / f"min_{_}.npy", mmap_mode="r") for _ in levels],
+            [np.load(path / f"max_{_}.npy", mmap_mode="r") for _ in levels],
+            meta["factor"],
+        )
+
+    def level_for(self, num_samples: int, num_points: int) -> int:
+        """Coarsest level with at least num_points blocks in num_samples.
+
+        Parameters
+        ----------
+        num_samples : int
+        num_points : int
+
+        Returns
+        -------
+        int
+            0 means the raw samples
+
+        """
+        level = 0
+        while (
+            level < self.num_levels
+            and self.block_size(level + 1) * max(num_points, 1) <= num_samples
+        ):
+            level += 1
+        return level
+
+    def query(
+        self,
+        start: int,
+        stop: int,
+        num_points: int = 1000,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Envelope of data[start:stop] at about num_points resolution.
+
+        Parameters
+        ----------
+        start : int
+        stop : int
+        num_points : int, optional
+            number of blocks wanted, usually the width in pixels,
+            by default 1000
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            sample indices and values. Decimated levels give the min then
+            the max of each block at the block start.
+
+        """
+        start = max(int(start), 0)
+        stop = min(int(stop), len(self.data))
+        if stop <= start:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=self.data.dtype))
+
+        level = self.level_for(stop - start, num_points)
+        if level == 0:
+            return (np.arange(start, stop), np.asarray(self.data[start:stop]))
+
+        block = self.block_size(level)
+        first = start // block
+        last = -(-stop // block)
+        indices = np.repeat(np.arange(first, last) * block, 2)
+        values = np.empty(2 * (last - first), dtype=self.mins[level - 1].dtype)
+        values[0::2] = self.mins[level - 1][first:last]
+        values[1::2] = self.maxs[level - 1][first:last]
+        return (indices, values)
+
+
+class _Growable:
+    """Append-only array with amortised doubling."""
+
+    def __init__(self, dtype: np.dtype, data: np.ndarray | None = None) -> None:
+        self._buffer = np.empty(0, dtype=dtype) if data is None else data
+        self._size = len(self._buffer)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._buffer[: self._size]
+
+    def extend(self, values: np.ndarray) -> None:
+        end = self._size + len(values)
+        if end > len(self._buffer) or not self._buffer.flags.writeable:
+            buffer = np.empty(
+                max(end, 2 * len(self._buffer), 16),
+                dtype=self._buffer.dtype,
+            )
+            buffer[: self._size] = self._buffer[: self._size]
+            self._buffer = buffer
+        self._buffer[self._size : end] = values
+        self._size = end
+
+
+STATS = ("min", "max", "sum", "energy")
+
+
+class SignalIndex:
+    """Persistent multi-resolution index of a streamed capture.
+
+    Level k, k >= 1, holds the min, max, sum and energy (sum of squares) of
+    every complete block of factor**k samples. Samples are appended as they
+    arrive and only the new blocks are summarised. Range statistics and
+    threshold searches walk the levels, so they touch O(factor log N) blocks
+    plus the regions that actually cross the threshold.
+    """
+
+    def __init__(self, factor: int = 16, dtype: np.dtype = np.float64) -> None:
+        _check_factor(factor)
+        self.factor = factor
+        self._data = _Growable(np.dtype(dtype))
+        self._levels: list[dict[str, _Growable]] = []
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._data.view
+
+    @property
+    def num_levels(self) -> int:
+        return len(self._levels)
+
+    def level(self, level: int) -> dict[str, np.ndarray]:
+        """Block statistics of one level, level 1 has blocks of factor samples."""
+        return {stat: values.view for stat, values in self._levels[level - 1].items()}
+
+    def append(self, samples: np.ndarray) -> None:
+        """Add samples to the end of the capture.
+
+        Parameters
+        ----------
+        samples : np.ndarray
+
+        """
+        samples = np.asarray(samples)
+        if len(samples) == 0:
+            return
+        self._data.extend(samples)
+
+        lower = {"min": self.data, "max": self.data, "sum": self.data, "energy": None}
+        level = 0
+        while True:
+            count = len(lower["min"]) // self.factor
+            if count == 0:
+                break
+            if level == self.num_levels:
+                self._levels.append(
+                    {stat: _Growable(self._stat_dtype(stat)) for stat in STATS},
+                )
+            current = self._levels[level]
+            done = len(current["min"])
+            if done == count:
+                break
+
+            span = slice(done * self.factor, count * self.factor)
+            shape = (count - done, self.factor)
+            blocks = {
+                stat: lower[stat][span].reshape(shape) for stat in ("min", "max", "sum")
+            }
+            if lower["energy"] is None:
+                energy = np.sum(np.square(blocks["sum"], dtype=np.float64), axis=1)
+            else:
+                energy = np.sum(lower["energy"][span].reshape(shape), axis=1)
+            current["min"].extend(np.min(blocks["min"], axis=1))
+            current["max"].extend(np.max(blocks["max"], axis=1))
+            current["sum"].extend(np.sum(blocks["sum"], axis=1, dtype=np.float64))
+            current["energy"].extend(energy)
+
+            lower = {stat: values.view for stat, values in current.items()}
+            level += 1
+
+    def _stat_dtype(self, stat: str) -> np.dtype:
+        return self._data.view.dtype if stat in ("min", "max") else np.dtype(np.float64)
+
+    def _pieces(self, start: int, stop: int):
+        """Split [start, stop) into runs of whole blocks, coarsest first."""
+        level = 0
+        unit = 1
+        while start < stop:
+            upper = unit * self.factor
+            if level == self.num_levels:
+                yield (level, start // unit, stop // unit)
+                return
+            left = min(-(-start // upper) * upper, stop)
+            right = max(stop // upper * upper, left)
+            if start < left:
+                yield (level, start // unit, left // unit)
+            if right < stop:
+                yield (level, right // unit, stop // unit)
+            (start, stop) = (left, right)
+            level += 1
+            unit = upper
+
+    def range_stats(self, start: int = 0, stop: int | None = None) -> dict[str, float]:
+        """Min, max, sum and energy of data[start:stop].
+
+        Parameters
+        ----------
+        start : int, optional
+        stop : int | None, optional
+            by default the end of the capture
+
+        Returns
+        -------
+        dict[str, float]
+
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        result = {"min": np.inf, "max": -np.inf, "sum": 0.0, "energy": 0.0}
+        for level, first, last in self._pieces(max(start, 0), stop):
+            if level == 0:
+                block = self.data[first:last]
+                stats = {
+                    "min": np.min(block),
+                    "max": np.max(block),
+                    "sum": np.sum(block, dtype=np.float64),
+                    "energy": np.sum(np.square(block, dtype=np.float64)),
+                }
+            else:
+                values = self.level(level)
+                stats = {
+                    "min": np.min(values["min"][first:last]),
+                    "max": np.max(values["max"][first:last]),
+                    "sum": np.sum(values["sum"][first:last]),
+                    "energy": np.sum(values["energy"][first:last]),
+                }
+            result["min"] = min(result["min"], float(stats["min"]))
+            result["max"] = max(result["max"], float(stats["max"]))
+            result["sum"] += float(stats["sum"])
+            result["energy"] += float(stats["energy"])
+        return result
+
+    def above(
+        self,
+        threshold: float,
+        start: int = 0,
+        stop: int | None = None,
+        absolute: bool = False,
+    ) -> np.ndarray:
+        """Indices of samples at or above threshold.
+
+        Descends from the coarsest level into blocks whose max reaches the
+        threshold only, so blocks entirely below it are never read.
+
+        Parameters
+        ----------
+        threshold : float
+        start : int, optional
+        stop : int | None, optional
+            by default the end of the capture
+        absolute : bool, optional
+            compare the magnitude of the samples, by default False
+
+        Returns
+        -------
+        np.ndarray
+            sorted sample indices
+
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(start, 0)
+        if stop <= start:
+            return np.empty(0, dtype=np.int64)
+
+        def hits(peak: np.ndarray, low: np.ndarray | None) -> np.ndarray:
+            if absolute and low is not None:
+                return (peak >= threshold) | (-low >= threshold)
+            return peak >= threshold
+
+        candidates = np.empty(0, dtype=np.int64)
+        covered = 0
+        for level in range(self.num_levels, 0, -1):
+            unit = self.factor**level
+            values = self.level(level)
+            # children of the candidates plus the blocks past the parent level
+            children = (
+                candidates[:, np.newaxis] * self.factor + np.arange(self.factor)
+            ).ravel()
+            tail = np.arange(covered // unit, len(values["max"]))
+            blocks = np.concatenate([children, tail])
+            blocks = blocks[(blocks * unit < stop) & ((blocks + 1) * unit > start)]
+            candidates = blocks[hits(values["max"][blocks], values["min"][blocks])]
+            covered = len(values["max"]) * unit
+
+        children = (
+            candidates[:, np.newaxis] * self.factor + np.arange(self.factor)
+        ).ravel()
+        samples = np.concatenate([children, np.arange(covered, len(self))])
+        samples = samples[(samples >= start) & (samples < stop)]
+        values = self.data[samples]
+        return samples[np.abs(values) >= threshold if absolute else values >= threshold]
+
+    def regions(
+        self,
+        threshold: float,
+        start: int = 0,
+        stop: int | None = None,
+        absolute: bool = False,
+    ) -> np.ndarray:
+        """Runs of samples at or above threshold.
+
+        Returns
+        -------
+        np.ndarray
+            (n, 2) array of [start, stop) sample ranges
+
+        """
+        return _runs(self.above(threshold, start, stop, absolute))
+
+    def detect(
+        self,
+        sample_rate_s: float,
+        pw_s: float,
+        threshold: float = 400,
+    ) -> np.ndarray:
+        """Sample indices where detector would fire, without a full rescan.
+
+        A window sum can only reach a positive threshold if one of its
+        samples reaches threshold / width, so the boxcar filter is only run
+        around those samples.
+
+        Parameters
+        ----------
+        sample_rate_s : float
+        pw_s : float
+        threshold : float, optional
+            by default 400, the level detector uses
+
+        Returns
+        -------
+        np.ndarray
+            indices of detections
+
+        """
+        width = int(pw_s / sample_rate_s) + 1
+        if threshold <= 0:
+            regions = np.array([[0, len(self)]])
+        else:
+            regions = _runs(self.above(threshold / width), gap=width)
+
+        detections = []
+        for first, last in regions:
+            lead = max(first - (width - 1), 0)
+            stop = min(last + width - 1, len(self))
+            sums = box_sum(self.data[lead:stop], width)
+            found = np.flatnonzero(sums[first - lead :] >= threshold) + first
+            detections.append(found)
+        if not detections:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(detections))
+
+    def save(self, path: str | Path) -> None:
+        """Save the samples and levels as .npy files in a directory."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "data.npy", self.data)
+        for level in range(1, self.num_levels + 1):
+            for stat, values in self.level(level).items():
+                np.save(path / f"{stat}_{level}.npy", values)
+        (path / "index.json").write_text(
+            json.dumps({"factor": self.factor, "num_levels": self.num_levels}),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path, mmap_mode: str | None = "r") -> SignalIndex:
+        """Load a saved index, memory-mapped by default.
+
+        The loaded index can still be appended to, the first append copies
+        the memory-mapped arrays into memory.
+        """
+        path = Path(path)
+        meta = json.loads((path / "index.json").read_text())
+        data = np.load(path / "data.npy", mmap_mode=mmap_mode)
+        index = cls(meta["factor"], data.dtype)
+        index._data = _Growable(data.dtype, data)
+        index._levels = [
+            {
+                stat: _Growable(
+                    index._stat_dtype(stat),
+                    np.load(path / f"{stat}_{level}.npy", mmap_mode=mmap_mode),
+                )
+                for stat in STATS
+            }
+            for level in range(1, meta["num_levels"] + 1)
+        ]
+        return index
+
+
+def _runs(indices: np.ndarray, gap: int = 1) -> np.ndarray:
+    """Merge sorted indices into [start, stop) runs.
+
+    Indices closer than gap are joined into the same run.
+    """
+    if len(indices) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(indices) > gap)
+    starts = np.concatenate([indices[:1], indices[breaks + 1]])
+    stops = np.concatenate([indices[breaks], indices[-1:]]) + 1
+    return np.column_stack([starts, stops])
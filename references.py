@@ -0,0 +1,219 @@
+"""Persistent reference histograms keyed by emitter or burst.
+
+All histograms live in three flat arrays on disk, edges, counts and offsets
+into them, plus a JSON list of keys. Loading memory-maps the arrays, so
+opening a registry of thousands of emitters reads only the keys, and a
+histogram is two slices of the maps. Drift checks run the binned tests of
+analysis.py against new histograms without any raw reference data.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Hashable, Iterator
+
+import numpy as np
+import polars as pl
+
+from analysis import (
+    ADTestResult,
+    HistogramResults,
+    KSTestResult,
+    ad_test_hists,
+    ks_test_hists,
+)
+
+TESTS = {"ks": ks_test_hists, "ad": ad_test_hists}
+
+
+class ReferenceRegistry:
+    """Reference histograms by key.
+
+    Keys are stored as strings, registry[5] and registry["5"] are the same
+    entry. Histograms set or updated since the last save are held in memory
+    until save writes them out.
+    """
+
+    def __init__(self) -> None:
+        self.path: Path | None = None
+        self._index: dict[str, int] = {}
+        self._edges = np.empty(0)
+        self._counts = np.empty(0)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._pending: dict[str, HistogramResults] = {}
+
+    def __len__(self) -> int:
+        return len(self._index.keys() | self._pending.keys())
+
+    def __contains__(self, key: Hashable) -> bool:
+        key = str(key)
+        return key in self._pending or key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._index
+        yield from (_ for _ in self._pending if _ not in self._index)
+
+    def keys(self) -> list[str]:
+        return list(self)
+
+    def __getitem__(self, key: Hashable) -> HistogramResults:
+        key = str(key)
+        if key in self._pending:
+            return self._pending[key]
+        pos = self._index[key]
+        (lo, hi) = self._offsets[pos : pos + 2]
+        return HistogramResults(
+            bins=self._edges[lo + pos : hi + pos + 1],
+            counts=self._counts[lo:hi],
+        )
+
+    def __setitem__(self, key: Hashable, hist: HistogramResults) -> None:
+        counts = np.asarray(hist.counts, dtype=float)
+        bins = np.asarray(hist.bins, dtype=float)
+        if len(bins) != len(counts) + 1:
+            msg = "a histogram needs one more bin edge than counts"
+            raise ValueError(msg)
+        self._pending[str(key)] = HistogramResults(bins.copy(), counts.copy())
+
+    def update(self, key: Hashable, new_data: np.ndarray) -> HistogramResults:
+        """Add observations to the reference of key.
+
+        Parameters
+        ----------
+        key : Hashable
+        new_data : np.ndarray
+            values outside the reference bins are dropped
+
+        Returns
+        -------
+        HistogramResults
+            the updated reference
+
+        """
+        hist = self[key]
+        (new_counts, _) = np.histogram(new_data, bins=hist.bins)
+        self[key] = HistogramResults(hist.bins, hist.counts + new_counts)
+        return self[key]
+
+    def test(
+        self,
+        key: Hashable,
+        hist: HistogramResults,
+        method: str = "ks",
+    ) -> KSTestResult | ADTestResult:
+        """Two sample test of hist against the reference of key.
+
+        Parameters
+        ----------
+        key : Hashable
+        hist : HistogramResults
+        method : str, optional
+            "ks" or "ad", by default "ks"
+
+        Returns
+        -------
+        KSTestResult | ADTestResult
+
+        """
+        if method not in TESTS:
+            msg = f"unknown test {method!r}, expected one of {list(TESTS)}"
+            raise ValueError(msg)
+        return TESTS[method](self[key], hist)
+
+    def drift(
+        self,
+        hists: dict[Hashable, HistogramResults],
+        confidence: float = 0.05,
+        method: str = "ks",
+    ) -> pl.DataFrame:
+        """Test new histograms against their references.
+
+        Parameters
+        ----------
+        hists : dict[Hashable, HistogramResults]
+            new histogram by key, keys without a reference are skipped
+        confidence : float, optional
+            by default 0.05
+        method : str, optional
+            "ks" or "ad", by default "ks"
+
+        Returns
+        -------
+        pl.DataFrame
+            key, statistic, pvalue and drift, true where pvalue is at most
+            confidence
+
+        """
+        rows = [
+            (str(key), self.test(key, hist, method))
+            for key, hist in hists.items()
+            if key in self
+        ]
+        return pl.DataFrame(
+            {
+                "key": [_[0] for _ in rows],
+                "statistic": [_[1].statistic for _ in rows],
+                "pvalue": [_[1].pvalue for _ in rows],
+            },
+            schema={"key": pl.String, "statistic": pl.Float64, "pvalue": pl.Float64},
+        ).with_columns(drift=pl.col("pvalue") <= confidence)
+
+    def save(self, path: str | Path | None = None) -> None:
+        """Write every histogram to a directory and memory-map it.
+
+        Files are written next to the old ones and renamed over them, so
+        saving to the directory the registry was loaded from is safe.
+
+        Parameters
+        ----------
+        path : str | Path | None, optional
+            by default the directory the registry was loaded from
+
+        """
+        path = Path(path or self.path)
+        path.mkdir(parents=True, exist_ok=True)
+        keys = self.keys()
+        hists = [self[_] for _ in keys]
+        arrays = {
+            "edges": np.concatenate([np.empty(0)] + [_.bins for _ in hists]),
+            "counts": np.concatenate([np.empty(0)] + [_.counts for _ in hists]),
+            "offsets": np.cumsum([0] + [len(_.counts) for _ in hists], dtype=np.int64),
+        }
+        for name, values in arrays.items():
+            with open(path / f"{name}.tmp.npy", "wb") as fp:
+                np.save(fp, values)
+            os.replace(path / f"{name}.tmp.npy", path / f"{name}.npy")
+        (path / "keys.tmp.json").write_text(json.dumps(keys))
+        os.replace(path / "keys.tmp.json", path / "keys.json")
+
+        loaded = self.load(path)
+        self.__dict__.update(loaded.__dict__)
+
+    @classmethod
+    def load(cls, path: str | Path, mmap_mode: str | None = "r") -> ReferenceRegistry:
+        """Open a saved registry, memory-mapped by default.
+
+        Parameters
+        ----------
+        path : str | Path
+            directory written by save
+        mmap_mode : str | None, optional
+            by default "r"
+
+        Returns
+        -------
+        ReferenceRegistry
+
+        """
+        path = Path(path)
+        registry = cls()
+        registry.path = path
+        keys = json.loads((path / "keys.json").read_text())
+        registry._index = {key: pos for pos, key in enumerate(keys)}
+        for name in ["edges", "counts", "offsets"]:
+            setattr(
+                registry, f"_{name}", np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+            )
+        return registry
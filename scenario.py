@@ -0,0 +1,340 @@
+"""PDW domain scenario simulator.
+
+Pulses are generated straight from emitter descriptions, without sample
+synthesis and detection, so ground truth for millions of pulses takes
+seconds. Time is cut into chunks and the pulses of every emitter in a chunk
+are computed at once from their pulse numbers. Random draws come from a hash
+of the seed, emitter and pulse number rather than a stateful generator, so a
+pulse is the same whatever the chunking and chunks can be made in any order.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Sequence
+
+import numpy as np
+import polars as pl
+
+from pulse_simulator import Pdw
+
+# streams of random draws per emitter
+(_JITTER, _MISS, _HOP, _TOA_NOISE, _RF_NOISE, _PHASE) = range(6)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer, uint64 arithmetic wraps
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+@lru_cache(maxsize=2**16)
+def _key(seed: int, emitter: int, stream: int) -> np.uint64:
+    return np.random.SeedSequence([seed, emitter, stream]).generate_state(1, np.uint64)[
+        0
+    ]
+
+
+def _uniform(seed: int, emitter: int, stream: int, index: np.ndarray) -> np.ndarray:
+    """Uniform [0, 1) draw for every index, a pure function of its arguments."""
+    key = _key(seed, emitter, stream)
+    index = np.asarray(index).astype(np.uint64)
+    x = _mix(key + (index + np.uint64(1)) * np.uint64(0x9E3779B97F4A7C15))
+    return (x >> np.uint64(11)) * 2.0**-53
+
+
+def _normal(seed: int, emitter: int, stream: int, index: np.ndarray) -> np.ndarray:
+    # Box-Muller on two draws per index
+    index = np.asarray(index, dtype=np.int64)
+    u1 = 1 - _uniform(seed, emitter, stream, 2 * index)
+    u2 = _uniform(seed, emitter, stream, 2 * index + 1)
+    return np.sqrt(-2 * np.log(u1)) * np.cos(2 * np.pi * u2)
+
+
+@dataclass
+class Emitter:
+    """One emitter of a scenario.
+
+    Parameters
+    ----------
+    pri : float | Sequence[float]
+        PRI in seconds, or the cycle of a staggered PRI
+    rf : float | Sequence[float]
+        RF, or the frequencies an agile emitter hops between at random
+    pw : float
+        pulse width in seconds
+    pa : float, optional
+        amplitude at the peak of the beam, by default 1
+    jitter : float, optional
+        uniform jitter of each TOA as a fraction of the mean PRI, by default 0
+    scan_period : float | None, optional
+        circular scan period in seconds, by default no scan
+    beam_width : float, optional
+        half power beam width as a fraction of the scan period, by default 0.05
+    p_miss : float, optional
+        probability each pulse is missed, by default 0
+    start : float | None, optional
+        time of the first pulse, by default random within the first PRI cycle
+    """
+
+    pri: float | Sequence[float]
+    rf: float | Sequence[float]
+    pw: float
+    pa: float = 1.0
+    jitter: float = 0.0
+    scan_period: float | None = None
+    beam_width: float = 0.05
+    p_miss: float = 0.0
+    start: float | None = None
+
+    @property
+    def pris(self) -> np.ndarray:
+        return np.atleast_1d(np.asarray(self.pri, dtype=float))
+
+    @property
+    def mean_pri(self) -> float:
+        return float(np.mean(self.pris))
+
+
+@dataclass
+class Scenario:
+    """Emitters over a time span with receiver measurement noise.
+
+    Parameters
+    ----------
+    emitters : list[Emitter]
+    duration : float
+        seconds
+    seed : int, optional
+        by default 0
+    sensitivity : float, optional
+        pulses weaker than this are not received, by default 0
+    toa_noise : float, optional
+        standard deviation of TOA measurements, by default 0
+    rf_noise : float, optional
+        standard deviation of RF measurements, by default 0
+    """
+
+    emitters: list[Emitter] = field(default_factory=list)
+    duration: float = 1.0
+    seed: int = 0
+    sensitivity: float = 0.0
+    toa_noise: float = 0.0
+    rf_noise: float = 0.0
+
+    @property
+    def pulse_rate(self) -> float:
+        """Pulses per second before misses."""
+        return sum(1 / _.mean_pri for _ in self.emitters)
+
+    def pulses(self, start: float, stop: float) -> pl.DataFrame:
+        """Received pulses with TOAs in [start, stop).
+
+        Parameters
+        ----------
+        start : float
+        stop : float
+
+        Returns
+        -------
+        pl.DataFrame
+            toa, pw, rf and pa as from pdw_frame, with the emitter and pulse
+            number of each pulse, sorted by toa
+
+        """
+        start = max(start, 0.0)
+        stop = min(stop, self.duration)
+        columns = {
+            "toa": [np.empty(0)],
+            "pw": [np.empty(0)],
+            "rf": [np.empty(0)],
+            "pa": [np.empty(0)],
+            "emitter": [np.empty(0, dtype=np.int32)],
+            "pulse": [np.empty(0, dtype=np.int64)],
+        }
+        for pos, emitter in enumerate(self.emitters):
+            for name, values in self._emitter_pulses(pos, emitter, start, stop).items():
+                columns[name].append(values)
+        return pl.DataFrame(
+            {name: np.concatenate(parts) for name, parts in columns.items()},
+        ).sort("toa")
+
+    def chunks(self, chunk_pulses: int = 10**6) -> Iterator[pl.DataFrame]:
+        """Pulses of the whole scenario in time order, in chunks.
+
+        Parameters
+        ----------
+        chunk_pulses : int, optional
+            pulses per chunk on average, by default 10**6
+
+        Yields
+        ------
+        Iterator[pl.DataFrame]
+            pulses as from pulses
+
+        """
+        chunk_s = chunk_pulses / max(self.pulse_rate, 1 / self.duration)
+        # neighbouring chunks share their edge exactly, so a pulse on it is
+        # in exactly one of them
+        edges = np.append(np.arange(0, self.duration, chunk_s), self.duration)
+        for start, stop in zip(edges[:-1], edges[1:]):
+            yield self.pulses(start, stop)
+
+    def frame(self) -> pl.DataFrame:
+        return self.pulses(0, self.duration)
+
+    def write_parquet(self, path: str | Path, chunk_pulses: int = 10**6) -> list[Path]:
+        """Write the scenario as one Parquet file per chunk.
+
+        Read it back with pl.scan_parquet(path / "*.parquet").
+
+        Parameters
+        ----------
+        path : str | Path
+            directory
+        chunk_pulses : int, optional
+            pulses per file on average, by default 10**6
+
+        Returns
+        -------
+        list[Path]
+            files in time order
+
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        files = []
+        for pos, chunk in enumerate(self.chunks(chunk_pulses)):
+            files.append(path / f"part-{pos:05d}.parquet")
+            chunk.write_parquet(files[-1])
+        return files
+
+    def _emitter_pulses(
+        self,
+        pos: int,
+        emitter: Emitter,
+        start: float,
+        stop: float,
+    ) -> dict[str, np.ndarray]:
+        pris = emitter.pris
+        cycle = np.sum(pris)
+        offsets = np.concatenate([[0.0], np.cumsum(pris)[:-1]])
+        first = emitter.start
+        if first is None:
+            first = cycle * _uniform(self.seed, pos, _PHASE, np.zeros(1))[0]
+
+        # pulse numbers whose nominal TOA can be jittered into the window, one
+        # more on each side for rounding, the TOAs themselves decide below
+        spread = emitter.jitter * emitter.mean_pri + 8 * self.toa_noise
+        (lo, hi) = (
+            _pulse_number(t - first, cycle, offsets)
+            for t in [start - spread, stop + spread]
+        )
+        pulse = np.arange(max(lo - 1, 0), max(hi + 1, 0))
+        toa = first + (pulse // len(pris)) * cycle + offsets[pulse % len(pris)]
+        if emitter.jitter:
+            toa += (
+                emitter.jitter
+                * emitter.mean_pri
+                * (2 * _uniform(self.seed, pos, _JITTER, pulse) - 1)
+            )
+        if self.toa_noise:
+            toa += self.toa_noise * _normal(self.seed, pos, _TOA_NOISE, pulse)
+
+        rfs = np.atleast_1d(np.asarray(emitter.rf, dtype=float))
+        if len(rfs) > 1:
+            rf = rfs[(_uniform(self.seed, pos, _HOP, pulse) * len(rfs)).astype(int)]
+        else:
+            rf = np.full(len(pulse), rfs[0])
+        if self.rf_noise:
+            rf = rf + self.rf_noise * _normal(self.seed, pos, _RF_NOISE, pulse)
+
+        pa = np.full(len(pulse), float(emitter.pa))
+        if emitter.scan_period:
+            # gaussian main beam, pointing at the receiver mid scan
+            phase = np.mod(toa / emitter.scan_period, 1) - 0.5
+            pa *= np.exp(-4 * np.log(2) * (phase / emitter.beam_width) ** 2)
+
+        keep = (toa >= start) & (toa < stop) & (pa >= self.sensitivity)
+        if emitter.p_miss:
+            keep &= _uniform(self.seed, pos, _MISS, pulse) >= emitter.p_miss
+        num = np.count_nonzero(keep)
+        return {
+            "toa": toa[keep],
+            "pw": np.full(num, float(emitter.pw)),
+            "rf": rf[keep],
+            "pa": pa[keep],
+            "emitter": np.full(num, pos, dtype=np.int32),
+            "pulse": pulse[keep],
+        }
+
+
+def _pulse_number(t: float, cycle: float, offsets: np.ndarray) -> int:
+    """Number of the first pulse with nominal TOA at or after t."""
+    num_cycles = np.floor(t / cycle)
+    within = np.searchsorted(offsets, t - num_cycles * cycle, side="left")
+    return int(num_cycles) * len(offsets) + int(within)
+
+
+def to_pdw(df: pl.DataFrame) -> Pdw:
+    """Pdw of a pulse frame, the inverse of tdoa.pdw_frame."""
+    return Pdw(
+        toa_s=df["toa"].to_numpy(),
+        pw_s=df["pw"].to_numpy(),
+        rf_s=df["rf"].to_numpy(),
+        pa=df["pa"].to_numpy(),
+    )
+
+
+def random_scenario(
+    num_emitters: int,
+    duration: float,
+    seed: int = 0,
+    pri_range: tuple[float, float] = (1e-4, 1e-2),
+    rf_range: tuple[float, float] = (1e3, 1e4),
+    **kwargs,
+) -> Scenario:
+    """Scenario of emitters with random parameters.
+
+    PRIs are log uniform, a quarter of the emitters are staggered, a quarter
+    RF agile and half scan.
+
+    Parameters
+    ----------
+    num_emitters : int
+    duration : float
+    seed : int, optional
+        by default 0
+    pri_range : tuple[float, float], optional
+        by default (1e-4, 1e-2)
+    rf_range : tuple[float, float], optional
+        by default (1e3, 1e4)
+    kwargs
+        other Scenario parameters
+
+    Returns
+    -------
+    Scenario
+
+    """
+    rng = np.random.default_rng(seed)
+    emitters = []
+    for _ in range(num_emitters):
+        pri = np.exp(rng.uniform(*np.log(pri_range)))
+        rf = rng.uniform(*rf_range)
+        kind = rng.integers(4)
+        emitters.append(
+            Emitter(
+                pri=pri * np.array([1.0, 1.2, 0.9]) if kind == 0 else pri,
+                rf=rf + np.array([0.0, 20, 40, 60]) if kind == 1 else rf,
+                pw=pri * rng.uniform(0.001, 0.05),
+                pa=rng.uniform(1, 10),
+                jitter=rng.uniform(0, 0.05),
+                scan_period=rng.uniform(1, 10) if rng.random() < 0.5 else None,
+                p_miss=rng.uniform(0, 0.1),
+            ),
+        )
+    return Scenario(emitters, duration, seed, **kwargs)
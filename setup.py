@@ -0,0 +1,13 @@
+from pybind11.setup_helpers import Pybind11Extension, build_ext
+from setuptools import setup
+
+setup(
+    ext_modules=[
+        Pybind11Extension(
+            "_kernels",
+            ["cpp/kernels.cpp"],
+            cxx_std=17,
+        ),
+    ],
+    cmdclass={"build_ext": build_ext},
+)
@@ -1,6 +1,14 @@
 from __future__ import annotations
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+import polars as pl
+
+if TYPE_CHECKING:
+    from pulse_simulator import Pdw
 
 logging.getLogger("__name__")
 
@@ -9,5 +17,268 @@ def fun_1():
     return 5
 
 
+def pdw_frame(pdw: Pdw) -> pl.DataFrame:
+    """Convert a Pdw to a DataFrame using deinterleaver column names.
+
+    Parameters
+    ----------
+    pdw : Pdw
+
+    Returns
+    -------
+    pl.DataFrame
+        columns toa, pw, rf and pa sorted by toa
+
+    """
+    return pl.DataFrame(
+        {
+            "toa": np.asarray(pdw.toa_s, dtype=float),
+            "pw": np.asarray(pdw.pw_s, dtype=float),
+            "rf": np.asarray(pdw.rf_s, dtype=float),
+            "pa": np.asarray(pdw.pa, dtype=float),
+        },
+    ).sort("toa")
+
+
+def _as_frame(pdws: Pdw | pl.DataFrame) -> pl.DataFrame:
+    if isinstance(pdws, pl.DataFrame):
+        return pdws
+    return pdw_frame(pdws)
+
+
+def match_toas(
+    ref: pl.DataFrame,
+    other: pl.DataFrame,
+    max_baseline_s: float,
+    rf_tol: float | None = None,
+    pw_tol: float | None = None,
+    time_col: str = "toa",
+) -> pl.DataFrame:
+    """Match pulses seen by two sensors.
+
+    Every pulse of the other sensor within the maximum baseline delay of a
+    reference pulse is a candidate for it, found by searchsorted on the
+    sorted TOAs. Candidates further than rf_tol in RF or pw_tol in PW are
+    rejected, the rest are scored on normalised time, RF and PW distance and
+    paired one to one, best score first, so a pulse whose best candidate is
+    taken falls back to its next one. The cost is O(n log n) plus the number
+    of candidates.
+
+    Parameters
+    ----------
+    ref : pl.DataFrame
+        pulses from the reference sensor
+    other : pl.DataFrame
+        pulses from the second sensor
+    max_baseline_s : float
+        largest possible time difference between the sensors
+    rf_tol : float | None, optional
+        largest RF difference of a match, by default None
+    pw_tol : float | None, optional
+        largest PW difference of a match, by default None
+    time_col : str, optional
+        by default "toa"
+
+    Returns
+    -------
+    pl.DataFrame
+        matched reference pulses with toa_other, tdoa and score, the sum of
+        the normalised time, RF and PW distances of the match, lower is
+        better
+
+    """
+    other_col = f"{time_col}_other"
+    ref = ref.sort(time_col)
+    other = other.sort(time_col)
+    ref_toas = ref[time_col].to_numpy()
+    other_toas = other[time_col].to_numpy()
+
+    # every candidate in [toa - max_baseline_s, toa + max_baseline_s]
+    lo = np.searchsorted(other_toas, ref_toas - max_baseline_s, side="left")
+    hi = np.searchsorted(other_toas, ref_toas + max_baseline_s, side="right")
+    counts = hi - lo
+    ref_idx = np.repeat(np.arange(len(ref_toas)), counts)
+    other_idx = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts - lo, counts
+    )
+
+    score = np.abs(other_toas[other_idx] - ref_toas[ref_idx]) / max_baseline_s
+    keep = np.ones(len(score), dtype=bool)
+    for name, tol in [("rf", rf_tol), ("pw", pw_tol)]:
+        if tol is None or name not in ref.columns or name not in other.columns:
+            continue
+        diff = np.abs(other[name].to_numpy()[other_idx] - ref[name].to_numpy()[ref_idx])
+        score += diff / tol
+        keep &= diff <= tol
+
+    candidates = np.flatnonzero(keep)
+    chosen = candidates[
+        _assign(ref_idx[candidates], other_idx[candidates], score[candidates])
+    ]
+    (ref_idx, other_idx) = (ref_idx[chosen], other_idx[chosen])
+    return ref[ref_idx].with_columns(
+        pl.Series(other_col, other_toas[other_idx]),
+        pl.Series("score", score[chosen]),
+        pl.Series("tdoa", other_toas[other_idx] - ref_toas[ref_idx]),
+    )
+
+
+def _assign(
+    ref_idx: np.ndarray,
+    other_idx: np.ndarray,
+    score: np.ndarray,
+) -> np.ndarray:
+    """Pair candidates one to one, best score first.
+
+    Each round takes every candidate that is the best remaining one of both
+    its pulses, which is the greedy assignment without a loop per candidate.
+
+    Returns
+    -------
+    np.ndarray
+        positions of the chosen candidates, in the order given
+
+    """
+    order = np.argsort(score, kind="stable")
+    chosen = [np.array([], dtype=np.intp)]
+    while len(order):
+        best = np.zeros(len(order), dtype=bool)
+        best[np.unique(ref_idx[order], return_index=True)[1]] = True
+        best_other = np.zeros(len(order), dtype=bool)
+        best_other[np.unique(other_idx[order], return_index=True)[1]] = True
+        take = order[best & best_other]
+        chosen.append(take)
+        order = order[
+            ~np.isin(ref_idx[order], ref_idx[take])
+            & ~np.isin(other_idx[order], other_idx[take])
+        ]
+    return np.sort(np.concatenate(chosen))
+
+
+def compute_tdoas(
+    sensors: dict[str, Pdw | pl.DataFrame],
+    ref_sensor: str,
+    max_baseline_s: float,
+    rf_tol: float | None = None,
+    pw_tol: float | None = None,
+    max_workers: int | None = None,
+) -> pl.DataFrame:
+    """TDOAs between a reference sensor and every other sensor.
+
+    Parameters
+    ----------
+    sensors : dict[str, Pdw | pl.DataFrame]
+        pulses keyed by sensor name
+    ref_sensor : str
+        name of the reference sensor
+    max_baseline_s : float
+        largest possible time difference between two sensors
+    rf_tol : float | None, optional
+        by default None
+    pw_tol : float | None, optional
+        by default None
+    max_workers : int | None, optional
+        threads used to match sensor pairs, by default None
+
+    Returns
+    -------
+    pl.DataFrame
+        columns time, tdoa, sensor1 and sensor2 as consumed by geo_engine
+
+    """
+    ref = _as_frame(sensors[ref_sensor])
+    others = {k: _as_frame(v) for k, v in sensors.items() if k != ref_sensor}
+
+    def pair(name: str) -> pl.DataFrame:
+        return match_toas(ref, others[name], max_baseline_s, rf_tol, pw_tol).select(
+            pl.col("toa").alias("time"),
+            "tdoa",
+            pl.lit(ref_sensor).alias("sensor1"),
+            pl.lit(name).alias("sensor2"),
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pairs = list(pool.map(pair, others))
+
+    if not pairs:
+        return pl.DataFrame(
+            schema={
+                "time": pl.Float64,
+                "tdoa": pl.Float64,
+                "sensor1": pl.String,
+                "sensor2": pl.String,
+            },
+        )
+    return pl.concat(pairs).sort("time", "sensor2")
+
+
+def tdoa_by_burst(
+    bursts: pl.DataFrame,
+    other: Pdw | pl.DataFrame,
+    max_baseline_s: float,
+    rf_tol: float | None = None,
+    pw_tol: float | None = None,
+    burst_col: str = "burst_group",
+    time_col: str = "toa",
+    max_workers: int | None = None,
+) -> pl.DataFrame:
+    """Match each burst from group_by_burst against a second sensor.
+
+    Only the pulses of the second sensor within max_baseline_s of a burst are
+    considered for that burst, so bursts are independent and are matched in
+    parallel. Polars releases the GIL during joins so threads scale.
+
+    Parameters
+    ----------
+    bursts : pl.DataFrame
+        output of group_by_burst for the reference sensor
+    other : Pdw | pl.DataFrame
+        pulses from the second sensor
+    max_baseline_s : float
+    rf_tol : float | None, optional
+        by default None
+    pw_tol : float | None, optional
+        by default None
+    burst_col : str, optional
+        by default "burst_group"
+    time_col : str, optional
+        by default "toa"
+    max_workers : int | None, optional
+        by default None
+
+    Returns
+    -------
+    pl.DataFrame
+        output of match_toas for every burst, sorted by burst and toa
+
+    """
+    other = _as_frame(other).sort(time_col)
+    other_toas = other[time_col].to_numpy()
+
+    def match_burst(group: pl.DataFrame) -> pl.DataFrame:
+        start = np.searchsorted(other_toas, group[time_col].min() - max_baseline_s)
+        stop = np.searchsorted(
+            other_toas,
+            group[time_col].max() + max_baseline_s,
+            side="right",
+        )
+        return match_toas(
+            group,
+            other.slice(start, stop - start),
+            max_baseline_s,
+            rf_tol,
+            pw_tol,
+            time_col,
+        )
+
+    groups = bursts.partition_by(burst_col, maintain_order=True)
+    if not groups:
+        return match_toas(bursts, other, max_baseline_s, rf_tol, pw_tol, time_col)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        matched = list(pool.map(match_burst, groups))
+
+    return pl.concat(matched).sort(burst_col, time_col)
+
+
 if __name__ == "__main__":
     print("hi")
@@ -1,9 +1,24 @@
 import unittest
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from numpy.testing import assert_array_equal
+import polars as pl
+from numpy.testing import assert_allclose, assert_array_equal
+from scipy import stats
 
-from analysis import HistogramResults, compute_histogram, ks_test_data
+from analysis import (
+    HistogramResults,
+    ad_test_hists,
+    burst_histograms,
+    calibrate_ks,
+    calibrate_ks_bins,
+    compute_histogram,
+    grouped_histograms,
+    ks_statistics,
+    ks_test_data,
+    ks_test_hists,
+)
 
 
 class TestAnalysis(unittest.TestCase):
@@ -72,5 +87,195 @@ class TestAnalysis(unittest.TestCase):
         assert_array_equal(hist.counts, np.array([3, 1, 0, 1, 3, 1, 4, 3, 4, 4]))
 
 
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.data = rng.normal(loc=4, size=10000)
+        self.hist = compute_histogram(self.data, 100)
+
+    def test_ks_statistics(self):
+        samples = self.hist.sample((5, 30), rng=np.random.default_rng(seed=42))
+        truth = [stats.ks_1samp(_, self.hist.interp_cdf).statistic for _ in samples]
+        assert_allclose(ks_statistics(samples, self.hist.interp_cdf), truth)
+
+    def test_calibrate(self):
+        cdf = stats.norm(loc=4).cdf
+        res = calibrate_ks(
+            self.hist,
+            num_samples=50,
+            num_trials=250,
+            cdf=cdf,
+            batch_size=60,
+            seed=7,
+            max_workers=1,
+        )
+        assert len(res.statistics) == len(res.reference) == 250
+        # close to the KS distribution of 50 samples
+        assert np.abs(res.threshold(0.05) - stats.kstwo(50).ppf(0.95)) < 0.03
+        assert res.pvalue(res.threshold(0.05)) >= 0.05
+        assert res.pvalue(1) == 0
+
+        with ThreadPoolExecutor(4) as executor:
+            threads = calibrate_ks(
+                self.hist,
+                num_samples=50,
+                num_trials=250,
+                cdf=cdf,
+                batch_size=60,
+                seed=7,
+                executor=executor,
+            )
+        assert_array_equal(threads.statistics, res.statistics)
+        assert_array_equal(threads.reference, res.reference)
+
+        processes = calibrate_ks(
+            self.hist,
+            num_samples=50,
+            num_trials=250,
+            batch_size=60,
+            seed=7,
+            max_workers=2,
+        )
+        assert_array_equal(processes.statistics, res.statistics)
+        assert processes.reference is None
+
+    def test_calibrate_bins(self):
+        res = calibrate_ks_bins(
+            self.data,
+            [5, 50],
+            num_samples=100,
+            num_trials=200,
+            alphas=[0.05],
+            seed=42,
+            max_workers=1,
+        )
+        assert res.columns == ["bins", "mean", "threshold_0.05"]
+        assert res["bins"].to_list() == [5, 50]
+        # coarse bins make the histogram CDF a poor fit
+        assert res["mean"][0] > res["mean"][1]
+
+
+class TestBinnedTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.edges = np.linspace(-5, 5, 41)
+        self.ref = HistogramResults(
+            self.edges,
+            np.histogram(rng.normal(size=2000), self.edges)[0],
+        )
+        self.new = HistogramResults(
+            self.edges,
+            np.histogram(rng.normal(0.1, size=1500), self.edges)[0],
+        )
+        # raw data tied at the bin centers has the same binned statistics
+        self.raw = [
+            np.repeat(self.edges[:-1] + 0.125, _.counts) for _ in [self.ref, self.new]
+        ]
+
+    def test_ks(self):
+        res = ks_test_hists(self.ref, self.new)
+        truth = stats.ks_2samp(*self.raw, method="asymp")
+        assert_allclose(res.statistic, truth.statistic)
+        assert_allclose(res.pvalue, truth.pvalue)
+        assert res.statistic_sign == truth.statistic_sign
+        assert res.pvalue < 0.01
+
+        res = ks_test_hists(self.ref, self.ref)
+        assert res.statistic == 0
+        assert res.pvalue == 1
+
+    def test_ad(self):
+        res = ad_test_hists(self.ref, self.new)
+        with warnings.catch_warnings():
+            # scipy warns that its p value is floored, as is ours
+            warnings.simplefilter("ignore")
+            truth = stats.anderson_ksamp(self.raw, variant="midrank")
+        assert_allclose(res.statistic, truth.statistic)
+        assert_allclose(res.pvalue, truth.pvalue)
+        assert ad_test_hists(self.ref, self.ref).pvalue == 0.25
+
+    def test_different_bins(self):
+        # splitting each bin in two does not change the CDF at the old edges
+        fine = np.linspace(-5, 5, 81)
+        split = HistogramResults(fine, np.repeat(self.new.counts / 2, 2))
+        assert_allclose(
+            ks_test_hists(self.ref, split).statistic,
+            ks_test_hists(self.ref, self.new).statistic,
+        )
+
+        res = ks_test_hists(self.ref, compute_histogram(self.raw[0], 17))
+        assert res.pvalue > 0.05
+
+
+class TestGroupedHistograms(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        sizes = rng.integers(1, 50, size=40)
+        self.labels = np.repeat(np.arange(40) * 3, sizes)
+        self.values = rng.normal(np.repeat(rng.normal(size=40), sizes))
+        # values on bin edges and a group of one repeated value
+        self.values[::7] = np.round(self.values[::7], 1)
+        self.values[self.labels == 6] = 2.0
+        self.df = pl.DataFrame({"burst_group": self.labels, "rf": self.values})
+        self.hists = grouped_histograms(self.df, "rf", bins=7)
+
+    def test_matches_compute_histogram(self):
+        assert_array_equal(self.hists.groups, np.arange(40) * 3)
+        for pos, group in enumerate(self.hists.groups):
+            truth = compute_histogram(self.values[self.labels == group], 7)
+            assert_allclose(self.hists.bins[pos], truth.bins)
+            assert_array_equal(self.hists.counts[pos], truth.counts)
+        # a single value is binned over value +- 0.5
+        assert_array_equal(
+            self.hists.histogram(6).counts,
+            [0, 0, 0, np.sum(self.labels == 6), 0, 0, 0],
+        )
+
+    def test_cdf(self):
+        x = np.random.default_rng(seed=42).normal(size=(40, 6))
+        truth = [self.hists[_].interp_cdf(x[_]) for _ in range(40)]
+        assert_allclose(self.hists.interp_cdf(x), truth)
+        assert_allclose(self.hists.cdf[:, -1], 1)
+
+    def test_sample(self):
+        res = self.hists.sample(50, rng=np.random.default_rng(seed=42))
+        assert res.shape == (40, 50)
+        for pos in range(40):
+            assert np.all(np.isin(res[pos], self.hists[pos].centers))
+            assert np.all(
+                self.hists[pos].counts[
+                    np.searchsorted(self.hists[pos].centers, res[pos])
+                ]
+            )
+
+    def test_ks(self):
+        res = self.hists.ks_test(self.labels, self.values + 0.05)
+        assert res.columns == ["group", "count", "statistic", "pvalue"]
+        for row in res.iter_rows(named=True):
+            hist = self.hists.histogram(row["group"])
+            truth = stats.ks_1samp(
+                self.values[self.labels == row["group"]] + 0.05, hist.interp_cdf
+            )
+            assert_allclose(row["statistic"], truth.statistic)
+            assert_allclose(row["pvalue"], truth.pvalue)
+
+        with self.assertRaises(KeyError):
+            self.hists.ks_test([1], [0.0])
+
+    def test_burst_histograms(self):
+        df = pl.DataFrame(
+            {
+                "toa": [0.0, 1, 2, 3.5, 10, 12, 14],
+                "pw": [1.0, 1, 1, 1, 2, 2, 3],
+                "burst_group": [0, 0, 0, 0, 1, 1, 1],
+            },
+        )
+        res = burst_histograms(df, bins=2)
+        assert list(res) == ["pri", "pw"]
+        assert_array_equal(res["pri"].counts, [[2, 1], [0, 2]])
+        assert_allclose(res["pri"].bins[0], [1, 1.25, 1.5])
+        assert_array_equal(res["pw"].counts, [[0, 4], [2, 1]])
+
+
 if __name__ == "__main__":
     unittest.main()
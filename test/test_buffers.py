@@ -0,0 +1,57 @@
+import threading
+import unittest
+
+import numpy as np
+
+from buffers import BufferPool
+
+
+class TestBufferPool(unittest.TestCase):
+    def test_reuse(self):
+        pool = BufferPool()
+        ar = pool.take(10, np.float32)
+        assert ar.shape == (10,)
+        assert ar.dtype == np.float32
+        pool.give(ar)
+
+        assert pool.take((10,), "float32") is ar
+        assert pool.take(10, np.float64) is not ar
+        assert (pool.num_allocated, pool.num_reused) == (2, 1)
+
+        with pool.borrow((2, 3)) as block:
+            assert block.shape == (2, 3)
+        assert pool.held_bytes == block.nbytes
+
+        pool.clear()
+        assert pool.held_bytes == 0
+
+    def test_views_rejected(self):
+        pool = BufferPool()
+        ar = pool.take(10)
+        with self.assertRaises(ValueError):
+            pool.give(ar[2:])
+
+    def test_max_bytes(self):
+        pool = BufferPool(max_bytes=100)
+        pool.give(pool.take(10), pool.take(10))
+        assert pool.held_bytes == 80
+
+    def test_threads(self):
+        pool = BufferPool()
+
+        def work():
+            for _ in range(200):
+                with pool.borrow(16) as ar:
+                    ar[:] = 1
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert pool.num_allocated <= 4
+        assert pool.num_allocated + pool.num_reused == 800
+
+
+if __name__ == "__main__":
+    unittest.main()
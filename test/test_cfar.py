@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from cfar import StreamingCfar, cfar_detector, cfar_noise, cfar_scale
+from pulse_simulator import detector, extract_pdws, make_signal
+
+
+class TestCfar(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.sample_rate_s = 0.0001
+        self.pw_s = 0.002
+        (self.times, data) = make_signal(0.05, self.sample_rate_s, 40, self.pw_s, snr=5)
+        # noise floor rising five fold over the capture
+        self.data = data + rng.normal(size=len(data)) * np.linspace(1, 5, len(data))
+
+    def test_noise(self):
+        power = np.random.default_rng(seed=42).exponential(size=200)
+        (num_train, num_guard) = (6, 2)
+        for idx in [0, 5, 100, 199]:
+            lead = power[max(idx - 8, 0) : max(idx - 2, 0)]
+            lag = power[idx + 3 : idx + 9]
+            truth = {
+                "ca": np.mean(np.r_[lead, lag]),
+                "go": max(np.mean(_) for _ in [lead, lag] if len(_)),
+                "so": min(np.mean(_) for _ in [lead, lag] if len(_)),
+                "os": np.sort(np.r_[lead, lag])[
+                    int(np.floor(0.75 * (len(lead) + len(lag) - 1) + 0.5))
+                ],
+            }
+            for mode, value in truth.items():
+                res = cfar_noise(power, num_train, num_guard, mode)
+                assert_allclose(res[idx], value)
+
+        with self.assertRaises(ValueError):
+            cfar_noise(power, num_train, num_guard, "max")
+
+    def test_scale(self):
+        rng = np.random.default_rng(seed=42)
+        power = rng.exponential(size=200000)
+        noise = cfar_noise(power, 16, 0)
+        rate = np.mean(power > cfar_scale(32, 1e-3) * noise)
+        assert 0.5e-3 < rate < 2e-3
+
+    def test_detects_under_rising_noise(self):
+        fixed = extract_pdws(
+            self.times,
+            detector(self.data, self.sample_rate_s, self.pw_s),
+            self.data,
+            self.sample_rate_s,
+        )
+        assert len(fixed.toa_s) == 0
+
+        for mode in ["ca", "go", "os"]:
+            detects = cfar_detector(self.data, self.sample_rate_s, self.pw_s, mode=mode)
+            pdw = extract_pdws(self.times, detects, self.data, self.sample_rate_s)
+            found = np.min(
+                np.abs(pdw.toa_s[:, np.newaxis] - 0.05 * np.arange(40)), axis=0
+            )
+            assert np.mean(found < self.pw_s) > 0.8, mode
+
+    def test_stream(self):
+        rng = np.random.default_rng(seed=7)
+        for mode in ["ca", "go", "so", "os"]:
+            detects = cfar_detector(self.data, self.sample_rate_s, self.pw_s, mode=mode)
+            truth = extract_pdws(self.times, detects, self.data, self.sample_rate_s)
+
+            stream = StreamingCfar(self.sample_rate_s, self.pw_s, mode=mode)
+            bounds = np.r_[0, np.cumsum(rng.integers(1, 3000, size=100))]
+            pdws = [
+                stream.push(self.times[lo:hi], self.data[lo:hi])
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+            ]
+            pdws.append(stream.flush())
+
+            for key in ["toa_s", "pw_s", "pa"]:
+                assert_array_equal(
+                    np.concatenate([getattr(_, key) for _ in pdws]),
+                    getattr(truth, key),
+                )
+            assert len(stream.data) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
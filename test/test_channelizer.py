@@ -0,0 +1,127 @@
+import unittest
+
+import numpy as np
+import polars as pl
+from numpy.testing import assert_allclose, assert_array_equal
+
+from channelizer import ChannelDetector, Channelizer, prototype_filter
+
+SAMPLE_RATE_S = 1e-4
+
+
+def tone_pulses(pulses, num_samples, rng, real=False):
+    """Tone pulses of amplitude 100 in unit noise.
+
+    Real tones have amplitude 200, 100 at each of +rf and -rf.
+    """
+    times = np.arange(num_samples) * SAMPLE_RATE_S
+    data = rng.normal(size=num_samples)
+    if not real:
+        data = data + 1j * rng.normal(size=num_samples)
+    for toa, pw, rf in pulses:
+        on = (times >= toa) & (times < toa + pw)
+        if real:
+            data[on] += 200 * np.cos(2 * np.pi * rf * times[on])
+        else:
+            data[on] += 100 * np.exp(2j * np.pi * rf * times[on])
+    return (times, data)
+
+
+def run(channelizer, detector, times, data, splits):
+    frames = []
+    for part in np.array_split(np.arange(len(data)), splits):
+        start = channelizer.offset
+        channels = channelizer(data[part])
+        frames.append(
+            detector.push(times[part][start :: channelizer.decimation], channels)
+        )
+    frames.append(detector.flush())
+    return pl.concat([_ for _ in frames if _ is not None]).sort("toa")
+
+
+class TestChannelizer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.pulses = [
+            (0.2, 0.01, 2550.0),
+            (0.5, 0.01, -3750.0),
+            (1.2, 0.01, 2550.0),
+            (1.5, 0.01, 1250.0),
+        ]
+        (self.times, self.data) = tone_pulses(self.pulses, 20000, rng)
+
+    def test_prototype_filter(self):
+        taps = prototype_filter(8, 4)
+        assert len(taps) == 32
+        assert_allclose(np.sum(taps), 1)
+
+    def test_blocks(self):
+        for oversample in [1, 2]:
+            whole = Channelizer(8, oversample=oversample)(self.data)
+            assert whole.shape == (8, len(self.data) * oversample // 8)
+            assert whole.dtype == np.complex64
+
+            channelizer = Channelizer(8, oversample=oversample)
+            parts = [
+                channelizer(self.data[part])
+                for part in np.array_split(np.arange(len(self.data)), [123, 5000, 5001])
+            ]
+            assert_allclose(np.concatenate(parts, axis=1), whole, atol=1e-3)
+
+        with self.assertRaises(ValueError):
+            Channelizer(9, oversample=2)
+
+    def test_channels(self):
+        # a tone at a channel center comes out of that channel only
+        channelizer = Channelizer(8)
+        freqs = channelizer.channel_freqs(SAMPLE_RATE_S)
+        assert_allclose(freqs[:4], [0, 1250, 2500, 3750])
+        times = np.arange(8000) * SAMPLE_RATE_S
+        outputs = channelizer(np.exp(2j * np.pi * freqs[3] * times))
+        level = np.abs(outputs[:, 100:]).mean(axis=1)
+        assert_allclose(level[3], 1, rtol=1e-3)
+        assert np.max(np.delete(level, 3)) < 1e-3
+        # at baseband
+        assert_allclose(
+            np.angle(outputs[3, 100:]), np.angle(outputs[3, 100]), atol=1e-3
+        )
+
+    def test_detector(self):
+        truth = np.array(self.pulses)
+        for oversample in [1, 2]:
+            channelizer = Channelizer(8, oversample=oversample)
+            detector = ChannelDetector(channelizer, SAMPLE_RATE_S, 0.01, threshold=500)
+            res = run(channelizer, detector, self.times, self.data, [7000, 12005])
+            assert len(res) == len(truth)
+            assert_allclose(res["rf"], truth[:, 2], atol=2)
+            assert_allclose(res["toa"], truth[:, 0], atol=4 * SAMPLE_RATE_S)
+            assert_allclose(res["pa"], 100, rtol=0.1)
+
+            channelizer = Channelizer(8, oversample=oversample)
+            detector = ChannelDetector(channelizer, SAMPLE_RATE_S, 0.01, threshold=500)
+            whole = run(channelizer, detector, self.times, self.data, 1)
+            assert_array_equal(res["toa"], whole["toa"])
+            assert_allclose(res["rf"], whole["rf"])
+
+    def test_real(self):
+        # the mirror images of real tones are not reported again
+        pulses = [(0.2, 0.01, 2550.0), (0.5, 0.01, 3700.0), (1.2, 0.01, 1250.0)]
+        (times, data) = tone_pulses(pulses, 20000, np.random.default_rng(seed=42), True)
+        truth = np.array(pulses)
+        for oversample in [1, 2]:
+            channelizer = Channelizer(8, oversample=oversample)
+            assert channelizer(data[:800]).shape == (5, 800 * oversample // 8)
+
+            channelizer = Channelizer(8, oversample=oversample)
+            with ChannelDetector(
+                channelizer, SAMPLE_RATE_S, 0.01, threshold=500
+            ) as detector:
+                res = run(channelizer, detector, times[800:], data[800:], [7000])
+            assert detector._pool is None
+            assert len(res) == len(truth)
+            assert_allclose(res["rf"], truth[:, 2], atol=5)
+            assert_allclose(res["toa"], truth[:, 0], atol=4 * SAMPLE_RATE_S)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,18 @@
 import unittest
 
+import numpy as np
 import polars as pl
 from polars.testing import assert_frame_equal
 
 from deinterleaver import (
+    StreamingDeduper,
     burst_stats,
     filter_by_pri,
     group_by_burst,
+    partitioned_deinterleave,
+    remove_dupes,
     remove_duplicates,
+    rf_bands,
 )
 
 
@@ -231,6 +236,97 @@ class TestPrecisePri(unittest.TestCase):
         )
 
 
+class TestRemoveDupes(unittest.TestCase):
+    def setUp(self):
+        # two emitters seen by three receivers with small delays
+        rng = np.random.default_rng(seed=42)
+        toas = np.concatenate([np.arange(0, 100, 1.0), np.arange(0.3, 100, 1.3)])
+        rfs = np.concatenate([np.full(100, 1000.0), np.full(77, 1200.0)])
+        self.df = pl.DataFrame(
+            {
+                "toa": np.concatenate(
+                    [toas + rng.uniform(0, 0.05, len(toas)) for _ in range(3)]
+                ),
+                "rf": np.concatenate(
+                    [rfs + rng.normal(0, 2, len(rfs)) for _ in range(3)]
+                ),
+                "receiver": np.repeat([0, 1, 2], len(toas)),
+            },
+        ).sort("toa")
+
+    def test_interleaved(self):
+        res = remove_dupes(self.df, tol=0.1, rf_tol=20)
+        assert len(res) == 177
+        assert res["toa"].is_sorted()
+        assert (res["rf"] < 1100).sum() == 100
+
+        # adjacent pulses only, both emitters collapse where they are close
+        assert len(remove_dupes(self.df, tol=0.1, rf_tol=np.inf)) < 177
+
+        no_rf = remove_dupes(self.df.drop("rf"), tol=0.1)
+        deltas = self.df["toa"].diff().fill_null(1.0)
+        assert len(no_rf) == (deltas > 0.1).sum()
+
+    def test_streaming(self):
+        deduper = StreamingDeduper(tol=0.1, rf_tol=20)
+        res = pl.concat([deduper.push(_) for _ in self.df.iter_slices(23)])
+        assert_frame_equal(res, remove_dupes(self.df, tol=0.1, rf_tol=20))
+
+
+class TestPartitioned(unittest.TestCase):
+    def setUp(self):
+        # emitters with the same PRI, separated only by RF
+        rng = np.random.default_rng(seed=42)
+        self.rfs = [1000.0, 1200.0, 1250.0, 1500.0]
+        self.df = pl.concat(
+            [
+                pl.DataFrame(
+                    {
+                        "toa": np.arange(offset, 200, 5.0) + rng.normal(0, 0.01, 40),
+                        "rf": rf + rng.normal(0, 2, 40),
+                        "emitter": np.full(40, pos),
+                    },
+                )
+                for pos, (offset, rf) in enumerate(zip([0, 0.02, 2, 3], self.rfs))
+            ],
+        ).sort("toa")
+
+    def test_rf_bands(self):
+        bands = rf_bands(np.array([0.0, 100.0]), 4, 5)
+        assert bands[0] == (-np.inf, 25, -np.inf, 30)
+        assert bands[1] == (25, 50, 20, 55)
+        assert bands[-1][1] == np.inf
+
+        # the range runs from the lowest RF, not from 0
+        rf = np.array([1000.0, 1010, 1120, 1130, 1260, 1380, 1390, 1400])
+        bands = rf_bands(rf, 4, 5)
+        assert bands[1] == (1100, 1200, 1095, 1205)
+        counts = [np.sum((rf >= lo) & (rf < hi)) for (lo, hi, _, _) in bands]
+        assert counts == [2, 2, 1, 3]
+
+        assert rf_bands(np.array([]), 4, 5) == [(-np.inf, np.inf, -np.inf, np.inf)]
+
+    def test_partitioned(self):
+        # the RF range is 1000 to 1500, the emitter at 1250 straddles the
+        # edge of the middle bands
+        res = partitioned_deinterleave(self.df, 5.0, num_bands=4, max_workers=1)
+        assert len(res) == len(self.df)
+        per_burst = res.group_by("burst_group").agg(pl.col("emitter").unique())
+        assert sorted(per_burst["emitter"].to_list()) == [[0], [1], [2], [3]]
+        # numbered by first pulse and sorted by burst, as from group_by_burst
+        assert res["burst_group"].is_sorted()
+        first = res.group_by("burst_group").agg(pl.col("toa").min()).sort("burst_group")
+        assert first["toa"].is_sorted()
+
+        whole = group_by_burst(self.df, 5.0)
+        assert whole["burst_group"].n_unique() < 4
+
+    def test_process_pool(self):
+        res = partitioned_deinterleave(self.df, 5.0, num_bands=3, max_workers=2)
+        serial = partitioned_deinterleave(self.df, 5.0, num_bands=3, max_workers=1)
+        assert_frame_equal(res, serial)
+
+
 if __name__ == "__main__":
     pl.Config(tbl_rows=-1)
     unittest.main()
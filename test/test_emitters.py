@@ -0,0 +1,138 @@
+import tempfile
+import unittest
+
+import numpy as np
+import polars as pl
+from numpy.testing import assert_allclose, assert_array_equal
+
+from emitters import EmitterLibrary, burst_features
+
+DIMS = ("pri", "rf", "pw")
+
+
+def random_library(rng: np.random.Generator, num: int) -> pl.DataFrame:
+    centers = np.column_stack(
+        [
+            rng.uniform(1e-4, 1e-2, num),
+            rng.uniform(1e3, 1e4, num),
+            rng.uniform(1e-6, 1e-4, num),
+        ],
+    )
+    widths = centers * rng.uniform(0.005, 0.05, (num, 3))
+    return pl.DataFrame(
+        {"name": [f"e{_}" for _ in range(num)]}
+        | {
+            f"{dim}_min": centers[:, pos] - widths[:, pos]
+            for pos, dim in enumerate(DIMS)
+        }
+        | {
+            f"{dim}_max": centers[:, pos] + widths[:, pos]
+            for pos, dim in enumerate(DIMS)
+        },
+    )
+
+
+class TestEmitterLibrary(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(seed=42)
+        self.library = EmitterLibrary(rebuild_size=50)
+        self.library.extend(random_library(self.rng, 2000))
+        # some indexed, some only in the recent entries
+        for pos in range(80):
+            self.library.add(
+                f"new{pos}",
+                pri=(1e-3, 1.2e-3),
+                rf=(5000 + pos, 5020 + pos),
+                pw=(1e-5, 2e-5),
+            )
+        self.library.remove([3, 2010])
+        self.points = np.column_stack(
+            [
+                self.rng.uniform(1e-4, 1e-2, 300),
+                self.rng.uniform(1e3, 1e4, 300),
+                self.rng.uniform(1e-6, 1e-4, 300),
+            ],
+        )
+        self.points[:20] = [1.1e-3, 5050, 1.5e-5]
+
+    def test_match(self):
+        lib = self.library
+        (rows, ids) = lib.match(self.points)
+        assert len(rows) > 20
+        for row, point in enumerate(self.points):
+            inside = np.all((lib.lo <= point) & (point <= lib.hi), axis=1)
+            assert_array_equal(ids[rows == row], np.flatnonzero(inside & lib.alive))
+        assert 2010 not in ids
+
+    def test_nearest(self):
+        lib = self.library
+        (dist, ids) = lib.nearest(self.points, k=3)
+        assert dist.shape == ids.shape == (300, 3)
+        for row, point in enumerate(self.points):
+            truth = np.linalg.norm((lib.centers - point) / lib._scale, axis=1)
+            truth[~lib.alive] = np.inf
+            assert_allclose(dist[row], np.sort(truth)[:3], atol=1e-12)
+            assert_allclose(truth[ids[row]], dist[row], atol=1e-12)
+
+        (dist, ids) = EmitterLibrary().nearest(self.points[:2], k=2)
+        assert np.all(np.isinf(dist))
+        assert np.all(ids == -1)
+
+    def test_associate(self):
+        bursts = pl.DataFrame(
+            {"pri": [1.1e-3, 1.0], "rf": [5050.0, 0.0], "pw": [1.5e-5, 0.0]},
+        )
+        res = self.library.associate(bursts)
+        assert res["emitter"].to_list() == ["new40", None]
+        assert res["emitter_id"][1] is None
+
+        # a one pulse burst has no PRI, it matches nothing
+        pulses = pl.DataFrame(
+            {
+                "toa": [0.0, 1.1e-3, 2.2e-3, 5.0],
+                "rf": [5050.0, 5050.0, 5050.0, 5050.0],
+                "pw": [1.5e-5, 1.5e-5, 1.5e-5, 1.5e-5],
+                "burst_group": [0, 0, 0, 1],
+            },
+        )
+        bursts = burst_features(pulses)
+        assert bursts["pri"][1] is None
+        res = self.library.associate(bursts)
+        assert res["emitter"].to_list() == ["new40", None]
+        assert res["emitter_id"][1] is None
+        points = self.library._points(bursts)
+        (rows, _) = self.library.match(points)
+        assert 1 not in rows
+        (dist, ids) = self.library.nearest(points, k=2)
+        assert np.all(np.isinf(dist[1]))
+        assert np.all(ids[1] == -1)
+        assert np.all(ids[0] >= 0)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.library.save(path)
+            loaded = EmitterLibrary.load(path)
+        assert len(loaded) == len(self.library)
+        assert_array_equal(
+            loaded.match(self.points)[1], self.library.match(self.points)[1]
+        )
+        assert loaded.frame().equals(self.library.frame())
+
+
+class TestBurstFeatures(unittest.TestCase):
+    def test_burst_features(self):
+        df = pl.DataFrame(
+            {
+                "toa": [0.0, 1.0, 2.0, 10.0, 10.5, 11.0],
+                "rf": [1.0, 1.0, 4.0, 2.0, 2.0, 2.0],
+                "burst_group": [0, 0, 0, 1, 1, 1],
+            },
+        )
+        res = burst_features(df)
+        assert res.columns == ["burst_group", "pri", "rf"]
+        assert_allclose(res["pri"].to_numpy(), [1.0, 0.5])
+        assert_allclose(res["rf"].to_numpy(), [2.0, 2.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,9 @@
 import unittest
 
+import numpy as np
 import polars as pl
 
-from geo_engine import get_geos
+from geo_engine import get_geos, orbit_trajectory
 
 
 class TestPrecisePri(unittest.TestCase):
@@ -20,6 +21,13 @@ class TestPrecisePri(unittest.TestCase):
         print(res)
         assert 4 == 4
 
+    def test_orbit_trajectory(self):
+        trajectory = orbit_trajectory(num_steps=1000, dt=10)
+        assert trajectory.shape == (1001, 6)
+        radius = np.linalg.norm(trajectory[:, :3], axis=1)
+        np.testing.assert_allclose(radius, 7e6, rtol=1e-6)
+        np.testing.assert_array_equal(trajectory[:, 2], 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+
+import numpy as np
+import polars as pl
+from numpy.testing import assert_array_equal
+from polars.testing import assert_frame_equal
+
+from deinterleaver import (
+    StreamingBurstGrouper,
+    StreamingDeduper,
+    group_by_burst,
+    remove_dupes,
+)
+from ingest import (
+    LocalPublisher,
+    PdwIngest,
+    ZmqSource,
+    decode_columns,
+    decode_pdws,
+    encode_pdws,
+)
+
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
+
+def make_pdws(num_pulses: int = 300) -> pl.DataFrame:
+    rng = np.random.default_rng(seed=42)
+    return pl.DataFrame(
+        {
+            "toa": np.sort(np.round(rng.uniform(0, 500, num_pulses), 2)),
+            "pw": rng.uniform(1e-6, 1e-5, num_pulses),
+            "rf": rng.integers(0, 5, num_pulses).astype(float),
+            "pa": rng.uniform(0, 1, num_pulses),
+        },
+    )
+
+
+def burst_toas(df: pl.DataFrame) -> list:
+    return sorted(
+        tuple(_)
+        for _ in df.group_by("burst_group").agg(pl.col("toa"))["toa"].to_list()
+    )
+
+
+class TestMessages(unittest.TestCase):
+    def test_round_trip(self):
+        df = make_pdws(10)
+        message = encode_pdws(df)
+        assert len(message) == 8 + 10 * 4 * 8
+        assert_frame_equal(decode_pdws(message), df)
+
+    def test_zero_copy(self):
+        message = bytearray(encode_pdws(make_pdws(10)))
+        columns = decode_columns(message)
+        assert not columns["toa"].flags.owndata
+        assert np.shares_memory(columns["toa"], np.frombuffer(message, dtype=np.uint8))
+
+    def test_bad_message(self):
+        with self.assertRaises(ValueError):
+            decode_pdws(b"NOPE\x00\x00\x00\x00")
+        with self.assertRaises(ValueError):
+            decode_pdws(encode_pdws(make_pdws(2))[:-8])
+
+
+class TestStreaming(unittest.TestCase):
+    def test_streaming_dedup(self):
+        df = make_pdws()
+        deduper = StreamingDeduper(0.5)
+        res = pl.concat([deduper.push(_) for _ in df.iter_slices(37)])
+        assert_frame_equal(res, remove_dupes(df, 0.5))
+
+    def test_streaming_bursts(self):
+        df = make_pdws()
+        grouper = StreamingBurstGrouper(5, 0.5, 3)
+        res = pl.concat([grouper.push(_) for _ in df.iter_slices(37)] + [grouper.flush()])
+        assert burst_toas(res) == burst_toas(group_by_burst(df, 5, 0.5, 3))
+        assert_array_equal(
+            res["burst_group"].unique().sort(),
+            np.arange(res["burst_group"].n_unique()),
+        )
+
+    def test_out_of_order(self):
+        grouper = StreamingBurstGrouper(5)
+        grouper.push(pl.DataFrame({"toa": [10.0, 11.0]}))
+        with self.assertRaises(ValueError):
+            grouper.push(pl.DataFrame({"toa": [9.0]}))
+
+
+class TestIngest(unittest.TestCase):
+    def test_local_publisher(self):
+        df = make_pdws()
+        publisher = LocalPublisher(hwm=4)
+        with PdwIngest(publisher, 5, 0.5, 3, queue_size=2, poll_ms=10) as ingest:
+            publisher.send_pdws(df, batch_size=20)
+
+        bursts = []
+        while not ingest.bursts.empty():
+            bursts.append(ingest.bursts.get())
+        assert ingest.num_pulses == len(df)
+        assert ingest.num_batches == 15
+        assert burst_toas(pl.concat(bursts)) == burst_toas(group_by_burst(df, 5, 0.5, 3))
+
+    def test_drop(self):
+        publisher = LocalPublisher(hwm=1, drop=True)
+        publisher.send(b"a")
+        publisher.send(b"b")
+        assert publisher.dropped == 1
+
+    @unittest.skipUnless(zmq, "pyzmq not installed")
+    def test_zmq(self):
+        df = make_pdws()
+        context = zmq.Context()
+        source = ZmqSource("inproc://pdws", "PULL", bind=True, context=context)
+        push = context.socket(zmq.PUSH)
+        push.connect("inproc://pdws")
+
+        bursts = []
+        with PdwIngest(source, 5, 0.5, 3, poll_ms=10, on_bursts=bursts.append):
+            for batch in df.iter_slices(50):
+                push.send(encode_pdws(batch))
+
+        push.close()
+        source.close()
+        context.term()
+        assert burst_toas(pl.concat(bursts)) == burst_toas(group_by_burst(df, 5, 0.5, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+import polars as pl
+from numpy.testing import assert_allclose, assert_array_equal
+
+from deinterleaver import StreamingBurstGrouper, group_by_burst
+from intervals import BurstIndex, burst_intervals
+
+
+class TestBurstIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.starts = rng.uniform(0, 100, 500)
+        self.stops = self.starts + rng.exponential(0.5, 500)
+        self.stops[:2] += 20
+        self.index = BurstIndex(merge_size=40)
+        for part in np.array_split(np.arange(500), 23):
+            self.index.add(part, self.starts[part], self.stops[part])
+
+        self.window_starts = rng.uniform(-5, 105, 100)
+        self.window_stops = self.window_starts + rng.exponential(1, 100)
+
+    def test_overlapping(self):
+        assert len(self.index) == 500
+        windows = list(zip(self.window_starts, self.window_stops))
+        truths = [
+            np.flatnonzero((self.starts <= hi) & (self.stops >= lo))
+            for (lo, hi) in windows
+        ]
+        # one window at a time checks the bursts not merged yet directly
+        for (lo, hi), truth in zip(windows, truths):
+            (_, ids) = self.index.overlapping(lo, hi)
+            assert_array_equal(np.sort(ids), truth)
+        assert self.index._num_pending > 0
+
+        (rows, ids) = self.index.overlapping(self.window_starts, self.window_stops)
+        assert self.index._num_pending == 0
+        for row, truth in enumerate(truths):
+            assert_array_equal(np.sort(ids[rows == row]), truth)
+
+        (rows, ids) = self.index.stab([self.starts[5], -1.0])
+        assert 5 in ids
+        assert_array_equal(rows, 0)
+
+    def test_overlaps(self):
+        (first, second) = self.index.overlaps()
+        pairs = {frozenset(_) for _ in zip(first, second)}
+        assert len(pairs) == len(first)
+        truth = {
+            frozenset((i, j))
+            for i in range(500)
+            for j in range(i + 1, 500)
+            if self.starts[j] <= self.stops[i] and self.stops[j] >= self.starts[i]
+        }
+        assert pairs == truth
+
+    def test_coverage(self):
+        index = BurstIndex()
+        index.add([0, 1, 2, 3], [0.0, 1.0, 5.0, 5.5], [2.0, 3.0, 6.0, 5.7])
+        assert_allclose(
+            index.coverage([-1.0, 0.5, 2.5, 4.0, 10.0], [10.0, 1.0, 5.5, 4.5, 11.0]),
+            [4.0, 0.5, 1.0, 0.0, 0.0],
+        )
+        assert_allclose(BurstIndex().coverage([0.0], [1.0]), [0.0])
+
+    def test_push(self):
+        rng = np.random.default_rng(seed=1)
+        toas = np.sort(
+            np.concatenate([np.arange(0, 30, 1.0), np.arange(50, 80, 1.0)])
+            + rng.normal(0, 0.01, 60),
+        )
+        df = pl.DataFrame({"toa": toas})
+        grouper = StreamingBurstGrouper(1.0)
+        index = BurstIndex()
+        for part in np.array_split(np.arange(60), 6):
+            index.push(grouper.push(df[part]))
+        index.push(grouper.flush())
+
+        truth = burst_intervals(group_by_burst(df, 1.0))
+        assert len(index) == len(truth) == 2
+        (_, ids) = index.stab([10.0, 40.0, 60.0])
+        assert_array_equal(ids, [0, 1])
+        assert_allclose(
+            index.coverage([-np.inf], [np.inf]),
+            (truth["stop"] - truth["start"]).sum(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+import jit
+from pulse_simulator import find_diffs, make_signal, try_pris
+
+
+class TestBackend(unittest.TestCase):
+    def tearDown(self):
+        jit.set_backend("numpy")
+
+    def test_set_backend(self):
+        jit.set_backend("numba")
+        assert jit.get_backend() == "numba"
+        assert jit.use_numba() == jit.HAVE_NUMBA
+        assert not jit.use_numba("numpy")
+
+        with self.assertRaises(ValueError):
+            jit.set_backend("cuda")
+        with self.assertRaises(ValueError):
+            jit.use_numba("cuda")
+
+    def test_make_signal(self):
+        (times, truth) = make_signal(0.1, 0.01, 3, 0.02, backend="numpy")
+        (_, res) = make_signal(0.1, 0.01, 3, 0.02, backend="numba")
+        assert_array_equal(res, truth)
+        assert_array_equal(np.nonzero(truth)[0], [0, 1, 2, 10, 11, 12, 20, 21, 22])
+
+    def test_try_pris(self):
+        rng = np.random.default_rng(seed=42)
+        data = (rng.random(5000) > 0.99).astype(int)
+        (pris, truth) = try_pris(data, 0.001, backend="numpy")
+        (pris_jit, res) = try_pris(data, 0.001, backend="numba")
+        assert_allclose(pris_jit, pris)
+        assert_allclose(res, truth)
+
+    def test_find_diffs(self):
+        data = np.array([1.5, 2.1, 3.2, 4.7])
+        jit.set_backend("numba")
+        assert_allclose(find_diffs(data), np.array([0.6, 1.7, 3.2, 1.1, 2.6, 1.5]))
+
+        rng = np.random.default_rng(seed=42)
+        data = rng.uniform(size=100)
+        assert_allclose(
+            find_diffs(data, backend="numba"),
+            find_diffs(data, backend="numpy"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
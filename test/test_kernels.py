@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from scipy import signal
+
+import kernels
+from pulse_simulator import calc_norm, find_diffs, frame_array
+
+
+class TestKernels(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.toas = np.sort(np.round(rng.uniform(0, 100, 200), 1))
+        self.data = (rng.random(1000) > 0.9).astype(int)
+
+    def test_assign_bursts(self):
+        toas = np.array([5.0, 7, 10, 12, 15, 32, 37])
+        assert_array_equal(
+            kernels.assign_bursts(toas, 5, 0.5),
+            np.array([0, 1, 0, 1, 0, 2, 2]),
+        )
+        assert_array_equal(
+            kernels.assign_bursts(self.toas, 5, 0.5),
+            kernels._assign_bursts_py(self.toas, 5, 0.5),
+        )
+
+    def test_fold_norms(self):
+        lengths = np.array([1, 7, 10, 333, 1500])
+        truth = [calc_norm(frame_array(self.data, _)) for _ in lengths]
+        assert_allclose(kernels.fold_norms(self.data, lengths), truth)
+        assert_allclose(
+            kernels._fold_norms_py(self.data.astype(float), lengths),
+            truth,
+        )
+
+    def test_diff_histogram(self):
+        edges = np.linspace(0, 20, 41)
+        truth, _ = np.histogram(find_diffs(self.toas), bins=edges)
+        assert_array_equal(kernels.diff_histogram(self.toas, edges), truth)
+        assert_array_equal(kernels._diff_histogram_py(self.toas, edges), truth)
+
+    def test_duplicate_mask(self):
+        rfs = np.repeat([10.0, 50.0], 100)[
+            np.random.default_rng(seed=1).permutation(200)
+        ]
+        truth = [
+            any(
+                self.toas[i] - self.toas[j] <= 0.5 and abs(rfs[i] - rfs[j]) <= 10
+                for j in range(i)
+            )
+            for i in range(200)
+        ]
+        assert_array_equal(kernels.duplicate_mask(self.toas, rfs, 0.5, 10), truth)
+        assert_array_equal(kernels._duplicate_mask_py(self.toas, rfs, 0.5, 10), truth)
+
+    def test_os_cfar_noise(self):
+        power = np.random.default_rng(seed=42).exponential(size=300)
+        truth = []
+        for idx in range(300):
+            train = np.sort(
+                np.r_[
+                    power[max(idx - 7, 0) : max(idx - 2, 0)], power[idx + 3 : idx + 8]
+                ],
+            )
+            truth.append(train[int(np.floor(0.75 * (len(train) - 1) + 0.5))])
+        assert_array_equal(kernels.os_cfar_noise(power, 5, 2, 0.75), truth)
+        assert_array_equal(kernels.os_cfar_noise(power, 5, 2, 0.75, 3, 9), truth[3:9])
+        assert_array_equal(kernels._os_cfar_noise_py(power, 5, 2, 0.75, 0, 300), truth)
+
+    def test_box_sum(self):
+        data = np.random.default_rng(seed=42).normal(size=100)
+        for width in [1, 4, 99, 100, 150]:
+            truth = signal.lfilter(np.ones(width), [1], data)
+            assert_allclose(kernels.box_sum(data, width), truth, atol=1e-12)
+
+        out = np.empty(100)
+        res = kernels.box_sum(self.data[:100].astype(np.int16), 5, out=out)
+        assert res is out
+        assert_array_equal(res, signal.lfilter(np.ones(5), [1], self.data[:100]))
+
+        # summed in the working dtype, in chunks and in blocks with the tail
+        data = data.astype(np.float32)
+        truth = signal.lfilter(np.ones(21), [1], data)
+        assert kernels.box_sum(data, 21).dtype == np.float32
+        for width in [1, 4, 21, 150]:
+            with mock.patch.object(kernels, "BOX_CHUNK", 7):
+                assert_allclose(
+                    kernels.box_sum(data, width),
+                    signal.lfilter(np.ones(width), [1], data),
+                    atol=1e-5,
+                )
+        tail = np.zeros(20, np.float32)
+        res = [
+            kernels.box_sum(data[:5], 21, tail=tail),
+            kernels.box_sum(data[5:33], 21, tail=tail),
+            kernels.box_sum(data[33:], 21, tail=tail),
+        ]
+        assert res[0].dtype == np.float32
+        assert_array_equal(tail, data[-20:])
+        assert_allclose(np.concatenate(res), truth, atol=1e-5)
+
+        # rounding does not build up over a long stream with an offset
+        data = 1000 + np.random.default_rng(seed=42).normal(size=10**6)
+        truth = signal.lfilter(np.ones(21), [1], data.astype(np.float32))
+        res = kernels.box_sum(data.astype(np.float32), 21)
+        assert_allclose(res, truth, atol=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from memo import ResultCache, content_hash
+
+
+class TestContentHash(unittest.TestCase):
+    def test_hash(self):
+        data = np.arange(10)
+        assert content_hash(data, "a") == content_hash(data.copy(), "a")
+        assert content_hash(data, "a") != content_hash(data, "b")
+        assert content_hash(data) != content_hash(data.astype(np.int32))
+        assert content_hash(data) != content_hash(data.reshape(2, 5))
+        assert content_hash(data[::2]) == content_hash(np.arange(0, 10, 2))
+
+
+class TestResultCache(unittest.TestCase):
+    def test_lru(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("a", x=np.arange(3))
+        cache.put("b", x=np.arange(4))
+        assert_array_equal(cache.get("a")["x"], np.arange(3))
+        cache.put("c", x=np.arange(5))
+
+        assert len(cache) == 2
+        assert "b" not in cache
+        assert cache.get("b") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = ResultCache(max_entries=1, path=path)
+            cache.put("a", x=np.arange(3), y=np.ones(2))
+            cache.put("b", x=np.arange(4))
+            assert "a" in cache
+
+            fresh = ResultCache(path=path)
+            entry = fresh.get("a")
+            assert_array_equal(entry["x"], np.arange(3))
+            assert_array_equal(entry["y"], np.ones(2))
+            assert len(fresh) == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
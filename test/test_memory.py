@@ -0,0 +1,159 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+import polars as pl
+
+import memory
+from deinterleaver import group_by_burst
+from memory import MemoryBudgetError, MemoryRegistry
+from pulse_simulator import find_diffs, frame_array, try_pris
+
+
+class TestMemoryRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MemoryRegistry(enabled=True)
+
+    def tearDown(self):
+        self.registry.disable()
+
+    def test_disabled(self):
+        registry = MemoryRegistry()
+
+        @registry.measured
+        def ones(n):
+            return np.ones(n)
+
+        assert len(ones(10)) == 10
+        with registry.measure("block"):
+            pass
+        assert registry.snapshot() == {}
+
+    def test_measured(self):
+        @self.registry.measured(bytes_arg="data")
+        def scratch(data):
+            # a temporary of 8 times the input and an output of the input size
+            np.repeat(data, 8).sum()
+            return data.copy()
+
+        data = np.ones(10**5)
+        scratch(data)
+        scratch(data=data[:10])
+
+        stats = self.registry.snapshot()["scratch"]
+        assert stats["count"] == 2
+        assert stats["input_bytes"] == data.nbytes
+        assert 8 * data.nbytes <= stats["peak_bytes"] < 10 * data.nbytes
+        assert data.nbytes <= stats["numpy_retained_bytes"] < 2 * data.nbytes
+
+    def test_hierarchy(self):
+        @self.registry.measured(name="inner")
+        def inner():
+            return np.ones(10**4)
+
+        with self.registry.measure("outer"):
+            big = np.ones(10**6)
+            del big
+            inner()
+        snapshot = self.registry.snapshot()
+        assert snapshot["outer/inner"]["count"] == 1
+        assert snapshot["outer/inner"]["peak_bytes"] < 10**6
+        # the peak before inner started is kept
+        assert snapshot["outer"]["peak_bytes"] >= 8 * 10**6
+
+    def test_budget(self):
+        self.registry.set_budget("alloc", bytes=10**6)
+        for strict in [False, True]:
+            self.registry.strict = strict
+            with self.registry.measure("alloc"):
+                np.ones(10**4)
+            if strict:
+                with self.assertRaises(MemoryBudgetError):
+                    with self.registry.measure("alloc"):
+                        np.ones(10**6)
+            else:
+                with self.registry.measure("alloc"):
+                    np.ones(10**6)
+        report = self.registry.report()
+        assert report["stage"].to_list() == ["alloc"]
+        assert report["count"][0] == 4
+        assert report["over_budget"][0] == 2
+        assert report["budget_bytes"][0] == 10**6
+
+    def test_strict_threads(self):
+        # a stage starting on another thread would reset the peak of a stage
+        # over budget, strict mode measures them one at a time
+        self.registry.set_budget("big", bytes=10**6)
+        self.registry.strict = True
+        allocated = threading.Event()
+        errors = []
+
+        def big():
+            try:
+                with self.registry.measure("big"):
+                    np.ones(10**6)
+                    allocated.set()
+                    time.sleep(0.2)
+            except MemoryBudgetError as err:
+                errors.append(err)
+
+        def small():
+            allocated.wait()
+            with self.registry.measure("small"):
+                pass
+
+        threads = [threading.Thread(target=big), threading.Thread(target=small)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(errors) == 1
+        assert self.registry.snapshot()["big"]["peak_bytes"] >= 8 * 10**6
+
+
+class TestStageBudgets(unittest.TestCase):
+    """Hot spots of the chain in strict mode, against linear budgets."""
+
+    def setUp(self):
+        self.enabled = memory.registry.enabled
+        memory.registry.enable(strict=True)
+        memory.registry.reset()
+        memory.registry.set_budget("find_diffs", bytes=10**6, per_input_byte=1000)
+        memory.registry.set_budget("frame_array", bytes=10**6, per_input_byte=4)
+        memory.registry.set_budget("try_pris", bytes=10**6, per_input_byte=4)
+        memory.registry.set_budget(
+            "group_by_burst", bytes=64 * 2**20, per_input_byte=16
+        )
+
+    def tearDown(self):
+        memory.registry.strict = False
+        memory.registry.budgets.clear()
+        memory.registry.reset()
+        if not self.enabled:
+            memory.registry.disable()
+
+    def test_find_diffs(self):
+        rng = np.random.default_rng(seed=42)
+        find_diffs(rng.uniform(size=200))
+        # the outer product grows with the square of the input
+        with self.assertRaises(MemoryBudgetError):
+            find_diffs(rng.uniform(size=2000))
+        assert memory.registry.snapshot()["find_diffs"]["over_budget"] == 1
+
+    def test_linear_stages(self):
+        rng = np.random.default_rng(seed=42)
+        data = (rng.uniform(size=10**5) > 0.99).astype(float)
+        frame_array(data, 1000)
+        try_pris(data, 0.001, pris=np.arange(0.01, 0.5, 0.05))
+        toas = np.sort(rng.uniform(0, 10**4, 10**5))
+        group_by_burst(pl.DataFrame({"toa": toas}), 0.1)
+
+        report = memory.registry.report()
+        assert set(report["stage"]) == {"frame_array", "try_pris", "group_by_burst"}
+        assert report["over_budget"].sum() == 0
+        assert (report["peak_bytes"] > 0).all()
+
+
+if __name__ == "__main__":
+    unittest.main()
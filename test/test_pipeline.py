@@ -0,0 +1,174 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import polars as pl
+from numpy.testing import assert_allclose, assert_array_equal
+
+from deinterleaver import burst_stats, group_by_burst
+import pipeline as pipeline_module
+from pipeline import Pipeline, Stage, signal_chain, signal_chunks
+from pulse_simulator import (
+    StreamingDetector,
+    detector,
+    extract_pdws,
+    make_signal,
+)
+from tdoa import pdw_frame
+
+
+class TestPipeline(unittest.TestCase):
+    def test_stages(self):
+        flushed = []
+        pipeline = Pipeline(
+            [
+                Stage("double", lambda x: 2 * x),
+                Stage("odd", lambda x: x if x % 4 else None, offload=False),
+                Stage("last", lambda x: x, flush=lambda: flushed.append(1)),
+            ],
+            maxsize=2,
+        )
+        assert pipeline.run_sync(range(6)) == [2, 6, 10]
+        assert flushed == [1]
+
+        report = pipeline.report()
+        assert report["stage"].to_list() == ["double", "odd", "last"]
+        assert report["items_in"].to_list() == [6, 6, 3]
+        assert report["items_out"].to_list() == [6, 3, 3]
+        assert report["queue_depth_max"].max() <= 2
+
+    def test_async_source(self):
+        async def source():
+            for idx in range(3):
+                await asyncio.sleep(0)
+                yield idx
+
+        pipeline = Pipeline([Stage("inc", lambda x: x + 1)])
+        assert pipeline.run_sync(source()) == [1, 2, 3]
+
+    def test_error(self):
+        def fail(x):
+            raise RuntimeError(x)
+
+        pipeline = Pipeline([Stage("fail", fail), Stage("next", lambda x: x)])
+        with self.assertRaises(RuntimeError):
+            pipeline.run_sync(range(100))
+
+    def test_executor(self):
+        # a pool the pipeline started is shut down, a given one is not
+        started = []
+
+        def start(**kwargs):
+            started.append(ThreadPoolExecutor(**kwargs))
+            return started[-1]
+
+        with mock.patch.object(pipeline_module, "ThreadPoolExecutor", start):
+            pipeline = Pipeline([Stage("inc", lambda x: x + 1)])
+            assert pipeline.run_sync(range(3)) == [1, 2, 3]
+            assert pipeline.run_sync(range(2)) == [1, 2]
+        assert len(started) == 2
+        for executor in started:
+            with self.assertRaises(RuntimeError):
+                executor.submit(int)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pipeline = Pipeline([Stage("inc", lambda x: x + 1)], executor=executor)
+            assert pipeline.run_sync(range(3)) == [1, 2, 3]
+            assert executor.submit(int).result() == 0
+
+    def test_signal_chunks(self):
+        for chunk_size in [7, 777, 10**6]:
+            chunks = list(
+                signal_chunks(0.05, 0.0001, 20, 0.002, chunk_size, noise_var=None)
+            )
+            assert max(len(_[1]) for _ in chunks) <= chunk_size
+            (times, data) = make_signal(0.05, 0.0001, 20, 0.002)
+            assert_array_equal(np.concatenate([_[0] for _ in chunks]), times)
+            assert_array_equal(np.concatenate([_[1] for _ in chunks]), data)
+
+    def test_signal_chain(self):
+        sample_rate_s = 0.0001
+        pw_s = 0.002
+        pri_s = 0.05
+        pipeline = signal_chain(sample_rate_s, pw_s, pri_s, tol=0.001)
+        chunks = signal_chunks(
+            pri_s,
+            sample_rate_s,
+            100,
+            pw_s,
+            chunk_size=777,
+            noise_var=None,
+        )
+        res = pl.concat(pipeline.run_sync(chunks))
+
+        (times, data) = make_signal(pri_s, sample_rate_s, 100, pw_s)
+        detects = detector(data, sample_rate_s, pw_s)
+        pdws = pdw_frame(extract_pdws(times, detects, data, sample_rate_s))
+        truth = burst_stats(group_by_burst(pdws, pri_s, 0.001))
+
+        assert_array_equal(res["burst_group"], truth["burst_group"])
+        assert_allclose(res["mean"], truth["mean"])
+        assert pipeline.report()["items_in"][0] == len(data) // 777 + 1
+
+    def test_channelized_chain(self):
+        sample_rate_s = 0.0001
+        pw_s = 0.002
+        pri_s = 0.05
+        pipeline = signal_chain(sample_rate_s, pw_s, pri_s, tol=0.001, num_channels=4)
+        chunks = signal_chunks(
+            pri_s,
+            sample_rate_s,
+            100,
+            pw_s,
+            chunk_size=777,
+            noise_var=None,
+        )
+        res = pl.concat(pipeline.run_sync(chunks))
+        assert pipeline.report()["stage"][0] == "channelize"
+        # the pulses are at DC, one burst of every pulse in channel 0
+        assert len(res) == 1
+        assert_allclose(res["mean"], pri_s)
+        assert_array_equal(res["rf"][0], np.zeros(100))
+
+        # a real tone at the center of channel 1, its mirror in channel 3 is
+        # not reported again
+        pipeline = signal_chain(sample_rate_s, pw_s, pri_s, tol=0.001, num_channels=4)
+        chunks = (
+            (times, 2 * np.cos(2 * np.pi * 2500 * times) * data)
+            for (times, data) in signal_chunks(
+                pri_s,
+                sample_rate_s,
+                100,
+                pw_s,
+                chunk_size=777,
+                noise_var=None,
+            )
+        )
+        res = pl.concat(pipeline.run_sync(chunks))
+        assert len(res) == 1
+        assert_allclose(res["mean"], pri_s)
+        assert_allclose(res["rf"][0], 2500, atol=1)
+
+
+class TestStreamingDetector(unittest.TestCase):
+    def test_blocks(self):
+        (times, data) = make_signal(0.1, 0.01, 3, 0.03)
+        stream = StreamingDetector(0.01, 0.03)
+        res = np.concatenate([stream(data[:5]), stream(data[5:17]), stream(data[17:])])
+        assert_array_equal(res, detector(data, 0.01, 0.03))
+
+    def test_extract_pdws(self):
+        times = np.arange(7) * 0.01
+        pdw = extract_pdws(times, np.array([1, 1, 0, 0, 1, 0, 1]), np.arange(7.0), 0.01)
+        assert_allclose(pdw.toa_s, [0.0, 0.04, 0.06])
+        assert_allclose(pdw.pw_s, [0.02, 0.01, 0.01])
+        assert_allclose(pdw.pa, [1.0, 4.0, 6.0])
+
+        pdw = extract_pdws(times, np.zeros(7), np.arange(7.0), 0.01)
+        assert len(pdw.toa_s) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import unittest
+
+import analysis
+import plotting
+import pulse_simulator
+
+CORE_MODULES = [
+    "analysis",
+    "cfar",
+    "deinterleaver",
+    "geo_engine",
+    "pipeline",
+    "pulse_simulator",
+    "references",
+]
+GUI_MODULES = ["matplotlib", "pyqtgraph", "PySide6"]
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_headless_core(self):
+        code = (
+            f"import sys, {', '.join(CORE_MODULES)}\n"
+            f"print(' '.join(_ for _ in {GUI_MODULES!r} if _ in sys.modules))"
+        )
+        res = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert res.stdout.split() == []
+
+    def test_moved_helpers(self):
+        assert pulse_simulator.plotter is plotting.plotter
+        assert analysis.plot_hist is plotting.plot_hist
+        assert analysis.plot_line is plotting.plot_line
+        with self.assertRaises(AttributeError):
+            analysis.plot_bars  # noqa: B018
+
+
+if __name__ == "__main__":
+    unittest.main()
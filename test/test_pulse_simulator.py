@@ -1,14 +1,26 @@
+import tracemalloc
 import unittest
 
 import numpy as np
 from numpy.testing import assert_allclose, assert_array_equal
 
+from buffers import BufferPool
+from memo import ResultCache
 from pulse_simulator import (
+    NOISE_BLOCK,
     Pdw,
     Pulse,
+    StreamingDetector,
+    blue_format,
+    detector,
+    envelope,
+    extract_pdws,
     find_diffs,
     find_periods,
     frame_array,
+    generate_noise,
+    iq_from_int16,
+    iq_to_int16,
     make_signal,
     moving_average,
     noise_filter,
@@ -34,6 +46,43 @@ class TestDiffs(unittest.TestCase):
         res = find_periods(data, num_pulses=4)
         assert_allclose(res, np.array([]))
 
+
+class TestPriCache(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.data = (rng.random(5000) > 0.99).astype(np.int8)
+
+    def test_try_pris(self):
+        cache = ResultCache()
+        (pris, truth) = try_pris(self.data, 0.001)
+        (_, res) = try_pris(self.data, 0.001, cache=cache)
+        assert_allclose(res, truth)
+
+        # a new grid computes only the lengths not seen yet
+        grid = np.arange(0.012, 1.2, 0.01)
+        (_, truth) = try_pris(self.data, 0.001, pris=grid)
+        (_, res) = try_pris(self.data, 0.001, pris=grid, cache=cache)
+        assert_allclose(res, truth)
+        (entry,) = cache._entries.values()
+        assert_array_equal(
+            entry["lengths"],
+            np.union1d(
+                (np.array(pris) / 0.001).astype(int), (grid / 0.001).astype(int)
+            ),
+        )
+
+        (_, res) = try_pris(self.data.copy(), 0.001, pris=grid[::3], cache=cache)
+        assert_allclose(res, truth[::3])
+        assert len(cache) == 1
+
+    def test_find_periods(self):
+        cache = ResultCache()
+        toas = np.array([4.9, 1.5, 2.1, 3.2, 4.7])
+        assert_allclose(find_periods(toas, num_pulses=4, cache=cache), [])
+        assert_allclose(find_periods(np.sort(toas), num_pulses=4, cache=cache), [])
+        assert (cache.hits, cache.misses) == (1, 1)
+
+
 class TestPdw(unittest.TestCase):
     def test_sample(self):
         pdw = Pdw(
@@ -63,6 +112,7 @@ class TestPdw(unittest.TestCase):
                 ],
             ),
         )
+
     def test_moving_average(self):
         data = np.array([1.0, 1, 1, 2.2, 5.5, 1, 1, 1, 1])
         # order 1 does nothing
@@ -109,6 +159,187 @@ class TestPdw(unittest.TestCase):
         assert_allclose(res, truth)
 
 
+class TestOutBuffers(unittest.TestCase):
+    def setUp(self):
+        (self.sample_rate_s, self.pw_s) = (0.0001, 0.002)
+        (_, data) = make_signal(0.05, self.sample_rate_s, 100, self.pw_s)
+        self.data = data + generate_noise(len(data), rng=np.random.default_rng(seed=42))
+
+    def test_out(self):
+        rng = np.random.default_rng(seed=42)
+        out = np.empty(1000, dtype=np.complex64)
+        res = generate_noise(1000, var=2, rng=rng, out=out)
+        assert res is out
+        truth = generate_noise(
+            1000,
+            var=2,
+            rng=np.random.default_rng(seed=42),
+            dtype=np.complex64,
+        )
+        assert_array_equal(res, truth)
+
+        out = np.empty(len(self.data))
+        assert moving_average(self.data, 5, out=out) is out
+        assert_allclose(out, moving_average(self.data, 5))
+        assert noise_filter(self.data, 5, out=out) is out
+        assert_allclose(out, noise_filter(self.data, 5))
+        with self.assertRaises(ValueError):
+            noise_filter(out, 5, out=out)
+
+        out = np.empty(len(self.data), dtype=np.int8)
+        truth = detector(self.data, self.sample_rate_s, self.pw_s)
+        res = detector(
+            self.data, self.sample_rate_s, self.pw_s, out=out, pool=BufferPool()
+        )
+        assert res is out
+        assert_array_equal(res, truth)
+
+    def test_steady_state(self):
+        blocks = self.data[: 50 * 1000].reshape(50, 1000)
+        pool = BufferPool()
+        stream = StreamingDetector(self.sample_rate_s, self.pw_s, pool=pool)
+        out = np.empty(1000, dtype=np.int8)
+        res = [stream(blocks[0], out=out).copy()]
+        allocated = pool.num_allocated
+
+        peaks = []
+        tracemalloc.start()
+        for block in blocks[1:]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            stream(block, out=out)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            res.append(out.copy())
+        tracemalloc.stop()
+
+        assert pool.num_allocated == allocated
+        # only small Python objects, a block of samples alone is 8000 bytes
+        assert max(peaks) < 4000
+        assert_array_equal(
+            np.concatenate(res),
+            detector(blocks.ravel(), self.sample_rate_s, self.pw_s),
+        )
+
+
+class TestDtypes(unittest.TestCase):
+    def test_generate_noise(self):
+        rng = np.random.default_rng(seed=42)
+        for dtype in [np.float32, np.float64, np.complex64, np.complex128]:
+            noise = generate_noise(100000, var=2, rng=rng, dtype=dtype)
+            assert noise.dtype == dtype
+            assert_allclose(np.mean(np.abs(noise) ** 2), 4, rtol=0.05)
+
+    def test_parallel_noise(self):
+        num_samples = 3 * NOISE_BLOCK + 123
+        for dtype in [np.float32, np.complex64]:
+            truth = generate_noise(
+                num_samples,
+                mean=1,
+                var=2,
+                rng=np.random.default_rng(seed=42),
+                dtype=dtype,
+                max_workers=1,
+            )
+            for max_workers in [2, 4, None]:
+                noise = generate_noise(
+                    num_samples,
+                    mean=1,
+                    var=2,
+                    rng=np.random.default_rng(seed=42),
+                    dtype=dtype,
+                    max_workers=max_workers,
+                )
+                assert_array_equal(noise, truth)
+            assert noise.dtype == dtype
+            assert_allclose(np.mean(noise), 1, atol=0.01)
+            assert_allclose(np.var(noise), 4, rtol=0.01)
+
+        # each call spawns new generators, and the default is not shared
+        rng = np.random.default_rng(seed=42)
+        noise = generate_noise(num_samples, rng=rng)
+        assert not np.array_equal(noise, generate_noise(num_samples, rng=rng))
+        assert not np.array_equal(generate_noise(10), generate_noise(10))
+
+    def test_detector(self):
+        (sample_rate_s, pw_s) = (0.0001, 0.002)
+        (times, data) = make_signal(0.05, sample_rate_s, 10, pw_s)
+        truth = detector(data, sample_rate_s, pw_s)
+        assert np.sum(truth) > 0
+
+        for dtype in [np.float32, np.complex64]:
+            (_, samples) = make_signal(0.05, sample_rate_s, 10, pw_s, dtype=dtype)
+            assert samples.dtype == dtype
+            assert_array_equal(detector(samples, sample_rate_s, pw_s), truth)
+
+            stream = StreamingDetector(sample_rate_s, pw_s)
+            res = np.concatenate([stream(samples[:300]), stream(samples[300:])])
+            assert_array_equal(res, truth)
+            assert stream.tail.dtype == np.float32
+
+        iq = (data * np.exp(1j * 0.3)).astype(np.complex64)
+        assert_array_equal(detector(iq, sample_rate_s, pw_s), truth)
+        pdw = extract_pdws(times, truth, iq, sample_rate_s)
+        assert_allclose(pdw.pa, 100, rtol=1e-6)
+
+    def test_detector_memory(self):
+        # float32 sums and the int8 detections, no float64 temporaries
+        data = np.random.default_rng(seed=42).normal(size=10**6).astype(np.float32)
+        tracemalloc.start()
+        detector(data, 0.0001, 0.002)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 1.5 * data.nbytes
+
+    def test_detector_overwrite(self):
+        # the envelope goes into the real parts, only the sums are allocated
+        rng = np.random.default_rng(seed=42)
+        data = generate_noise(10**6, var=100, rng=rng, dtype=np.complex64)
+        truth = detector(data, 0.0001, 0.002)
+        tracemalloc.start()
+        res = detector(data, 0.0001, 0.002, overwrite=True)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 0.75 * data.nbytes
+        assert_array_equal(res, truth)
+
+    def test_filters_keep_dtype(self):
+        for dtype in [np.float32, np.complex64]:
+            data = np.array([1.0, 1, 1, 5, 1, 1, 1, 1], dtype=dtype)
+            assert moving_average(data, 3).dtype == dtype
+            res = noise_filter(data, 3)
+            assert res.dtype == dtype
+            assert_allclose(
+                res, [1 / 3, 0, -4 / 3, 8 / 3, -4 / 3, 0, 0, 1 / 3], rtol=1e-6
+            )
+        assert moving_average(np.arange(5, dtype=np.int16)).dtype == np.float32
+
+    def test_envelope(self):
+        iq = np.array([3 + 4j, -1j, 2], dtype=np.complex64)
+        assert_allclose(envelope(iq), [5, 1, 2])
+
+        res = envelope(iq, overwrite=True)
+        assert res.dtype == np.float32
+        assert np.shares_memory(res, iq)
+        assert_allclose(iq.real, [5, 1, 2])
+
+    def test_int16_iq(self):
+        raw = np.array([1, -2, 16384, -32768], dtype=np.int16)
+        iq = iq_from_int16(raw)
+        assert iq.dtype == np.complex64
+        assert_allclose(iq, [(1 - 2j) / 32768, 0.5 - 1j])
+        assert_array_equal(iq_to_int16(iq), raw)
+        assert_array_equal(iq_to_int16(np.array([2 + 0j])), [32767, 0])
+
+        with self.assertRaises(ValueError):
+            iq_from_int16(raw[:3])
+
+        assert blue_format(iq) == "CF"
+        assert blue_format(raw) == "SI"
+        assert blue_format(raw, interleaved=True) == "CI"
+        with self.assertRaises(ValueError):
+            blue_format(iq, interleaved=True)
+
+
 class TestAnalysis(unittest.TestCase):
     def test_frame_array(self):
         data = np.array([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11])
@@ -171,5 +402,6 @@ class TestAnalysis(unittest.TestCase):
             true_detects,
         )
 
+
 if __name__ == "__main__":
     unittest.main()
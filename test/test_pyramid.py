@@ -0,0 +1,137 @@
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+import pyramid
+from pulse_simulator import detector, make_signal
+from pyramid import MinMaxPyramid, SignalIndex
+
+
+class TestMinMaxPyramid(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.data = rng.normal(size=1001)
+
+    def test_levels(self):
+        pyr = MinMaxPyramid.build(self.data)
+        assert [len(_) for _ in pyr.mins] == [251, 63, 16, 4, 1]
+        assert pyr.mins[-1][0] == np.min(self.data)
+        assert pyr.maxs[-1][0] == np.max(self.data)
+        assert pyr.maxs[0][-1] == self.data[-1]
+
+        for factor in [1, 0, -2]:
+            with self.assertRaises(ValueError):
+                MinMaxPyramid.build(self.data, factor)
+
+    def test_chunked_build(self):
+        default = pyramid.CHUNK_SIZE
+        pyramid.CHUNK_SIZE = 30
+        try:
+            pyr = MinMaxPyramid.build(self.data)
+        finally:
+            pyramid.CHUNK_SIZE = default
+        full = MinMaxPyramid.build(self.data)
+        for chunked, truth in zip(pyr.mins + pyr.maxs, full.mins + full.maxs):
+            assert_array_equal(chunked, truth)
+
+    def test_query(self):
+        pyr = MinMaxPyramid.build(self.data)
+
+        (indices, values) = pyr.query(10, 20, num_points=100)
+        assert_array_equal(indices, np.arange(10, 20))
+        assert_array_equal(values, self.data[10:20])
+
+        (indices, values) = pyr.query(10, 900, num_points=20)
+        assert pyr.level_for(890, 20) == 2
+        assert_array_equal(indices[:4], [0, 0, 16, 16])
+        assert values[0] == np.min(self.data[:16])
+        assert values[1] == np.max(self.data[:16])
+        assert len(values) <= 2 * (890 // 16 + 2)
+
+        (indices, values) = pyr.query(500, 400)
+        assert len(indices) == 0
+
+    def test_save_load(self):
+        pyr = MinMaxPyramid.build(self.data)
+        with tempfile.TemporaryDirectory() as path:
+            pyr.save(path)
+            loaded = MinMaxPyramid.load(path, self.data)
+            assert isinstance(loaded.mins[0], np.memmap)
+            assert_array_equal(loaded.query(0, 1001, 10)[1], pyr.query(0, 1001, 10)[1])
+
+            with self.assertRaises(ValueError):
+                MinMaxPyramid.load(path, self.data[:10])
+
+
+class TestSignalIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.data = rng.normal(size=10003)
+        self.index = SignalIndex(factor=4)
+        for block in np.array_split(self.data, 17):
+            self.index.append(block)
+
+    def test_incremental(self):
+        full = SignalIndex(factor=4)
+        full.append(self.data)
+        assert full.num_levels == self.index.num_levels == 6
+        with self.assertRaises(ValueError):
+            SignalIndex(factor=1)
+        for level in range(1, full.num_levels + 1):
+            for stat, values in full.level(level).items():
+                assert_allclose(self.index.level(level)[stat], values)
+        assert_array_equal(
+            self.index.level(1)["max"][:2],
+            [
+                np.max(self.data[:4]),
+                np.max(self.data[4:8]),
+            ],
+        )
+
+    def test_range_stats(self):
+        for start, stop in [(0, 10003), (5, 77), (123, 9999), (7, 8), (1024, 4096)]:
+            res = self.index.range_stats(start, stop)
+            truth = self.data[start:stop]
+            assert_allclose(res["min"], np.min(truth))
+            assert_allclose(res["max"], np.max(truth))
+            assert_allclose(res["sum"], np.sum(truth))
+            assert_allclose(res["energy"], np.sum(truth**2))
+
+    def test_above(self):
+        assert_array_equal(self.index.above(3), np.flatnonzero(self.data >= 3))
+        assert_array_equal(
+            self.index.above(2.5, 100, 5000, absolute=True),
+            100 + np.flatnonzero(np.abs(self.data[100:5000]) >= 2.5),
+        )
+
+        index = SignalIndex(factor=2)
+        index.append(np.array([0.0, 5, 5, 0, 0, 5, 0, 0, 0, 5]))
+        assert_array_equal(index.regions(1), [[1, 3], [5, 6], [9, 10]])
+
+    def test_detect(self):
+        sample_rate_s = 0.0001
+        pw_s = 0.002
+        (_, data) = make_signal(0.45, sample_rate_s, 8, pw_s)
+        data = data + np.random.default_rng(seed=42).normal(size=len(data))
+        index = SignalIndex()
+        index.append(data)
+
+        truth = np.flatnonzero(detector(data, sample_rate_s, pw_s))
+        assert len(truth) > 0
+        assert_array_equal(index.detect(sample_rate_s, pw_s), truth)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.index.save(path)
+            loaded = SignalIndex.load(path)
+            assert isinstance(loaded.data, np.memmap)
+            assert_array_equal(loaded.above(3), self.index.above(3))
+
+            loaded.append(np.array([10.0]))
+            assert loaded.above(9)[-1] == len(self.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
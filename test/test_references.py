@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from analysis import HistogramResults, compute_histogram, ks_test_hists
+from references import ReferenceRegistry
+
+
+class TestReferenceRegistry(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(seed=42)
+        self.registry = ReferenceRegistry()
+        for key in range(20):
+            self.registry[key] = compute_histogram(rng.normal(size=1000), 10 + key)
+        self.new = {
+            key: compute_histogram(rng.normal(1 if key % 2 else 0, size=500), 30)
+            for key in range(25)
+        }
+
+    def test_get_set(self):
+        assert len(self.registry) == 20
+        assert 3 in self.registry
+        assert "3" in self.registry
+        assert 20 not in self.registry
+        assert len(self.registry[3].counts) == 13
+
+        with self.assertRaises(ValueError):
+            self.registry["bad"] = HistogramResults(np.arange(3), np.arange(3))
+        with self.assertRaises(KeyError):
+            self.registry[99]
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.registry.save(path)
+            loaded = ReferenceRegistry.load(path)
+            assert loaded.keys() == [str(_) for _ in range(20)]
+            assert isinstance(loaded[4].counts, np.memmap)
+            for key in ["0", "7", "19"]:
+                assert_array_equal(loaded[key].bins, self.registry[key].bins)
+                assert_array_equal(loaded[key].counts, self.registry[key].counts)
+
+            loaded.update(7, [0.0, 0.0])
+            loaded["new"] = self.new[0]
+            assert len(loaded) == 21
+            loaded.save()
+            reloaded = ReferenceRegistry.load(path)
+            assert np.sum(reloaded[7].counts) == 1002
+            assert_array_equal(reloaded["new"].counts, self.new[0].counts)
+
+    def test_drift(self):
+        res = self.registry.drift(self.new, confidence=0.001)
+        assert res.columns == ["key", "statistic", "pvalue", "drift"]
+        assert len(res) == 20
+        assert res["drift"].to_list() == [bool(_ % 2) for _ in range(20)]
+        assert (
+            res["statistic"][2]
+            == ks_test_hists(self.registry[2], self.new[2]).statistic
+        )
+
+        res = self.registry.drift(self.new, confidence=0.001, method="ad")
+        assert res["drift"].to_list() == [bool(_ % 2) for _ in range(20)]
+
+        with self.assertRaises(ValueError):
+            self.registry.test(0, self.new[0], method="chi2")
+
+
+if __name__ == "__main__":
+    unittest.main()
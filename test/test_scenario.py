@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+
+import numpy as np
+import polars as pl
+from numpy.testing import assert_allclose, assert_array_equal
+from polars.testing import assert_frame_equal
+
+from scenario import Emitter, Scenario, random_scenario, to_pdw
+
+
+class TestScenario(unittest.TestCase):
+    def setUp(self):
+        self.scenario = random_scenario(20, 5.0, seed=3, toa_noise=1e-6, rf_noise=1)
+
+    def test_chunks(self):
+        frame = self.scenario.frame()
+        assert len(frame) > 0
+        assert frame["toa"].is_sorted()
+        for chunk_pulses in [1000, 7777]:
+            chunks = list(self.scenario.chunks(chunk_pulses))
+            assert len(chunks) > 1
+            assert_frame_equal(pl.concat(chunks), frame)
+
+    def test_chunk_edges(self):
+        # pulses exactly on the chunk edges are in one chunk only
+        for pri, chunk_pulses in [(0.01, 1), (0.01, 10), (1e-3, 100)]:
+            emitter = Emitter(pri=pri, rf=1.0, pw=1e-6, start=0.0)
+            scenario = Scenario([emitter], duration=1.0)
+            frame = scenario.frame()
+            assert len(frame) == round(1 / pri)
+            assert_frame_equal(pl.concat(scenario.chunks(chunk_pulses)), frame)
+            toa = frame["toa"][len(frame) // 2]
+            assert len(scenario.pulses(0, toa)) == len(frame) // 2
+            assert len(scenario.pulses(toa, np.nextafter(toa, 1))) == 1
+
+    def test_pulses(self):
+        frame = self.scenario.frame()
+        window = self.scenario.pulses(1.0, 2.0)
+        truth = frame.filter((pl.col("toa") >= 1.0) & (pl.col("toa") < 2.0))
+        assert_frame_equal(window, truth)
+        assert frame.select("emitter", "pulse").is_unique().all()
+
+    def test_stagger(self):
+        emitter = Emitter(pri=[1e-3, 1.5e-3], rf=1000, pw=1e-5, start=0.0)
+        frame = Scenario([emitter], duration=0.1).frame()
+        assert_allclose(frame["toa"].diff().drop_nulls()[:4], [1e-3, 1.5e-3] * 2)
+        assert len(frame) == 80
+
+    def test_jitter(self):
+        emitter = Emitter(pri=1e-3, rf=1000, pw=1e-5, jitter=0.1, start=0.0)
+        frame = Scenario([emitter], duration=1.0).frame()
+        error = frame["toa"].to_numpy() - frame["pulse"].to_numpy() * 1e-3
+        assert np.max(np.abs(error)) <= 1e-4
+        assert np.std(error) > 1e-5
+
+    def test_miss(self):
+        emitter = Emitter(pri=1e-4, rf=1000, pw=1e-6, p_miss=0.2)
+        frame = Scenario([emitter], duration=10.0).frame()
+        assert_allclose(len(frame) / 10**5, 0.8, atol=0.01)
+
+    def test_agile(self):
+        rfs = [1000.0, 1100.0, 1200.0]
+        emitter = Emitter(pri=1e-3, rf=rfs, pw=1e-5)
+        frame = Scenario([emitter], duration=1.0).frame()
+        counts = frame["rf"].value_counts().sort("rf")
+        assert_array_equal(counts["rf"], rfs)
+        assert counts["count"].min() > 250
+
+    def test_scan(self):
+        emitter = Emitter(pri=1e-3, rf=1000, pw=1e-5, pa=2, scan_period=1.0)
+        frame = Scenario([emitter], duration=1.0, sensitivity=1).frame()
+        # pulses above half power are within the beam width of mid scan
+        assert frame["pa"].max() <= 2
+        assert_allclose(frame["toa"].mean(), 0.5, atol=1e-3)
+        assert_allclose(frame["toa"].max() - frame["toa"].min(), 0.05, atol=2e-3)
+
+    def test_write_parquet(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            files = self.scenario.write_parquet(tmp, chunk_pulses=5000)
+            assert len(files) > 1
+            frame = pl.scan_parquet(f"{tmp}/*.parquet").collect()
+        assert_frame_equal(frame, self.scenario.frame())
+
+    def test_to_pdw(self):
+        frame = self.scenario.pulses(0, 0.5)
+        pdw = to_pdw(frame)
+        assert_array_equal(pdw.toa_s, frame["toa"])
+        assert_array_equal(pdw.rf_s, frame["rf"])
+
+    def test_seed(self):
+        other = Scenario(self.scenario.emitters, 5.0, seed=4, toa_noise=1e-6)
+        assert_frame_equal(self.scenario.frame(), self.scenario.frame())
+        assert not self.scenario.frame()["toa"].equals(other.frame()["toa"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,112 @@
 import unittest
 
+import numpy as np
+import polars as pl
+from numpy.testing import assert_allclose
+from polars.testing import assert_frame_equal
+
+from pulse_simulator import Pdw
+from tdoa import compute_tdoas, match_toas, tdoa_by_burst
+
 
 class TestAnalysis(unittest.TestCase):
     def test_1(self):
         assert 4 == 5
 
 
+class TestPdwTdoa(unittest.TestCase):
+    def test_match_toas(self):
+        ref = pl.DataFrame(
+            {
+                "toa": [1.0, 2.0, 3.0, 4.0],
+                "rf": [10.0, 10.0, 10.0, 10.0],
+            },
+        )
+        other = pl.DataFrame(
+            {
+                "toa": [1.01, 2.01, 3.5, 4.01],
+                "rf": [10.0, 10.0, 10.0, 10.0],
+            },
+        )
+        res = match_toas(ref, other, max_baseline_s=0.05)
+        assert_allclose(res["toa"].to_numpy(), [1.0, 2.0, 4.0])
+        assert_allclose(res["tdoa"].to_numpy(), [0.01, 0.01, 0.01])
+
+    def test_match_toas_rf(self):
+        # two emitters interleaved, the nearest pulse in time is the wrong one
+        ref = pl.DataFrame(
+            {
+                "toa": [1.0, 1.002, 2.0, 2.002],
+                "rf": [100.0, 300.0, 100.0, 300.0],
+            },
+        )
+        other = pl.DataFrame(
+            {
+                "toa": [1.003, 1.005, 2.003, 2.005],
+                "rf": [100.5, 299.5, 100.5, 299.5],
+            },
+        )
+        res = match_toas(ref, other, max_baseline_s=0.01, rf_tol=2)
+        assert_allclose(res["tdoa"].to_numpy(), [0.003, 0.003, 0.003, 0.003])
+
+        # without rf both pulses prefer the same match, the loser falls back
+        # to its next candidate
+        res = match_toas(ref, other, max_baseline_s=0.01)
+        assert_allclose(res["tdoa"].to_numpy(), [0.005, 0.001, 0.005, 0.001])
+        assert_allclose(res["toa_other"].to_numpy(), [1.005, 1.003, 2.005, 2.003])
+
+    def test_match_toas_pw(self):
+        ref = pl.DataFrame({"toa": [1.0], "rf": [10.0], "pw": [1e-3]})
+        other = pl.DataFrame({"toa": [1.001], "rf": [10.0], "pw": [5e-3]})
+        res = match_toas(ref, other, max_baseline_s=0.01, rf_tol=1, pw_tol=1e-4)
+        assert len(res) == 0
+
+        # a pulse further in time but within the baseline is still found
+        other = pl.DataFrame(
+            {"toa": [1.001, 1.004], "rf": [10.0, 10.0], "pw": [5e-3, 1e-3]},
+        )
+        for rf_tol in [None, 1]:
+            res = match_toas(ref, other, 0.01, rf_tol=rf_tol, pw_tol=1e-4)
+            assert_allclose(res["tdoa"].to_numpy(), [0.004])
+            assert_allclose(res["score"].to_numpy(), [0.4])
+
+    def test_compute_tdoas(self):
+        toas = np.array([0.5, 1.5, 2.5])
+        sensors = {
+            "a": Pdw(toas, np.ones(3), np.ones(3), np.ones(3)),
+            "b": Pdw(toas + 0.002, np.ones(3), np.ones(3), np.ones(3)),
+            "c": Pdw(toas - 0.001, np.ones(3), np.ones(3), np.ones(3)),
+        }
+        res = compute_tdoas(sensors, "a", max_baseline_s=0.01, rf_tol=0.5)
+        assert res.columns == ["time", "tdoa", "sensor1", "sensor2"]
+        assert_frame_equal(
+            res.select("sensor2", pl.col("tdoa").round(6)),
+            pl.DataFrame(
+                {
+                    "sensor2": ["b", "c", "b", "c", "b", "c"],
+                    "tdoa": [0.002, -0.001, 0.002, -0.001, 0.002, -0.001],
+                },
+            ),
+        )
+
+    def test_tdoa_by_burst(self):
+        bursts = pl.DataFrame(
+            {
+                "toa": [5.0, 10.0, 15.0, 7.0, 12.0],
+                "rf": [1.0, 1.0, 1.0, 2.0, 2.0],
+                "burst_group": [0, 0, 0, 1, 1],
+            },
+        )
+        other = pl.DataFrame(
+            {
+                "toa": [5.1, 7.2, 10.1, 12.2, 15.1, 30.0],
+                "rf": [1.0, 2.0, 1.0, 2.0, 1.0, 1.0],
+            },
+        )
+        res = tdoa_by_burst(bursts, other, max_baseline_s=0.5, rf_tol=0.4)
+        assert res["burst_group"].to_list() == [0, 0, 0, 1, 1]
+        assert_allclose(res["tdoa"].to_numpy(), [0.1, 0.1, 0.1, 0.2, 0.2])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,113 @@
+import json
+import threading
+import unittest
+
+import numpy as np
+
+from timing import QUANTILES, MetricsRegistry, nbytes_of
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_disabled(self):
+        registry = MetricsRegistry()
+
+        @registry.timed
+        def add(x, y):
+            return x + y
+
+        assert add(2, 3) == 5
+        with registry.timer("block"):
+            pass
+        assert registry.snapshot() == {}
+
+    def test_timed(self):
+        registry = MetricsRegistry(enabled=True)
+
+        @registry.timed(bytes_arg="data")
+        def total(data):
+            return np.sum(data)
+
+        data = np.ones(100)
+        for _ in range(4):
+            total(data)
+        total(data=data)
+
+        stats = registry.snapshot()["total"]
+        assert stats["count"] == 5
+        assert stats["bytes"] == 5 * data.nbytes
+        assert stats["p50_s"] <= stats["p99_s"]
+        assert stats["total_s"] >= stats["p99_s"]
+
+    def test_hierarchy(self):
+        registry = MetricsRegistry(enabled=True)
+
+        @registry.timed(name="inner")
+        def inner():
+            return 1
+
+        with registry.timer("outer"):
+            inner()
+            inner()
+        inner()
+
+        snapshot = registry.snapshot()
+        assert snapshot["outer"]["count"] == 1
+        assert snapshot["outer/inner"]["count"] == 2
+        assert snapshot["inner"]["count"] == 1
+
+    def test_threads(self):
+        registry = MetricsRegistry(enabled=True)
+
+        def work():
+            for _ in range(1000):
+                with registry.timer("work", nbytes=2):
+                    pass
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = registry.snapshot()["work"]
+        assert stats["count"] == 4000
+        assert stats["bytes"] == 8000
+
+    def test_export(self):
+        registry = MetricsRegistry(enabled=True)
+        registry.record("detector", 0.5, 100)
+        registry.record("detector", 1.5, 100)
+        registry.record("pdws", 0.25, 10)
+
+        assert json.loads(registry.to_json())["detector"]["total_s"] == 2.0
+
+        text = registry.to_prometheus()
+        assert 'signalanalysis_stage_seconds_count{stage="detector"} 2' in text
+        assert 'signalanalysis_stage_bytes_total{stage="detector"} 200' in text
+        assert 'signalanalysis_stage_seconds{stage="detector",quantile="0.5"}' in text
+        assert 'signalanalysis_stage_bytes_total{stage="pdws"} 10' in text
+
+        # HELP and TYPE once per family, then all of its samples together
+        lines = text.splitlines()
+        metrics = [
+            _.split()[2] if _.startswith("#") else _.split("{")[0] for _ in lines
+        ]
+        seconds = "signalanalysis_stage_seconds"
+        stage = [*[seconds] * len(QUANTILES), f"{seconds}_sum", f"{seconds}_count"]
+        assert metrics == [
+            *[seconds] * 2,
+            *stage,
+            *stage,
+            *["signalanalysis_stage_bytes_total"] * 4,
+        ]
+        assert lines[0].startswith("# HELP")
+        assert lines[len(lines) - 4].startswith("# HELP")
+
+    def test_nbytes_of(self):
+        assert nbytes_of(np.zeros(4)) == 32
+        assert nbytes_of(b"abc") == 3
+        assert nbytes_of(None) == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,269 @@
+from __future__ import annotations
+
+import inspect
+import json
 import logging
+import os
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from functools import wraps
+from typing import Any, Callable, Iterator
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def nbytes_of(obj: Any) -> int:
+    """Size in bytes of an array, DataFrame or buffer.
+
+    Parameters
+    ----------
+    obj : Any
+
+    Returns
+    -------
+    int
+        0 if the size is unknown
+
+    """
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if hasattr(obj, "estimated_size"):
+        return int(obj.estimated_size())
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return len(obj)
+    return 0
+
+
+@dataclass
+class Metric:
+    """Aggregated timings for one stage.
+
+    Durations are kept in a bounded ring buffer for percentiles while
+    count, total time and bytes are exact.
+    """
+
+    name: str
+    count: int = 0
+    total_s: float = 0.0
+    bytes: int = 0
+    samples: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record(self, elapsed_s: float, nbytes: int = 0) -> None:
+        self.count += 1
+        self.total_s += elapsed_s
+        self.bytes += nbytes
+        self.samples.append(elapsed_s)
+
+    def summary(self) -> dict:
+        quantiles = (
+            np.quantile(np.fromiter(self.samples, dtype=float), QUANTILES)
+            if self.samples
+            else np.zeros(len(QUANTILES))
+        )
+        return {
+            "count": self.count,
+            "total_s": self.total_s,
+            "mean_s": self.total_s / self.count if self.count else 0.0,
+            "bytes": self.bytes,
+            "bytes_per_s": self.bytes / self.total_s if self.total_s else 0.0,
+            **{f"p{int(q * 100)}_s": float(v) for q, v in zip(QUANTILES, quantiles)},
+        }
+
+
+class MetricsRegistry:
+    """Thread safe in-process registry of stage timings.
+
+    Nested timers are recorded hierarchically, a timer "b" entered inside
+    a timer "a" is stored as "a/b". When the registry is disabled the
+    decorators call straight through to the wrapped function.
+    """
+
+    def __init__(self, enabled: bool = False, sample_size: int = 1024) -> None:
+        self.enabled = enabled
+        self.sample_size = sample_size
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, name: str, elapsed_s: float, nbytes: int = 0) -> None:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(
+                    name,
+                    samples=deque(maxlen=self.sample_size),
+                )
+            metric.record(elapsed_s, nbytes)
+
+    @contextmanager
+    def timer(self, name: str, nbytes: int = 0) -> Iterator[None]:
+        """Time a block of code.
+
+        Parameters
+        ----------
+        name : str
+            stage name, prefixed by any enclosing timers
+        nbytes : int, optional
+            bytes processed by the block, by default 0
+
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._stack()
+        stack.append(name)
+        full_name = "/".join(stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            self.record(full_name, elapsed, nbytes)
+
+    def timed(
+        self,
+        func: Callable | None = None,
+        *,
+        name: str | None = None,
+        bytes_arg: str | None = None,
+    ) -> Callable:
+        """Time every call of a function.
+
+        Can be used bare, @timed, or with arguments, @timed(bytes_arg="data").
+
+        Parameters
+        ----------
+        func : Callable | None, optional
+        name : str | None, optional
+            stage name, by default the function name
+        bytes_arg : str | None, optional
+            argument whose size is recorded as bytes processed, by default None
+
+        Returns
+        -------
+        Callable
+
+        """
+        if func is None:
+            return lambda f: self.timed(f, name=name, bytes_arg=bytes_arg)
+
+        stage = name or func.__name__
+        position = None
+        if bytes_arg is not None:
+            position = list(inspect.signature(func).parameters).index(bytes_arg)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+
+            nbytes = 0
+            if position is not None:
+                if bytes_arg in kwargs:
+                    nbytes = nbytes_of(kwargs[bytes_arg])
+                elif position < len(args):
+                    nbytes = nbytes_of(args[position])
+            with self.timer(stage, nbytes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: m.summary() for name, m in sorted(self._metrics.items())}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix: str = "signalanalysis") -> str:
+        """Export a snapshot in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            by default "signalanalysis"
+
+        Returns
+        -------
+        str
+
+        """
+        snapshot = self.snapshot()
+        labels = {name: f'stage="{name}"' for name in snapshot}
+        # each family is its HELP and TYPE followed by all of its samples
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time of each stage call.",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, stats in snapshot.items():
+            lines.extend(
+                f'{prefix}_stage_seconds{{{labels[name]},quantile="{q}"}} '
+                f"{stats[f'p{int(q * 100)}_s']}"
+                for q in QUANTILES
+            )
+            lines.append(
+                f"{prefix}_stage_seconds_sum{{{labels[name]}}} {stats['total_s']}"
+            )
+            lines.append(
+                f"{prefix}_stage_seconds_count{{{labels[name]}}} {stats['count']}"
+            )
+        lines.extend(
+            [
+                f"# HELP {prefix}_stage_bytes_total Input bytes processed by "
+                "each stage.",
+                f"# TYPE {prefix}_stage_bytes_total counter",
+            ]
+        )
+        lines.extend(
+            f"{prefix}_stage_bytes_total{{{labels[name]}}} {stats['bytes']}"
+            for name, stats in snapshot.items()
+        )
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(enabled=os.environ.get("SIGNALANALYSIS_METRICS") == "1")
+timed = registry.timed
+timer = registry.timer
+
+
 def timeit(func):
     """Time function calls."""
 
-  @wraps(func)
-  def wrapper(*args, **kwargs):
-    """Wrapper to do work."""
-    start = time.perf_counter()
-    original_return_val = func(*args,**kwargs)
-    end=time.perf_counter()
-    elapsed_time = f"{(end-start)}"
-    logger.info("Time elapsed in %s: %s (s)", func.__name__, elapsed_time)
-    return original_return_val
-
-  return wrapper
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        """Wrapper to do work."""
+        start = time.perf_counter()
+        original_return_val = func(*args, **kwargs)
+        end = time.perf_counter()
+        elapsed_time = end - start
+        logger.info("Time elapsed in %s: %s (s)", func.__name__, elapsed_time)
+        if registry.enabled:
+            registry.record(func.__name__, elapsed_time)
+        return original_return_val
+
+    return wrapper
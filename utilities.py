@@ -1,10 +1,15 @@
 from functools import wraps
 from time import time
 
+from timing import registry
+
 
 def timing(f):
     """Time function execution.
 
+    Prints the elapsed time and records it in the metrics registry when
+    the registry is enabled.
+
     Parameters
     ----------
     f : _type_
@@ -20,7 +25,9 @@ def timing(f):
         ts = time()
         result = f(*args, **kw)
         te = time()
-        print(f"func: {f.__name__} took: {te-ts:2.4f}2.4f sec")
+        print(f"func: {f.__name__} took: {te-ts:2.4f} sec")
+        if registry.enabled:
+            registry.record(f.__name__, te - ts)
         return result
 
     return wrap